@@ -0,0 +1,11 @@
+#!/bin/bash
+# Runs once, on the first start of an empty data directory (docker-entrypoint-initdb.d).
+#
+# The SQL itself lives in /import/sql rather than here, because the entrypoint would
+# otherwise run it a second time, alphabetically and serially -- which is exactly what
+# run_import.py replaces. See its docstring for the stage graph.
+set -euo pipefail
+
+PGUSER="$POSTGRES_USER" PGDATABASE="$POSTGRES_DB" \
+    python3 /import/run_import.py \
+        --report /var/lib/postgresql/import_report.json
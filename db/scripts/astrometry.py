@@ -0,0 +1,188 @@
+"""
+astrometry.py -- the derived quantities match_cns5.py and match_gcns.py compute for every
+star: J2000 position, estimated V, absolute magnitude, equatorial x/y/z and a rough
+spectral type.
+
+These were four functions duplicated line for line in both scripts and called once per
+field per star. Here each takes whole arrays (NaN where a value is missing) and is a few
+numpy operations over the catalog. Both scripts now import the same code, so a CNS5 star
+and a GCNS star with the same measurements cannot come out differently.
+
+Called with scalars, each function still behaves as the old per-star version did: None in
+for a missing value, float/str or None out. The unit tests exercise that form, and it is
+convenient for one-off checks.
+"""
+
+import numpy as np
+
+# 1 mas in degrees.
+MAS_PER_DEG = 3_600_000.0
+
+# Spectral letter by Gaia BP-RP, with the main-sequence absolute magnitude expected for it.
+# BP-RP boundaries based on Gaia EDR3 color-spectral type calibrations: a star is in the
+# first class whose upper bound its colour is below.
+SPECTRAL_BOUNDS = np.array([-0.3, 0.0, 0.35, 0.65, 1.0, 1.85])
+SPECTRAL_LETTERS = np.array(["O", "B", "A", "F", "G", "K", "M"], dtype=object)
+SPECTRAL_MS_MV = np.array([-4.0, 0.0, 1.5, 3.5, 5.0, 7.0, 11.0])
+
+
+def _arrays(*values):
+    """Inputs as float arrays, None as NaN; and whether they were all scalars."""
+    arrays = [np.asarray(v, dtype=np.float64) for v in values]
+    return arrays, all(a.ndim == 0 for a in arrays)
+
+
+def _scalar(value):
+    """A 0-d result as the per-star functions returned it."""
+    value = value.item() if isinstance(value, np.ndarray) else value
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def propagate_to_j2000(ra_deg, dec_deg, epoch, pmra_masyr, pmdec_masyr):
+    """Propagate positions from *epoch* to J2000.0 using proper motions.
+
+    pmra is already mu_alpha* (i.e. includes cos(dec) factor) in mas/yr.
+    Returns (ra_j2000_deg, dec_j2000_deg). Where the epoch or either proper motion is
+    missing, or the star is at a pole, the position is returned as-is.
+    """
+    (ra, dec, epoch, pmra, pmdec), scalar = _arrays(ra_deg, dec_deg, epoch, pmra_masyr, pmdec_masyr)
+    dt = 2000.0 - epoch  # negative for epochs after J2000
+    cos_dec = np.cos(np.radians(dec))
+    ok = np.isfinite(dt) & np.isfinite(pmra) & np.isfinite(pmdec) & (cos_dec != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ra_j2000 = np.where(ok, (ra + (pmra * dt) / (MAS_PER_DEG * cos_dec)) % 360.0, ra)
+        dec_j2000 = np.where(ok, dec + (pmdec * dt) / MAS_PER_DEG, dec)
+    if scalar:
+        return _scalar(ra_j2000), _scalar(dec_j2000)
+    return ra_j2000, dec_j2000
+
+
+def estimate_vmag(g_mag, bp_mag, rp_mag):
+    """Estimate Johnson V from Gaia G and BP-RP color index.
+
+    Uses the polynomial: V = G - (-0.01760 - 0.006860*X + 0.1732*X^2)
+    where X = BP - RP. NaN (None for scalars) where any of the three is missing.
+    """
+    (g, bp, rp), scalar = _arrays(g_mag, bp_mag, rp_mag)
+    bp_rp = bp - rp
+    v = g - (-0.01760 - 0.006860 * bp_rp + 0.1732 * bp_rp ** 2)
+    return _scalar(v) if scalar else v
+
+
+def absolute_magnitude(mag, dist_pc):
+    """M = m - 5 log10(d) + 5; NaN where either is missing or the distance is not positive."""
+    (mag, dist), scalar = _arrays(mag, dist_pc)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        absmag = np.where(dist > 0, mag - 5.0 * np.log10(dist) + 5.0, np.nan)
+    return _scalar(absmag) if scalar else absmag
+
+
+def compute_equatorial_coords(ra_hours, dec_deg, dist_pc):
+    """Compute equatorial Cartesian coordinates (x_eq, y_eq, z_eq).
+
+    ra_hours: RA in decimal hours
+    dec_deg:  Declination in degrees
+    dist_pc:  Distance in parsecs
+    All three are missing where any input is.
+    """
+    (ra_hours, dec, dist), scalar = _arrays(ra_hours, dec_deg, dist_pc)
+    ra_rad = np.radians(ra_hours * 15.0)
+    dec_rad = np.radians(dec)
+    missing = np.isnan(ra_hours) | np.isnan(dec) | np.isnan(dist)
+    xyz = [
+        np.where(missing, np.nan, c)
+        for c in (
+            dist * np.cos(dec_rad) * np.cos(ra_rad),
+            dist * np.cos(dec_rad) * np.sin(ra_rad),
+            dist * np.sin(dec_rad),
+        )
+    ]
+    if scalar:
+        return tuple(_scalar(c) for c in xyz)
+    return tuple(xyz)
+
+
+def estimate_spectral_type(bp_rp, absmag):
+    """Estimate a rough spectral type from Gaia BP-RP color and absolute magnitude.
+
+    Returns strings like "G V", "K III", "D" (white dwarf), "L" (brown dwarf), or None
+    where classification is not possible -- an object array for array input.
+
+    Uses absolute magnitude to determine luminosity class:
+      III (giant), IV (subgiant), V (dwarf) by comparing against
+      expected main-sequence Mv for the color.
+    """
+    (bp_rp, absmag), scalar = _arrays(bp_rp, absmag)
+    bp_rp, absmag = np.broadcast_arrays(bp_rp, absmag)
+    no_absmag = np.isnan(absmag)
+
+    band = np.digitize(bp_rp, SPECTRAL_BOUNDS)
+    letter = SPECTRAL_LETTERS[np.minimum(band, len(SPECTRAL_LETTERS) - 1)]
+    ms_mv = SPECTRAL_MS_MV[np.minimum(band, len(SPECTRAL_MS_MV) - 1)]
+
+    # Determine luminosity class from absolute magnitude. Require BOTH a relative offset
+    # from the MS AND an absolute brightness threshold to prevent dim stars from being
+    # misclassified as evolved. Without absmag, default to dwarf.
+    lum = np.select(
+        [~no_absmag & (absmag < ms_mv - 3.0) & (absmag < 2.0),
+         ~no_absmag & (absmag < ms_mv - 1.5) & (absmag < 4.0)],
+        [" III", " IV"],
+        " V",
+    ).astype(object)
+
+    spect = np.select(
+        [
+            np.isnan(bp_rp),
+            bp_rp >= 4.0,                                # brown dwarf: very red
+            ~no_absmag & (absmag > 10) & (bp_rp < 1.5),  # white dwarf: faint, blue/moderate
+            # Without absolute magnitude, a very red star is virtually certainly an M dwarf
+            # this close, and moderate colours are ambiguous.
+            no_absmag & (bp_rp > 2.5),
+            no_absmag & (bp_rp >= 0.5),
+        ],
+        [None, "L", "D", "M V", None],
+        letter + lum,
+    )
+    return spect.item() if scalar else spect
+
+
+def column(records, name):
+    """One field of a list of record dicts as a float array, None as NaN."""
+    return np.array([rec[name] for rec in records], dtype=np.float64)
+
+
+def derive(records, epoch=None):
+    """
+    Everything the matchers derive from a catalog record, for all records at once: one
+    dict per record of ra_j2000 (hours), dec_j2000, dist, mag (estimated V), absmag,
+    bp_rp, spect, x_eq, y_eq, z_eq, each None where it cannot be computed.
+
+    Records carry ra_deg, dec_deg, pmra, pmdec, parallax, g_mag, bp_mag and rp_mag, and
+    their own "epoch" unless one is given for the whole catalog.
+    """
+    if not records:
+        return []
+    ra_deg, dec_deg = column(records, "ra_deg"), column(records, "dec_deg")
+    epochs = column(records, "epoch") if epoch is None else np.full(len(records), float(epoch))
+    ra_deg, dec_deg = propagate_to_j2000(
+        ra_deg, dec_deg, epochs, column(records, "pmra"), column(records, "pmdec"),
+    )
+    parallax = column(records, "parallax")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dist = np.where(parallax > 0, 1000.0 / parallax, np.nan)
+    bp, rp = column(records, "bp_mag"), column(records, "rp_mag")
+    mag = estimate_vmag(column(records, "g_mag"), bp, rp)
+    absmag = absolute_magnitude(mag, dist)
+    ra_hours = ra_deg / 15.0
+    x, y, z = compute_equatorial_coords(ra_hours, dec_deg, dist)
+
+    out = {
+        "ra_j2000": ra_hours, "dec_j2000": dec_deg, "dist": dist, "mag": mag,
+        "absmag": absmag, "bp_rp": bp - rp, "x_eq": x, "y_eq": y, "z_eq": z,
+    }
+    out = {name: [None if v != v else v for v in values.tolist()] for name, values in out.items()}
+    out["spect"] = estimate_spectral_type(bp - rp, absmag).tolist()
+    names = list(out)
+    return [dict(zip(names, values)) for values in zip(*out.values())]
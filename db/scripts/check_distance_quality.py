@@ -31,15 +31,17 @@ The three checks correspond to three real defects:
    coordinates 97,011 pc from Sol. Every other check here passed on those rows: dist was
    right, absmag was right, and only the position was wrong, which is exactly why this
    check had to exist separately.
+
+It also runs check_duplicates.py's three checks, in the same SELECT, so after an import
+this one script is the whole gate and the table is read once. check_duplicates.py on its
+own runs only those three.
 """
 import argparse
 import os
 import sys
 
-try:
-    import psycopg2
-except ImportError:
-    sys.exit("psycopg2 is required: pip install -r db/scripts/requirements.txt")
+from check_duplicates import DUPLICATE_CONDITIONS, DUPLICATE_EXAMPLES, report_duplicates
+from quality_checks import ATHYG_WITH_GAIA_GROUPS, count_filtered, report
 
 # Brighter than any real star; below this the distance is the thing at fault.
 ABSMAG_FLOOR = -10.0
@@ -60,10 +62,13 @@ KNOWN_IMPLAUSIBLE_BASELINE = 1
 # error and four orders tighter than the smallest real defect this has caught.
 COORD_TOLERANCE_FRACTION = 0.001
 
+# (label, condition on one athyg row, hint). Each condition counts the rows it holds for,
+# and all of them are counted in the same scan (quality_checks.count_filtered), so adding a
+# check here costs one more aggregate rather than one more pass over the table.
 CHECKS = (
     (
         "unknown-distance sentinel treated as a measurement",
-        f"SELECT count(*) FROM athyg WHERE dist = {SENTINEL_DIST}",
+        f"dist = {SENTINEL_DIST}",
         "db/sql/03_import_data.sql should clear these to NULL",
     ),
     (
@@ -71,14 +76,13 @@ CHECKS = (
         # dist_src is excluded where we have already adopted the catalogue's own value,
         # so this counts unresolved contradictions rather than accepted overrides. A few
         # CNS5 entries genuinely sit just outside 25 pc, hence the generous bound.
-        "SELECT count(*) FROM athyg"
-        " WHERE cns5 IS NOT NULL AND dist > 50"
-        "   AND coalesce(dist_src, '') NOT IN ('CNS5', 'GCNS')",
+        "cns5 IS NOT NULL AND dist > 50"
+        " AND coalesce(dist_src, '') NOT IN ('CNS5', 'GCNS')",
         "AT-HYG contradicts CNS5; 06_import_cns5.sql should adopt the CNS5 distance",
     ),
     (
         "positions inconsistent with a null distance",
-        "SELECT count(*) FROM athyg WHERE dist IS NULL AND x IS NOT NULL",
+        "dist IS NULL AND x IS NOT NULL",
         "a star with no distance must not carry a fabricated position",
     ),
     (
@@ -88,9 +92,8 @@ CHECKS = (
         # values span 8 orders of magnitude; 0.1% is far tighter than any real drift
         # (the 17 known cases were wrong by factors of 10 to 5,600) and far looser than
         # float32 storage noise.
-        f"SELECT count(*) FROM athyg"
-        f" WHERE dist IS NOT NULL AND dist > 0 AND x IS NOT NULL"
-        f"   AND abs(sqrt(x*x + y*y + z*z) - dist) > {COORD_TOLERANCE_FRACTION} * dist",
+        f"dist IS NOT NULL AND dist > 0 AND x IS NOT NULL"
+        f" AND abs(sqrt(x*x + y*y + z*z) - dist) > {COORD_TOLERANCE_FRACTION} * dist",
         "a distance was changed without recomputing the position it derives;"
         " see 06_import_cns5.sql / 07_import_gcns.sql",
     ),
@@ -100,9 +103,8 @@ CHECKS = (
         # so if only the galactic check ran, a stale equatorial triple with a correctly
         # recomputed galactic one would pass -- and the next import to re-derive x/y/z
         # would silently reintroduce the bad position.
-        f"SELECT count(*) FROM athyg"
-        f" WHERE dist IS NOT NULL AND dist > 0 AND x_eq IS NOT NULL"
-        f"   AND abs(sqrt(x_eq*x_eq + y_eq*y_eq + z_eq*z_eq) - dist) >"
+        f"dist IS NOT NULL AND dist > 0 AND x_eq IS NOT NULL"
+        f" AND abs(sqrt(x_eq*x_eq + y_eq*y_eq + z_eq*z_eq) - dist) >"
         f" {COORD_TOLERANCE_FRACTION} * dist",
         "the equatorial position is stale; it is the source x/y/z is computed from",
     ),
@@ -114,6 +116,12 @@ def main() -> int:
     ap.add_argument("--quiet", action="store_true", help="only report problems")
     args = ap.parse_args()
 
+    # Imported here so validate_data.py can share this file's thresholds without a driver.
+    try:
+        import psycopg2
+    except ImportError:
+        return "psycopg2 is required: pip install -r db/scripts/requirements.txt"
+
     conn = psycopg2.connect(
         host=os.environ.get("DB_HOST", "localhost"),
         port=os.environ.get("DB_PORT", "5432"),
@@ -122,49 +130,44 @@ def main() -> int:
         password=os.environ.get("DB_PASS", os.environ.get("POSTGRES_PASSWORD", "")),
     )
 
-    problems = 0
+    # The implausible-luminosity residue is tracked against a baseline rather than
+    # required to be zero: nothing in this pipeline supplies distances beyond 100 pc, so
+    # these cannot be fixed here. Failing on any growth still catches a regression. It
+    # rides in the same scan as CHECKS, as two more aggregates, and the duplicate checks
+    # follow them.
+    residue_conditions = ["absmag < %(floor)s", "absmag < %(floor)s AND gaia IS NOT NULL"]
+    distance_conditions = [condition for _label, condition, _hint in CHECKS] + residue_conditions
     with conn, conn.cursor() as cur:
-        for label, sql, hint in CHECKS:
-            cur.execute(sql)
-            count = cur.fetchone()[0]
-            if count:
-                problems += count
-                print(f"FAIL  {count:>6,}  {label}")
-                print(f"              -> {hint}")
-            elif not args.quiet:
-                print(f"ok         0  {label}")
-
-        # The implausible-luminosity residue is tracked against a baseline rather than
-        # required to be zero: nothing in this pipeline supplies distances beyond 100 pc,
-        # so these cannot be fixed here. Failing on any growth still catches a regression.
-        cur.execute(
-            "SELECT count(*), count(gaia) FROM athyg WHERE absmag < %s", (ABSMAG_FLOOR,)
+        *counts, examples = count_filtered(
+            cur,
+            distance_conditions + DUPLICATE_CONDITIONS,
+            source=ATHYG_WITH_GAIA_GROUPS,
+            params={"floor": ABSMAG_FLOOR},
+            extra=[DUPLICATE_EXAMPLES],
         )
-        residue, with_gaia = cur.fetchone()
-        if residue > KNOWN_IMPLAUSIBLE_BASELINE:
-            problems += residue - KNOWN_IMPLAUSIBLE_BASELINE
-            print(
-                f"FAIL  {residue:>6,}  implausibly luminous stars"
-                f" (baseline {KNOWN_IMPLAUSIBLE_BASELINE}, so {residue - KNOWN_IMPLAUSIBLE_BASELINE} new)"
-            )
-            print("              -> a broken parallax inflates absmag; check the import")
-        elif not args.quiet:
-            print(
-                f"ok  {residue:>6,}  implausibly luminous stars (known residue,"
-                f" baseline {KNOWN_IMPLAUSIBLE_BASELINE})"
-            )
-            print(
-                f"              -> {with_gaia:,} carry a Gaia source_id but have no"
-                " Bailer-Jones entry (no usable Gaia parallax), so they need a"
-                " literature or association distance"
-            )
+
+    problems = 0
+    for (label, _condition, hint), count in zip(CHECKS, counts):
+        problems += report(label, count, hint, args.quiet)
+
+    residue, with_gaia = counts[len(CHECKS):len(distance_conditions)]
+    problems += report(
+        "implausibly luminous stars",
+        residue,
+        "a broken parallax inflates absmag; check the import",
+        args.quiet,
+        baseline=KNOWN_IMPLAUSIBLE_BASELINE,
+        known=f"{with_gaia:,} carry a Gaia source_id but have no Bailer-Jones entry (no"
+        " usable Gaia parallax), so they need a literature or association distance",
+    )
+    problems += report_duplicates(counts[len(distance_conditions):], examples, args.quiet)
 
     conn.close()
     if problems:
-        print(f"\n{problems:,} row(s) need attention")
+        print(f"\n{problems:,} problem(s) need attention")
         return 1
     if not args.quiet:
-        print("\nno distance-quality problems found")
+        print("\nno distance-quality or duplicate-identifier problems found")
     return 0
 
 
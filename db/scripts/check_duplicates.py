@@ -35,10 +35,7 @@ import argparse
 import os
 import sys
 
-try:
-    import psycopg2
-except ImportError:
-    sys.exit("psycopg2 is required: pip install -r db/scripts/requirements.txt")
+from quality_checks import ATHYG_WITH_GAIA_GROUPS, count_filtered, report
 
 # Rows with an id at or above this were INSERTed by a supplement import rather than coming
 # from AT-HYG. match_cns5.py allocates from 5000000 and match_gcns.py from 6000000.
@@ -50,37 +47,75 @@ FIRST_IMPORTED_ID = 5000000
 # brought more, or that something started creating them again by another route.
 KNOWN_INHERITED_BASELINE = 1166
 
+# A duplicate group is counted once, at its first row. The columns come from
+# quality_checks.ATHYG_WITH_GAIA_GROUPS, so these are conditions on one row and count in
+# the same pass as check_distance_quality.py's.
+GROUP = "gaia IS NOT NULL AND gaia_rows > 1 AND gaia_nth = 1"
+
+# `created` is the rule that separates the two populations: a group is blamed on the
+# pipeline if any row in it was inserted by a supplement import -- that is, if its highest
+# id is one -- and is otherwise inherited; a pair of AT-HYG rows is not ours to explain. It
+# exists only here, in SQL; the guard in 07_import_gcns.sql applies the same rule at build
+# time, and test_check_duplicates.py runs these conditions against planted groups.
+CREATED = f"{GROUP} AND gaia_hi_id >= {FIRST_IMPORTED_ID}"
+INHERITED = f"{GROUP} AND gaia_hi_id < {FIRST_IMPORTED_ID}"
+
+# A Gaia source is a single point on the sky. Two rows sharing an id but sitting far apart
+# are not a binary at all -- AT-HYG 4.0 has one such case, where a Cepheus star carries a
+# Leo star's source_id, distance, proper motion and radial velocity. Wide separation is the
+# signature that distinguishes a bad cross-match from a genuine unresolved pair.
+#
+# athyg.ra is in HOURS, so it must be multiplied by 15 before conversion to radians.
+# Omitting that understates every RA difference by a factor of 15 and silently shrinks the
+# separations this check exists to find -- it made the known 95.3 degree case read as 29.2
+# degrees.
+FAR_APART = f"""{GROUP} AND gaia_lo_ra IS NOT NULL AND gaia_hi_ra IS NOT NULL
+              AND degrees(2*asin(least(1, sqrt(
+                    power(sin(radians(gaia_hi_dec - gaia_lo_dec)/2), 2) +
+                    cos(radians(gaia_lo_dec))*cos(radians(gaia_hi_dec))*
+                    power(sin(radians((gaia_hi_ra - gaia_lo_ra) * 15)/2), 2))))) > 1.0"""
 
-def classify_group(ids):
-    """
-    Classify one set of athyg ids sharing a Gaia source_id.
-
-    Returns "created" if any row in the group was inserted by a supplement import, else
-    "inherited". A group is only blamed on the pipeline if the pipeline actually put a row
-    in it -- a pair of AT-HYG rows is not ours to explain.
-
-    Pure so it can be tested without a database; the SQL guard in 07_import_gcns.sql
-    expresses the same rule.
-    """
-    if any(i >= FIRST_IMPORTED_ID for i in ids):
-        return "created"
-    return "inherited"
+# What main() counts, in order, and the created groups' ids for the failure message --
+# gathered by the same pass rather than a second query after a failure.
+DUPLICATE_CONDITIONS = [CREATED, INHERITED, FAR_APART]
+DUPLICATE_EXAMPLES = f"array_agg(gaia) FILTER (WHERE {CREATED})"
 
 
-def summarise(groups):
+def report_duplicates(counts, examples, quiet=False):
     """
-    @param groups mapping of gaia source_id -> list of athyg ids
-    @return (created, inherited) counts
+    Print the three duplicate checks from their DUPLICATE_CONDITIONS counts and the
+    DUPLICATE_EXAMPLES aggregate, and return how many problems they add.
     """
-    created = inherited = 0
-    for ids in groups.values():
-        if len(ids) < 2:
-            continue
-        if classify_group(ids) == "created":
-            created += 1
-        else:
-            inherited += 1
-    return created, inherited
+    created, inherited, far_apart = counts
+    problems = report(
+        "Gaia ids duplicated by a row this pipeline inserted",
+        created,
+        "a supplement import created a star that already existed;"
+        " check the NOT EXISTS guards on the 'new' inserts in"
+        " 06_import_cns5.sql and 07_import_gcns.sql",
+        quiet,
+    )
+    if created:
+        print(f"              -> example source_id(s): {', '.join(sorted(examples)[:3])}")
+    problems += report(
+        "Gaia ids duplicated within AT-HYG",
+        inherited,
+        "these are normally real close binaries sharing one Gaia source;"
+        " confirm that before raising the baseline",
+        quiet,
+        baseline=KNOWN_INHERITED_BASELINE,
+        known="real close binaries: Tycho-2 resolves both components,"
+        " Gaia DR3 records one source. Kept deliberately.",
+    )
+    problems += report(
+        "rows sharing a Gaia id but over 1 degree apart",
+        far_apart,
+        "not a binary; the source_id is attached to the wrong star. Decode the id's"
+        " HEALPix pixel (source_id // 2**35, nside 4096) to find which row it really"
+        " belongs to, then retract the other with clear_gaia in db/data/athyg_overrides.csv",
+        quiet,
+    )
+    return problems
 
 
 def main():
@@ -88,6 +123,12 @@ def main():
     parser.add_argument("--quiet", action="store_true", help="only report problems")
     args = parser.parse_args()
 
+    # Imported here so validate_data.py can share this file's constants without a driver.
+    try:
+        import psycopg2
+    except ImportError:
+        return "psycopg2 is required: pip install -r db/scripts/requirements.txt"
+
     conn = psycopg2.connect(
         host=os.environ.get("DB_HOST", "hygmap-db"),
         port=int(os.environ.get("DB_PORT", "5432")),
@@ -96,87 +137,11 @@ def main():
         password=os.environ.get("DB_PASSWORD", "hygmap_pass"),
     )
 
-    problems = 0
     with conn.cursor() as cur:
-        cur.execute(
-            "SELECT gaia, array_agg(id) FROM athyg WHERE gaia IS NOT NULL"
-            " GROUP BY gaia HAVING count(*) > 1"
-        )
-        groups = {gaia: ids for gaia, ids in cur.fetchall()}
-        created, inherited = summarise(groups)
-
-        if created:
-            problems += created
-            print(f"FAIL  {created:>6,}  Gaia ids duplicated by a row this pipeline inserted")
-            print(
-                "              -> a supplement import created a star that already existed;"
-                " check the NOT EXISTS guards on the 'new' inserts in"
-                " 06_import_cns5.sql and 07_import_gcns.sql"
-            )
-            offenders = [
-                g for g, ids in groups.items() if classify_group(ids) == "created"
-            ][:3]
-            print(f"              -> example source_id(s): {', '.join(offenders)}")
-        elif not args.quiet:
-            print("ok         0  Gaia ids duplicated by a row this pipeline inserted")
-
-        if inherited > KNOWN_INHERITED_BASELINE:
-            problems += inherited - KNOWN_INHERITED_BASELINE
-            print(
-                f"FAIL  {inherited:>6,}  Gaia ids duplicated within AT-HYG"
-                f" (baseline {KNOWN_INHERITED_BASELINE},"
-                f" so {inherited - KNOWN_INHERITED_BASELINE} new)"
-            )
-            print(
-                "              -> these are normally real close binaries sharing one Gaia"
-                " source; confirm that before raising the baseline"
-            )
-        elif not args.quiet:
-            print(
-                f"ok  {inherited:>6,}  Gaia ids duplicated within AT-HYG"
-                f" (inherited, baseline {KNOWN_INHERITED_BASELINE})"
-            )
-            print(
-                "              -> real close binaries: Tycho-2 resolves both components,"
-                " Gaia DR3 records one source. Kept deliberately."
-            )
-
-        # A Gaia source is a single point on the sky. Two rows sharing an id but sitting
-        # far apart are not a binary at all -- AT-HYG 4.0 has one such case, where a
-        # Cepheus star carries a Leo star's source_id, distance, proper motion and radial
-        # velocity. Wide separation is the signature that distinguishes a bad
-        # cross-match from a genuine unresolved pair.
-        cur.execute(
-            """
-            WITH d AS (SELECT gaia FROM athyg WHERE gaia IS NOT NULL
-                       GROUP BY gaia HAVING count(*) > 1),
-                 p AS (SELECT a.gaia, min(a.id) lo, max(a.id) hi
-                       FROM athyg a JOIN d USING (gaia) GROUP BY a.gaia)
-            SELECT count(*) FROM p
-            JOIN athyg l ON l.id = p.lo JOIN athyg h ON h.id = p.hi
-            WHERE l.ra IS NOT NULL AND h.ra IS NOT NULL
-              -- athyg.ra is in HOURS, so it must be multiplied by 15 before conversion to
-              -- radians. Omitting that understates every RA difference by a factor of 15
-              -- and silently shrinks the separations this check exists to find -- it made
-              -- the known 95.3 degree case read as 29.2 degrees.
-              AND degrees(2*asin(least(1, sqrt(
-                    power(sin(radians(h.dec - l.dec)/2), 2) +
-                    cos(radians(l.dec))*cos(radians(h.dec))*
-                    power(sin(radians((h.ra - l.ra) * 15)/2), 2))))) > 1.0
-            """
+        *counts, examples = count_filtered(
+            cur, DUPLICATE_CONDITIONS, source=ATHYG_WITH_GAIA_GROUPS, extra=[DUPLICATE_EXAMPLES]
         )
-        (far_apart,) = cur.fetchone()
-        if far_apart:
-            problems += far_apart
-            print(f"FAIL  {far_apart:>6,}  rows sharing a Gaia id but over 1 degree apart")
-            print(
-                "              -> not a binary; the source_id is attached to the wrong"
-                " star. Decode the id's HEALPix pixel (source_id // 2**35, nside 4096)"
-                " to find which row it really belongs to, then retract the other with"
-                " clear_gaia in db/data/athyg_overrides.csv"
-            )
-        elif not args.quiet:
-            print("ok         0  rows sharing a Gaia id but over 1 degree apart")
+    problems = report_duplicates(counts, examples, args.quiet)
 
     conn.close()
     if problems:
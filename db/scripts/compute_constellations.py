@@ -22,19 +22,26 @@ Constellation boundaries run along lines of constant right ascension and declina
 the **B1875.0** equinox, which is what Delporte used when the IAU fixed them in 1930. A J2000
 position cannot be compared against them directly; it has to be transformed to B1875 first.
 
-astropy's `get_constellation` does that and is the reference implementation, so it is what runs
-here. Two independent implementations are carried deliberately:
-
-  * astropy (authoritative) -- correctly handles that B1875.0 is a *Besselian* epoch in the
-    **FK4** frame, so the transform is not merely a precession rotation: it includes the
-    FK4/FK5 equinox correction and the E-terms of aberration, both sub-arcsecond.
-  * `constellation_independent()` below -- IAU 1976 precession angles plus a scan of
-    db/data/constellation_boundaries.csv (Roman 1987, VizieR VI/42).
-
-They agree on 99.993% of a 30,000-star sample. The hand-rolled version was written first, and
-measuring it against astropy is what surfaced why the difference exists: every disagreement was
-a star within about one arcsecond of a boundary, where the FK4 frame terms decide the answer.
-One example precessed to dec -25.49998738 against a boundary at exactly -25.5000.
+astropy's `get_constellation` does that and is the reference implementation, so it decides what
+is written. Three implementations are carried deliberately:
+
+  * astropy (authoritative) -- transforms ICRS to GCRS at J2000, which applies annual aberration
+    and light deflection, then bias-precesses to the B1875 equinox (IAU 2006). The aberration
+    term moves a star by up to about 20 arcseconds.
+  * `constellations_fast()` -- the same transform chain called through erfa on whole arrays,
+    then a precomputed lookup over the boundary table (`BoundaryLookup`). Its B1875 positions
+    agree with astropy's to about 1e-7 arcsec, and stars within EDGE_MARGIN_ARCSEC of an edge
+    are handed to astropy anyway, so its output is astropy's. This is what the script runs.
+  * `constellation_independent()` below -- IAU 1976 precession plus a scan of
+    db/data/constellation_boundaries.csv (Roman 1987, VizieR VI/42), with no aberration.
+
+The independent version agrees with astropy on 99.993% of a 30,000-star sample of real stars
+(99.97% of uniformly random positions). The hand-rolled version was written first, and measuring
+it against astropy is what surfaced the difference: every disagreement is a star close enough to
+a boundary -- within about 25 arcseconds -- that astropy's aberration term moves it across.
+These were once put down to the FK4 frame terms (E-terms, equinox correction); those are
+sub-arcsecond and are not what astropy applies. One example precessed to dec -25.49998738
+against a boundary at exactly -25.5000.
 
 That check is kept as a test rather than deleted, because two implementations agreeing is
 stronger evidence than either alone -- and it records the exact cost of dropping the astropy
@@ -49,6 +56,8 @@ USAGE
     docker compose up -d hygmap-db
     DB_PASS=... python3 db/scripts/compute_constellations.py
     DB_PASS=... python3 db/scripts/compute_constellations.py --verify   # self-check only
+    DB_PASS=... python3 db/scripts/compute_constellations.py --check-all
+    DB_PASS=... python3 db/scripts/compute_constellations.py --copy  # no CSV; see copy_stage.py
 
 Attribution: constellation boundary table from Roman, N.G. (1987), "Identification of a
 Constellation from a Position", PASP 99, 695. VizieR catalogue VI/42.
@@ -58,15 +67,28 @@ import csv
 import math
 import os
 import sys
+from collections import Counter
+
+import numpy as np
 
 BOUNDARIES_CSV = os.path.join(os.path.dirname(__file__), "..", "data", "constellation_boundaries.csv")
 OUTPUT_CSV = os.path.join(os.path.dirname(__file__), "..", "data", "constellations.csv")
+# The import that reads OUTPUT_CSV, and defines the staging table --copy fills instead.
+STAGE_SQL = "10_import_constellations.sql"
 
 # Julian Date of B1875.0. Besselian epochs are not Julian epochs; B1875.0 is JD 2405889.25855,
 # which is why this is a literal rather than a year arithmetic expression.
 JD_B1875 = 2405889.25855
 JD_J2000 = 2451545.0
 
+# Stars within this distance of a boundary edge, in B1875, are re-run through astropy by
+# constellations_fast(). The array transform agrees with astropy's to 1e-7 arcsec, so this
+# only has to cover rounding at the edge itself.
+EDGE_MARGIN_ARCSEC = 0.01
+
+# Rows per round trip when reading positions through a server-side cursor.
+FETCH_ROWS = 100_000
+
 # Known positions used by --verify. Chosen to cover a pole, both hemispheres, and a couple of
 # stars close to a boundary where a missing precession step shows up.
 VERIFY_CASES = [
@@ -137,6 +159,102 @@ def constellation_independent(ra_hours: float, dec_deg: float, boundaries) -> st
     return None
 
 
+def b1875_positions(ra_hours, dec_deg):
+    """
+    J2000 (ICRS) positions, as arrays, transformed exactly as astropy's get_constellation
+    transforms them: to GCRS at J2000 (annual aberration and light deflection), then
+    IAU 2006 bias-precession to the equinox of B1875. Returns (ra_hours, dec_deg).
+
+    This is astropy's own transform chain, called through erfa directly, so the positions
+    agree with astropy's to about 1e-7 arcsec.
+    """
+    import erfa
+
+    astrom = erfa.apcg13(JD_J2000, 0.0)  # geocentric observer, Earth ephemeris at J2000
+    ra, dec = erfa.atciqz(np.radians(np.asarray(ra_hours) * 15.0), np.radians(dec_deg), astrom)
+    precession = erfa.fw2m(*erfa.pfw06(JD_B1875, 0.0))
+    ra, dec = erfa.c2s(erfa.s2c(ra, dec) @ precession.T)
+    return np.degrees(erfa.anp(ra)) / 15.0, np.degrees(dec)
+
+
+class BoundaryLookup:
+    """
+    Roman's first-match scan, answered for a whole array of B1875 positions at once.
+
+    The scan takes the first row, in file order, whose declination floor is at or below
+    the star and whose RA range holds it. Because the rows descend in declination, the
+    rows a star can match are a suffix of the table, starting at its declination band.
+    Because every RA range starts and ends on one of a few hundred breakpoints, the RA
+    axis divides into cells that each row either covers whole or misses. So the answer
+    depends only on (RA cell, declination band), and all of those are precomputed here:
+    labelling a star is then two binary searches and one table read.
+
+    astropy's get_constellation instead tests every star against the rows one at a time,
+    357 masked passes over the whole input, and that loop, not the coordinate transform,
+    is where its time goes.
+    """
+
+    def __init__(self, boundaries):
+        ra_low, ra_up, dec_low = (np.array([b[i] for b in boundaries]) for i in range(3))
+        if np.any(np.diff(dec_low) > 0):
+            raise ValueError("boundary rows are not in descending declination order")
+        self.names = np.array([b[3] for b in boundaries] + [None], dtype=object)
+        self.dec_low_ascending = dec_low[::-1]
+        self.ra_breaks = np.unique(np.concatenate([ra_low, ra_up, [0.0, 24.0]]))
+        cells = self.ra_breaks[:-1]
+        covers = (ra_low <= cells[:, None]) & (cells[:, None] < ra_up)  # cell x row
+        n = len(boundaries)
+        # first[cell, k]: the first row from k onwards covering the cell; n for none.
+        self.first = np.full((len(cells), n + 1), n)
+        for k in range(n - 1, -1, -1):
+            self.first[:, k] = np.where(covers[:, k], k, self.first[:, k + 1])
+
+    def __call__(self, ra_1875, dec_1875):
+        """Constellation abbreviations (object array; None if unresolved) for B1875 positions."""
+        cell = np.searchsorted(self.ra_breaks, ra_1875, side="right") - 1
+        cell = np.clip(cell, 0, len(self.ra_breaks) - 2)
+        # Rows whose floor is above the star cannot match: skip past them.
+        band = len(self.dec_low_ascending) - np.searchsorted(self.dec_low_ascending, dec_1875, side="right")
+        return self.names[self.first[cell, band]]
+
+    def near_edge(self, ra_1875, dec_1875, margin_arcsec):
+        """Positions within `margin_arcsec` of any RA break or declination floor in the table."""
+        margin = margin_arcsec / 3600.0
+        i = np.clip(np.searchsorted(self.dec_low_ascending, dec_1875), 1, len(self.dec_low_ascending) - 1)
+        ddec = np.minimum(np.abs(dec_1875 - self.dec_low_ascending[i - 1]),
+                          np.abs(dec_1875 - self.dec_low_ascending[i]))
+        j = np.clip(np.searchsorted(self.ra_breaks, ra_1875), 1, len(self.ra_breaks) - 1)
+        dra_hours = np.minimum(np.abs(ra_1875 - self.ra_breaks[j - 1]), np.abs(ra_1875 - self.ra_breaks[j]))
+        dra = dra_hours * 15.0 * np.cos(np.radians(dec_1875))
+        return (ddec < margin) | (dra < margin)
+
+
+def constellations_fast(ra_hours, dec_deg, lookup, margin_arcsec=EDGE_MARGIN_ARCSEC):
+    """
+    Constellations for arrays of J2000 positions: b1875_positions() and a BoundaryLookup,
+    with astropy re-run on any star within `margin_arcsec` of a boundary.
+
+    The transform matches astropy's, but astropy tests ral < ra < rau where Roman's scan
+    takes ral <= ra < rau, and a star within rounding of an edge can land either side.
+    Those stars are few -- tens in a million -- so they are simply given astropy's answer,
+    which keeps the output exactly the authoritative one. Returns (names, rechecked,
+    changed): the object array, how many were re-run, and how many of those astropy
+    decided differently.
+    """
+    ra_1875, dec_1875 = b1875_positions(ra_hours, dec_deg)
+    names = lookup(ra_1875, dec_1875)
+    edge = np.flatnonzero(lookup.near_edge(ra_1875, dec_1875, margin_arcsec))
+    changed = 0
+    if len(edge):
+        astro = np.array(
+            constellations_astropy(list(zip(np.asarray(ra_hours)[edge], np.asarray(dec_deg)[edge]))),
+            dtype=object,
+        )
+        changed = int((astro != names[edge]).sum())
+        names[edge] = astro
+    return names, len(edge), changed
+
+
 def constellations_astropy(positions):
     """
     Authoritative constellation lookup, vectorised.
@@ -161,22 +279,73 @@ def verify(boundaries) -> int:
     """Check the algorithm against known stars. Returns the number of failures."""
     failures = 0
     astro = constellations_astropy([(ra, dec) for _n, ra, dec, _e in VERIFY_CASES])
-    print(f"{'star':<18} {'expected':<9} {'astropy':<9} {'no-deps':<9} result")
-    for (name, ra, dec, expected), got_a in zip(VERIFY_CASES, astro):
+    # margin 0: compare the array engine's own answer, not astropy's re-check of it
+    fast, _, _ = constellations_fast(
+        [c[1] for c in VERIFY_CASES], [c[2] for c in VERIFY_CASES], BoundaryLookup(boundaries), 0.0
+    )
+    print(f"{'star':<18} {'expected':<9} {'astropy':<9} {'arrays':<9} {'no-deps':<9} result")
+    for (name, ra, dec, expected), got_a, got_f in zip(VERIFY_CASES, astro, fast):
         got_i = constellation_independent(ra, dec, boundaries)
-        ok = got_a == expected and got_i == expected
+        ok = got_a == expected and got_f == expected and got_i == expected
         failures += 0 if ok else 1
         print(
-            f"{name:<18} {expected:<9} {got_a or '(none)':<9} {got_i or '(none)':<9} "
-            f"{'ok' if ok else 'MISMATCH'}"
+            f"{name:<18} {expected:<9} {got_a or '(none)':<9} {got_f or '(none)':<9} "
+            f"{got_i or '(none)':<9} {'ok' if ok else 'MISMATCH'}"
         )
     return failures
 
 
+def fetch_positions(conn, where):
+    """(ids, ra_hours, dec_deg, con) arrays for the athyg rows matching `where`, streamed."""
+    ids, ras, decs, cons = [], [], [], []
+    with conn.cursor(name="constellation_positions") as cur:
+        cur.itersize = FETCH_ROWS
+        cur.execute(f"SELECT id, ra, dec, con FROM athyg WHERE {where} ORDER BY id")
+        while True:
+            rows = cur.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            star_ids, ra, dec, con = zip(*rows)
+            ids.extend(star_ids)
+            ras.append(np.array(ra, dtype=np.float64))
+            decs.append(np.array(dec, dtype=np.float64))
+            cons.extend(con)
+    if not ids:
+        return [], np.empty(0), np.empty(0), []
+    return ids, np.concatenate(ras), np.concatenate(decs), cons
+
+
+def check_all(conn, lookup) -> int:
+    """
+    Label every star with a position and compare with the `con` it already has. Writes
+    nothing; a cheap consistency check on the whole catalog now that labelling 2.84M stars
+    takes seconds rather than being something only the NULL residue could afford. Returns
+    1 if any stored `con` disagrees, so it can gate a build.
+    """
+    ids, ra, dec, stored = fetch_positions(
+        conn, "con IS NOT NULL AND ra IS NOT NULL AND dec IS NOT NULL"
+    )
+    print(f"\nstars with a constellation: {len(ids):,}")
+    computed, rechecked, _ = constellations_fast(ra, dec, lookup)
+    differ = [(i, s, c) for i, s, c in zip(ids, stored, computed) if s != c]
+    print(f"  agree:     {len(ids) - len(differ):,}")
+    print(f"  disagree:  {len(differ):,} ({rechecked:,} near a boundary were checked by astropy)")
+    for pair, count in Counter((s, c) for _i, s, c in differ).most_common(10):
+        print(f"    stored {pair[0]} computed {pair[1]}: {count:,}")
+    if differ:
+        print(f"  e.g. athyg ids {', '.join(str(i) for i, _s, _c in differ[:10])}")
+        return 1
+    return 0
+
+
 def main() -> int:
     ap = argparse.ArgumentParser(description=__doc__)
     ap.add_argument("--verify", action="store_true", help="run the self-check and exit")
     ap.add_argument("--dry-run", action="store_true", help="report, write nothing")
+    ap.add_argument("--copy", action="store_true",
+                    help="stream the rows into the constellation_stage table instead of the CSV")
+    ap.add_argument("--check-all", action="store_true",
+                    help="compare every star's stored con with the computed one; write nothing")
     args = ap.parse_args()
 
     boundaries = load_boundaries()
@@ -194,43 +363,41 @@ def main() -> int:
     except ImportError:
         return "psycopg2 is required: pip install -r db/scripts/requirements.txt"
 
-    conn = psycopg2.connect(
+    conn_params = dict(
         host=os.environ.get("DB_HOST", "localhost"),
         port=os.environ.get("DB_PORT", "5432"),
         dbname=os.environ.get("DB_NAME", "hygmap"),
         user=os.environ.get("DB_USER", "hygmap_user"),
         password=os.environ.get("DB_PASS", os.environ.get("POSTGRES_PASSWORD", "")),
     )
-    with conn, conn.cursor() as cur:
-        # Sol is excluded deliberately. It sits at the coordinate origin because it *is* the
-        # origin, not because it lies at RA 0h Dec 0 -- so the lookup would place the Sun in
-        # Pisces, which is meaningless: you cannot be in a constellation you are inside of.
-        # It is the only row at the exact origin (verified), and its con is correctly NULL.
-        cur.execute(
-            "SELECT id, ra, dec FROM athyg "
-            "WHERE con IS NULL AND ra IS NOT NULL AND dec IS NOT NULL "
-            "  AND NOT (ra = 0 AND dec = 0) "
-            "ORDER BY id"
-        )
-        targets = cur.fetchall()
-    conn.close()
-
-    print(f"\nstars missing a constellation: {len(targets):,}")
-    if not targets:
+    conn = psycopg2.connect(**conn_params)
+    lookup = BoundaryLookup(boundaries)
+    try:
+        with conn:
+            if args.check_all:
+                return check_all(conn, lookup)
+            # Sol is excluded deliberately. It sits at the coordinate origin because it *is* the
+            # origin, not because it lies at RA 0h Dec 0 -- so the lookup would place the Sun
+            # in Pisces, which is meaningless: you cannot be in a constellation you are
+            # inside of. It is the only row at the exact origin (verified), and its con is
+            # correctly NULL.
+            ids, ra, dec, _ = fetch_positions(
+                conn,
+                "con IS NULL AND ra IS NOT NULL AND dec IS NOT NULL AND NOT (ra = 0 AND dec = 0)",
+            )
+    finally:
+        conn.close()
+
+    print(f"\nstars missing a constellation: {len(ids):,}")
+    if not ids:
         print("nothing to do")
         return 0
 
-    rows, unresolved = [], 0
-    BATCH = 20000  # keeps peak memory sane on 280k+ rows without slowing things down
-    for start in range(0, len(targets), BATCH):
-        chunk = targets[start : start + BATCH]
-        cons = constellations_astropy([(float(r[1]), float(r[2])) for r in chunk])
-        for (star_id, _ra, _dec), con in zip(chunk, cons):
-            if not con:
-                unresolved += 1
-                continue
-            rows.append({"athyg_id": star_id, "con": con})
-        print(f"  {min(start + BATCH, len(targets)):,}/{len(targets):,}", flush=True)
+    cons, rechecked, changed = constellations_fast(ra, dec, lookup)
+    rows = [{"athyg_id": star_id, "con": con} for star_id, con in zip(ids, cons) if con]
+    unresolved = len(ids) - len(rows)
+    print(f"  {rechecked:,} within {EDGE_MARGIN_ARCSEC} arcsec of a boundary, checked by astropy "
+          f"({changed:,} changed)")
 
     print(f"\n  resolved:   {len(rows):,}")
     print(f"  unresolved: {unresolved:,}")
@@ -239,6 +406,17 @@ def main() -> int:
         print("\n--dry-run: not writing")
         return 0
 
+    if args.copy:
+        from copy_stage import copy_to_stage, finish_hint
+
+        conn = psycopg2.connect(**conn_params)
+        try:
+            copy_to_stage(conn, STAGE_SQL, "constellation_stage", rows, fieldnames=["athyg_id", "con"])
+        finally:
+            conn.close()
+        print(f"\nstaged {len(rows):,} rows in constellation_stage; import with: {finish_hint(STAGE_SQL)}")
+        return 0
+
     path = os.path.normpath(OUTPUT_CSV)
     with open(path, "w", newline="") as fh:
         writer = csv.DictWriter(fh, fieldnames=["athyg_id", "con"])
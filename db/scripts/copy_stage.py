@@ -0,0 +1,112 @@
+"""
+copy_stage.py -- hand a script's output rows straight to Postgres instead of a CSV.
+
+match_cns5.py, match_gcns.py, match_athyg_v3.py and compute_constellations.py write a CSV
+under db/data/, and the matching db/sql file reads it back into a TEMP staging table with
+COPY. That is the right shape for the build -- the CSV is the reviewed, committed artifact
+-- but for someone iterating on a matcher every rematch was a file written, a file copied
+where the database can see it, and a second manual step to read it back.
+
+With the scripts' copy option the same rows go to the same database over COPY FROM STDIN
+(psycopg2's copy_expert), into an UNLOGGED table named after the SQL file's staging table.
+The SQL file, run with `-v from_stage=1`, takes its rows from there instead of from /data:
+
+    CNS5_COPY=1 python match_cns5.py
+    psql -v from_stage=1 -f db/sql/06_import_cns5.sql
+
+Two things keep the paths identical:
+
+  * The table is created from the column list of the SQL file's own CREATE TEMP TABLE
+    (stage_columns), so there is one definition and it cannot drift.
+  * The rows are streamed as the CSV the script would have written -- the same writer,
+    header and all, with COPY's options matching the file path's -- produced a few
+    thousand rows at a time as COPY reads, so no file and no full copy of the text exists.
+
+Without the option nothing changes: the CSV is written, and the import reads it.
+"""
+import csv
+import io
+import os
+import re
+
+SQL_DIR = os.path.join(os.path.dirname(__file__), "..", "sql")
+
+# Rows formatted per read() from COPY. psycopg2 asks for 8 kB at a time; this only
+# bounds how much text is held between reads.
+ROWS_PER_CHUNK = 5_000
+
+
+def stage_columns(sql_file, table, sql_dir=SQL_DIR):
+    """The column definitions of `CREATE TEMP TABLE <table> (...)` in a db/sql file."""
+    with open(os.path.join(sql_dir, sql_file)) as fh:
+        sql = fh.read()
+    match = re.search(rf"CREATE TEMP TABLE {table} \((.*?)\n\);", sql, re.S)
+    if not match:
+        raise ValueError(f"{sql_file} has no CREATE TEMP TABLE {table}")
+    return match.group(1).strip()
+
+
+class CsvStream:
+    """
+    A read()-able file over rows, formatted as csv.writer (sequences, after `header`) or
+    csv.DictWriter (dicts, with `fieldnames`) would format them, header line first.
+    """
+
+    def __init__(self, rows, header=None, fieldnames=None):
+        if not (header or fieldnames):
+            raise ValueError("a header is required: COPY is told the first line is one")
+        self.rows = iter(rows)
+        self.buffer = io.StringIO()
+        if fieldnames:
+            self.writer = csv.DictWriter(self.buffer, fieldnames=fieldnames)
+            self.writer.writeheader()
+        else:
+            self.writer = csv.writer(self.buffer)
+            self.writer.writerow(header)
+        self.pending, self.pos = self._take(), 0
+
+    def _take(self):
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+    def read(self, size=-1):
+        # pending[pos:] is what has been formatted but not yet read; an offset rather than
+        # slicing the remainder off on every 8 kB read, which would recopy it each time.
+        while size < 0 or len(self.pending) - self.pos < size:
+            n = 0
+            for n, row in enumerate(self.rows, start=1):
+                self.writer.writerow(row)
+                if n == ROWS_PER_CHUNK:
+                    break
+            if not n:
+                break
+            self.pending, self.pos = self.pending[self.pos:] + self._take(), 0
+        end = len(self.pending) if size < 0 else self.pos + size
+        out = self.pending[self.pos:end]
+        self.pos = min(end, len(self.pending))
+        return out
+
+
+def copy_to_stage(conn, sql_file, table, rows, header=None, fieldnames=None):
+    """
+    Replace the UNLOGGED table public.<table> with `rows`, over COPY FROM STDIN, and
+    commit. Returns the number of rows copied.
+    """
+    columns = stage_columns(sql_file, table)
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS public.{table}")
+        cur.execute(f"CREATE UNLOGGED TABLE public.{table} ({columns})")
+        cur.copy_expert(
+            f"COPY public.{table} FROM STDIN WITH (FORMAT csv, HEADER true, NULL '')",
+            CsvStream(rows, header=header, fieldnames=fieldnames),
+        )
+        count = cur.rowcount
+    conn.commit()
+    return count
+
+
+def finish_hint(sql_file):
+    """The command that imports what copy_to_stage() left behind."""
+    return f"psql -v from_stage=1 -f db/sql/{sql_file}"
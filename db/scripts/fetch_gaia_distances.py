@@ -43,27 +43,47 @@ USAGE
     docker compose up -d hygmap-db
     pip install -r db/scripts/requirements.txt
     DB_PASS=... python3 db/scripts/fetch_gaia_distances.py
+
+FETCHING
+--------
+Source ids go to the TAP service CHUNK at a time, JOBS requests in flight (--jobs, env
+GAIA_TAP_JOBS). Each chunk's CSV response is kept in CACHE_DIR under a hash of its query,
+written only once complete, so an interrupted or partly failed run picks up where it
+stopped: rerun it and only the missing chunks are requested. The catalogue is static, so a
+cached chunk never goes stale; delete the directory (or pass --no-cache) to force a refetch.
+GAIA_TAP_URL points the script at another TAP endpoint -- a mirror, or the stub server the
+tests run.
 """
 import argparse
 import csv
+import hashlib
 import io
 import os
 import sys
 import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 try:
     import psycopg2
 except ImportError:
     sys.exit("psycopg2 is required: pip install -r db/scripts/requirements.txt")
 
-TAP_URL = "https://tapvizier.cds.unistra.fr/TAPVizieR/tap/sync"
+TAP_URL = os.environ.get("GAIA_TAP_URL", "https://tapvizier.cds.unistra.fr/TAPVizieR/tap/sync")
 CATALOGUE = "I/352/gedr3dis"  # Bailer-Jones+ 2021, distances from Gaia EDR3 parallaxes
 OUTPUT = os.path.join(os.path.dirname(__file__), "..", "data", "gaia_distances.csv")
 
 # EDR3 and DR3 share source_ids, so athyg.gaia (DR3) matches this catalogue directly.
 CHUNK = 60
 
+# Requests in flight at once. VizieR answers a 60-id query in a second or two, nearly all of
+# it round trip, so a few concurrent requests divide the wall time; more than this is
+# impolite to a shared public service.
+JOBS = int(os.environ.get("GAIA_TAP_JOBS", "4"))
+
+# One file per answered chunk; see FETCHING above. Not committed (.gitignore).
+CACHE_DIR = os.path.join(os.path.dirname(__file__), ".tap_cache")
+
 # Brighter than any real star: below this the distance is what is wrong.
 ABSMAG_FLOOR = -10.0
 
@@ -87,33 +107,98 @@ TARGET_SQL = """
 """
 
 
-def fetch_distances(source_ids):
-    """Query the TAP service in chunks. Returns {source_id: (rgeo, rpgeo)}."""
+def chunk_query(chunk):
+    """The ADQL for one chunk of source ids. Sorted, so the same id set is the same query."""
+    ids = ",".join(sorted(chunk, key=int))
+    return f'SELECT "Source", rgeo, rpgeo FROM "{CATALOGUE}" WHERE "Source" IN ({ids})'
+
+
+def cache_path(cache_dir, query):
+    return os.path.join(cache_dir, hashlib.sha256(query.encode()).hexdigest()[:32] + ".csv")
+
+
+def query_tap(query, tap_url=TAP_URL):
+    """Run one synchronous TAP query; the CSV body as text."""
+    payload = urllib.parse.urlencode(
+        {"REQUEST": "doQuery", "LANG": "ADQL", "FORMAT": "csv", "QUERY": query}
+    ).encode()
+    with urllib.request.urlopen(tap_url, data=payload, timeout=180) as resp:
+        return resp.read().decode()
+
+
+def fetch_chunk(chunk, tap_url=TAP_URL, cache_dir=CACHE_DIR):
+    """One chunk's CSV, from the cache if a previous run already got it. (body, cached)."""
+    query = chunk_query(chunk)
+    path = cache_path(cache_dir, query) if cache_dir else None
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            return fh.read(), True
+    body = query_tap(query, tap_url)
+    if path:
+        # Written aside and renamed, so a run killed mid-write leaves no truncated chunk
+        # for the next one to trust.
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(body)
+        os.replace(tmp, path)
+    return body, False
+
+
+def parse_distances(body):
+    """{source_id: (rgeo, rpgeo)} from one TAP CSV response."""
     out = {}
-    for i in range(0, len(source_ids), CHUNK):
-        chunk = source_ids[i : i + CHUNK]
-        query = (
-            f'SELECT "Source", rgeo, rpgeo FROM "{CATALOGUE}" '
-            f'WHERE "Source" IN ({",".join(chunk)})'
-        )
-        payload = urllib.parse.urlencode(
-            {"REQUEST": "doQuery", "LANG": "ADQL", "FORMAT": "csv", "QUERY": query}
-        ).encode()
-        with urllib.request.urlopen(TAP_URL, data=payload, timeout=180) as resp:
-            body = resp.read().decode()
-        for row in csv.DictReader(io.StringIO(body)):
-            if row.get("rgeo"):
-                out[row["Source"]] = (
-                    float(row["rgeo"]),
-                    float(row["rpgeo"]) if row.get("rpgeo") else None,
-                )
-        print(f"  queried {min(i + CHUNK, len(source_ids))}/{len(source_ids)}", flush=True)
+    for row in csv.DictReader(io.StringIO(body)):
+        if row.get("rgeo"):
+            out[row["Source"]] = (
+                float(row["rgeo"]),
+                float(row["rpgeo"]) if row.get("rpgeo") else None,
+            )
+    return out
+
+
+def fetch_distances(source_ids, tap_url=TAP_URL, jobs=JOBS, cache_dir=CACHE_DIR):
+    """
+    Query the TAP service in chunks, `jobs` at a time. Returns {source_id: (rgeo, rpgeo)}.
+
+    Chunks that fail do not stop the others: every chunk that can be fetched is fetched
+    and cached, then RuntimeError reports the failures, and a rerun requests only those.
+    cache_dir=None disables the cache.
+    """
+    chunks = [source_ids[i : i + CHUNK] for i in range(0, len(source_ids), CHUNK)]
+    out, failed, done, cached = {}, [], 0, 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {pool.submit(fetch_chunk, chunk, tap_url, cache_dir): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            done += len(chunk)
+            try:
+                body, from_cache = future.result()
+            except Exception as exc:  # network or HTTP errors alike: report, keep going
+                failed.append((chunk, exc))
+                print(f"  chunk starting {chunk[0]} failed: {exc}", flush=True)
+                continue
+            cached += from_cache
+            out.update(parse_distances(body))
+            print(f"  queried {done}/{len(source_ids)}", flush=True)
+    if cached:
+        print(f"  {cached} of {len(chunks)} chunks from cache", flush=True)
+    if failed:
+        message = f"{len(failed)} of {len(chunks)} chunks failed"
+        if cache_dir:
+            message += f"; rerun to fetch only those (the rest are cached in {cache_dir})"
+        raise RuntimeError(message)
     return out
 
 
 def main() -> int:
     ap = argparse.ArgumentParser(description="Fetch Bailer-Jones distances")
     ap.add_argument("--dry-run", action="store_true", help="report, write nothing")
+    ap.add_argument("--jobs", type=int, default=JOBS,
+                    help=f"concurrent TAP requests (default {JOBS}, env GAIA_TAP_JOBS)")
+    ap.add_argument("--tap-url", default=TAP_URL, help="TAP sync endpoint (env GAIA_TAP_URL)")
+    ap.add_argument("--no-cache", action="store_true",
+                    help=f"neither read nor write the chunk cache in {os.path.normpath(CACHE_DIR)}")
     args = ap.parse_args()
 
     conn = psycopg2.connect(
@@ -133,7 +218,15 @@ def main() -> int:
         print("nothing to do")
         return 0
 
-    found = fetch_distances([str(t[1]) for t in targets])
+    try:
+        found = fetch_distances(
+            [str(t[1]) for t in targets],
+            tap_url=args.tap_url,
+            jobs=args.jobs,
+            cache_dir=None if args.no_cache else CACHE_DIR,
+        )
+    except RuntimeError as exc:
+        return str(exc)
     print(f"\nBailer-Jones has a distance for {len(found)}/{len(targets)}")
 
     rows, beyond_display, missing = [], 0, 0
@@ -0,0 +1,165 @@
+"""
+fixed_width.py -- fixed-width catalog files, read a line or a whole column at a time.
+
+Shared by match_cns5.py (cns5.dat) and match_gcns.py (table1c.dat). Each script declares
+its layout once as a list of Field -- the byte positions from the catalog's ReadMe -- and
+the same table drives both readers here:
+
+  * parse_record() turns one line into a dict, for tests and one-off inspection.
+  * read_columns() reads a whole file into one typed numpy array per field. It takes a
+    chunk of lines at a time and slices every field out of that chunk as a 2-D byte
+    array, so nothing per line or per field goes through Python's float().
+
+Before this, both scripts read the whole file with readlines() and built a dict per line
+with a safe_float() call per field. That held the file and every dict at once. For GCNS's
+331,312 lines it was tolerable; a 200 pc Gaia sample, or DR4, would not have been. On a
+file of that size the columns take 1.8 s to read, against 3.6 s for the per-line parse,
+and rows the scripts filter out (the Sun, GCNSprob < 0.5) never become dicts at all.
+
+Missing values, in both readers: a blank field or "-" (and, for numbers, "nan") is None
+per record, NaN in a float column, INT_MISSING in an int column and "" in a str column.
+The two scripts used to disagree at the edges -- GCNS kept "-" as a string, CNS5 parsed
+"nan" as a float -- which mattered for neither catalog but meant the same bytes could
+parse differently depending on the file.
+"""
+
+import itertools
+from collections import namedtuple
+
+import numpy as np
+
+# A field occupies line[start:end] -- ReadMe bytes start+1 to end, inclusive. kind is
+# int, float or str.
+Field = namedtuple("Field", "name start end kind")
+
+# An int column's missing value. No integer field in these catalogs is negative.
+INT_MISSING = -1
+
+# Lines per chunk in read_columns(): about 150 MB of buffer for CNS5's 761-byte lines.
+CHUNK_LINES = 200_000
+
+_MISSING = {"", "-"}
+
+
+def safe_float(s):
+    """Parse a float from a fixed-width field, returning None for blanks, dashes and nan."""
+    if s is None:
+        return None
+    s = str(s).strip()
+    if s in _MISSING or s.lower() == "nan":
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def safe_int(s):
+    """Parse an int from a fixed-width field, returning None for blanks/dashes."""
+    if s is None:
+        return None
+    s = str(s).strip()
+    if s in _MISSING:
+        return None
+    try:
+        return int(s)
+    except ValueError:
+        return None
+
+
+def safe_str(s):
+    """Strip a fixed-width string field, returning None for blanks/dashes."""
+    if s is None:
+        return None
+    s = str(s).strip()
+    return None if s in _MISSING else s
+
+
+_SCALAR = {int: safe_int, float: safe_float, str: safe_str}
+
+
+def record_width(fields):
+    return max(f.end for f in fields)
+
+
+def parse_record(line, fields):
+    """One line as {field name: value or None}. Short lines are padded, as if blank."""
+    line = line.ljust(record_width(fields))
+    return {f.name: _SCALAR[f.kind](line[f.start:f.end]) for f in fields}
+
+
+def _convert(block, kind, encoding):
+    """One field of a chunk -- an (n, width) uint8 array -- as a typed column."""
+    is_space = block == ord(" ")
+    filled = (~is_space).sum(axis=1)
+    missing = (filled == 0) | ((filled == 1) & (block == ord("-")).any(axis=1))
+    raw = np.ascontiguousarray(block).view(f"S{block.shape[1]}").ravel()
+    if kind is str:
+        values = [v.strip().decode(encoding) for v in raw.tolist()]
+        return np.where(missing, "", np.array(values, dtype=str) if values else np.array([], dtype=str))
+    # numpy's own parser skips surrounding spaces and reads "nan" as NaN.
+    dtype = np.float64 if kind is float else np.int64
+    raw = np.where(missing, b"0", raw)
+    try:
+        values = raw.astype(dtype)
+    except ValueError:
+        # Something unparseable in this chunk: fall back to the scalar rule, which maps
+        # it to missing like the per-record reader does.
+        parse = _SCALAR[kind]
+        parsed = [parse(v.decode(encoding, "replace")) for v in raw.tolist()]
+        missing |= np.array([v is None for v in parsed])
+        values = np.array([0 if v is None else v for v in parsed], dtype=dtype)
+    values[missing] = np.nan if kind is float else INT_MISSING
+    return values
+
+
+def read_columns(path, fields, encoding="ascii", chunk_lines=CHUNK_LINES):
+    """
+    Read a fixed-width file into {field name: numpy array}, plus "line": each record's
+    1-based line number. Blank lines are skipped and are not records.
+
+    Positions are bytes, as the ReadMes give them. Both catalogs are single-byte text, so
+    this is also where the old character slicing put them.
+    """
+    width = record_width(fields)
+    chunks = {f.name: [] for f in fields}
+    chunks["line"] = []
+    first_line = 1
+    with open(path, "rb") as fh:
+        while True:
+            lines = list(itertools.islice(fh, chunk_lines))
+            if not lines:
+                break
+            stripped = [line.rstrip(b"\r\n") for line in lines]
+            keep = [i for i, line in enumerate(stripped) if line.strip()]
+            buf = b"".join(stripped[i][:width].ljust(width) for i in keep)
+            block = np.frombuffer(buf, dtype=np.uint8).reshape(len(keep), width)
+            for f in fields:
+                chunks[f.name].append(_convert(block[:, f.start:f.end], f.kind, encoding))
+            chunks["line"].append(np.array(keep, dtype=np.int64) + first_line)
+            first_line += len(lines)
+
+    empty = {int: np.int64, float: np.float64, str: np.str_}
+    columns = {
+        f.name: np.concatenate(chunks[f.name]) if chunks[f.name] else np.array([], dtype=empty[f.kind])
+        for f in fields
+    }
+    columns["line"] = np.concatenate(chunks["line"]) if chunks["line"] else np.array([], dtype=np.int64)
+    return columns
+
+
+def column_values(column, rows=None):
+    """A read_columns() array (or the given rows of it) as a list, None where missing."""
+    values = (column if rows is None else column[rows]).tolist()
+    if column.dtype.kind == "f":
+        return [None if v != v else v for v in values]  # NaN is the one value != itself
+    if column.dtype.kind == "i":
+        return [None if v == INT_MISSING else v for v in values]
+    return [v or None for v in values]
+
+
+def iter_records(columns, fields, rows=None):
+    """Records as dicts, as parse_record() would give them (for the per-record cascade)."""
+    names = [f.name for f in fields]
+    for values in zip(*(column_values(columns[name], rows) for name in names)):
+        yield dict(zip(names, values))
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic AT-HYG-shaped catalog, at any size, for load and scale testing.
+
+    python generate_synthetic_catalog.py --rows 3M --output athyg_synthetic.csv.gz
+    python generate_synthetic_catalog.py --rows 30M --seed 7 --output /tmp/gaia_scale.csv
+
+Until this existed, every performance question needed the real catalog: a 1.8 GB download
+from Codeberg and a full database build before the first query could be timed. And the
+one question that download cannot answer at all is what happens past AT-HYG's size -- a
+Gaia-scale import at ten times the rows is a plausible future, and nothing could be
+measured against it.
+
+The output is a CSV in exactly the layout 03_import_data.sql stages (the athyg_40.csv
+column order, header row, empty string for NULL), so it loads through the real import
+SQL and the real indexes. The stars are fake; the shape is not:
+
+  * **Density falloff from Sol.** Positions reproduce the box selectivities measured on the
+    real catalog and recorded in 02_create_indexes.sql (0.27% of rows inside +-20 pc,
+    12.72% inside +-100, 81.57% inside +-1000, ...). Each star gets a half-width drawn from
+    that CDF and sits on the surface of the cube of that half-width, so a +-w box query
+    selects the same share of this catalog as of AT-HYG, at any --rows. The points are
+    generated in galactic coordinates and written as the equatorial x_eq/y_eq/z_eq and
+    ra/dec that 03_import_data.sql converts back, so they land where they were drawn.
+  * **Positionless rows.** 0.89% of rows have no distance, like the 25,342 AT-HYG stars
+    with no usable parallax, and 143 per AT-HYG-sized catalog carry the 100000 pc
+    sentinel with dist_src 'H', so the import's sentinel clean-up has work to do.
+  * **absmag, heavily tied.** Apparent magnitudes follow a star-count law up to the
+    survey limit and absmag is derived from them, rounded to 0.01 as the real column is.
+    Being magnitude-limited, distant stars are intrinsically bright -- the Malmquist bias
+    that decides which stars `ORDER BY absmag` returns first in a wide box.
+  * **Catalog ids in the real proportions,** and on the right stars: hip, hd and hr on the
+    brightest rows, Gliese on the nearest, gaia and tyc on about 90% of everything. Each
+    number belongs to one star, as a real HIP or HD number does, so an id search is as
+    selective here as on AT-HYG.
+  * **Sparse names.** A proper name on 1 row in 5,000, Bayer and Flamsteed designations
+    on about 1 in 2,000 and 1 in 1,100, all on bright stars.
+
+Ids run from 1 and skip 5,000,000-7,999,999, which the CNS5, GCNS and supplement imports
+own, so a 30M-row catalog loads alongside athyg_supplement.csv without a collision.
+
+Output is deterministic for a given --seed and --rows. Loading it is described in the
+README ("Synthetic catalogs"); only 01, 03 and 02 apply -- the later import scripts
+cross-match real identifiers and have nothing to match here.
+"""
+import argparse
+import csv
+import gzip
+import math
+import os
+import re
+import sys
+
+import numpy as np
+
+# 03_import_data.sql's athyg_stage, in order. test_generate_synthetic_catalog.py reads
+# the column list back out of the SQL, so the two cannot drift apart silently.
+COLUMNS = [
+    "id", "tyc", "gaia", "hyg", "hip", "hd", "hr", "gl", "bayer", "flam", "con",
+    "proper", "ra", "dec", "pos_src", "dist", "x_eq", "y_eq", "z_eq", "dist_src", "mag",
+    "absmag", "ci", "mag_src", "rv", "rv_src", "pm_ra", "pm_dec", "pm_src",
+    "vx", "vy", "vz", "spect", "spect_src",
+]
+
+# AT-HYG 4.0 as loaded, for scaling the rarer populations.
+REAL_ROWS = 2_839_957
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sql")
+
+# hygmap-api's MAX_SPATIAL_RANGE: stars beyond it exist in AT-HYG but no box query can
+# reach them, so it is BOX_CDF's last knot.
+MAX_SPATIAL_RANGE = 3000.0
+
+NO_DISTANCE_SHARE = 25_342 / REAL_ROWS
+SENTINEL_SHARE = 143 / REAL_ROWS
+SENTINEL_DIST = 100000
+
+# Share of rows carrying each identifier. "bright" ids go to the rows with the smallest
+# apparent magnitude, "near" to the smallest distance, "any" to a random subset.
+ID_SHARES = {
+    "hip": (0.042, "bright"),
+    "hd": (0.126, "bright"),
+    "hr": (0.0032, "bright"),
+    "hyg": (0.042, "bright"),
+    "gl": (0.0014, "near"),
+    "tyc": (0.90, "any"),
+    "gaia": (0.90, "any"),
+}
+# Tycho-2 ids are region-number-component; 9,537 regions of up to 12,000 stars each hold
+# well over a 30M-row catalog's 27M. Gaia source ids are large and sparse.
+TYC_PER_REGION = 12_000
+GAIA_FIRST = 10**15
+GAIA_STEP = 7_919
+PROPER_SHARE = 1 / 5000
+BAYER_SHARE = 1 / 2000
+FLAM_SHARE = 1 / 1100
+
+# The catalog is magnitude-limited: apparent magnitudes follow log N(<m) ~ 0.33 m up to
+# about the Tycho-2/Gaia bright limit, with a tail of bright stars below it.
+MAG_LIMIT = 12.5
+MAG_SCALE = 1 / (0.33 * math.log(10))
+MAG_BRIGHTEST = -1.46  # Sirius
+ABSMAG_BRIGHTEST = -9.0  # check_distance_quality.py's ABSMAG_FLOOR is -10
+
+# Ids owned by the supplement imports: match_cns5.py allocates from 5000000,
+# match_gcns.py from 6000000, athyg_supplement.csv from 7000000.
+RESERVED_IDS = (5_000_000, 8_000_000)
+
+CHUNK_ROWS = 200_000
+
+# 03_import_data.sql's equatorial -> galactic rotation. Inverted here rather than
+# transposed: the published matrix is rounded to four figures and not quite orthogonal,
+# and the inverse is what makes the import land each star exactly where it was drawn.
+EQ_TO_GAL = np.array([
+    [-0.055, -0.8734, -0.4839],
+    [0.494, -0.4449, 0.747],
+    [-0.8677, -0.1979, 0.4560],
+])
+GAL_TO_EQ = np.linalg.inv(EQ_TO_GAL)
+
+CONSTELLATIONS = (
+    "And", "Ant", "Aps", "Aql", "Aqr", "Ara", "Ari", "Aur", "Boo", "CMa", "CMi", "CVn",
+    "Cae", "Cam", "Cap", "Car", "Cas", "Cen", "Cep", "Cet", "Cha", "Cir", "Cnc", "Col",
+    "Com", "CrA", "CrB", "Crt", "Cru", "Crv", "Cyg", "Del", "Dor", "Dra", "Equ", "Eri",
+    "For", "Gem", "Gru", "Her", "Hor", "Hya", "Hyi", "Ind", "LMi", "Lac", "Leo", "Lep",
+    "Lib", "Lup", "Lyn", "Lyr", "Men", "Mic", "Mon", "Mus", "Nor", "Oct", "Oph", "Ori",
+    "Pav", "Peg", "Per", "Phe", "Pic", "PsA", "Psc", "Pup", "Pyx", "Ret", "Scl", "Sco",
+    "Sct", "Ser", "Sex", "Sge", "Sgr", "Tau", "Tel", "TrA", "Tri", "Tuc", "UMa", "UMi",
+    "Vel", "Vir", "Vol", "Vul",
+)
+GREEK = (
+    "Alp", "Bet", "Gam", "Del", "Eps", "Zet", "Eta", "The", "Iot", "Kap", "Lam", "Mu",
+    "Nu", "Xi", "Omi", "Pi", "Rho", "Sig", "Tau", "Ups", "Phi", "Chi", "Psi", "Ome",
+)
+SYLLABLES = (
+    "al", "an", "ar", "ba", "bel", "ca", "dor", "el", "en", "fa", "gi", "ha", "ir", "ka",
+    "la", "lu", "ma", "mir", "na", "nor", "ra", "rig", "sa", "sha", "ta", "tar", "ul",
+    "ve", "za", "zu",
+)
+SPECTRAL_TYPES = (
+    "M3V", "M0V", "K5V", "K2V", "K0III", "G8III", "G5V", "G2V", "F8V", "F5V", "F0V",
+    "A5V", "A0V", "B8V", "B3V", "M2III", "K3III",
+)
+
+
+def measured_box_cdf():
+    """
+    (share of catalog, box half-width in pc) knots, read from the measurement recorded in
+    02_create_indexes.sql ("±20 pc 0.27%   ±50 2.80% ..."). That comment is the one copy
+    of the figures; hygmap-api/bench/catalog.py reads the same one.
+    """
+    with open(os.path.join(SQL_DIR, "02_create_indexes.sql")) as fh:
+        found = re.findall(r"±(\d+)(?: pc)? +([\d.]+)%", fh.read())
+    knots = [(round(float(pct) / 100, 6), float(width)) for width, pct in found]
+    if not knots or knots != sorted(knots):
+        raise ValueError(f"no box selectivities in 02_create_indexes.sql: {found}")
+    return ((0.0, 0.0), *knots, (1.0, MAX_SPATIAL_RANGE))
+
+
+BOX_CDF = measured_box_cdf()
+
+
+def parse_rows(text):
+    """'3000000', '3_000_000', '3M' and '500k' are all accepted."""
+    text = text.strip().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:].lower(), 1)
+    if scale > 1:
+        text = text[:-1]
+    rows = int(float(text) * scale)
+    if rows <= 0:
+        raise argparse.ArgumentTypeError("--rows must be positive")
+    return rows
+
+
+def catalog_ids(start, n):
+    """The ids of rows start..start+n-1 (0-based), stepping over RESERVED_IDS."""
+    ids = np.arange(start + 1, start + n + 1, dtype=np.int64)
+    low, high = RESERVED_IDS
+    return np.where(ids >= low, ids + (high - low), ids)
+
+
+def half_widths(u):
+    """Inverse of BOX_CDF: the box half-width that contains a share `u` of the catalog."""
+    shares, widths = zip(*BOX_CDF)
+    return np.interp(u, shares, widths)
+
+
+def cube_surface(rng, w):
+    """A uniform point on a random face of the cube of half-width `w`, one per element."""
+    n = len(w)
+    points = (2 * rng.random((n, 3)) - 1) * w[:, None]
+    face = rng.integers(0, 3, n)
+    side = np.where(rng.random(n) < 0.5, -1.0, 1.0)
+    points[np.arange(n), face] = side * w
+    return points
+
+
+def _bottom(values, share, rng):
+    """Mask of the `share` of rows with the smallest `values`, ties broken at random."""
+    k = int(round(len(values) * share))
+    if k <= 0:
+        # Below one expected row per chunk, draw it rather than losing it to rounding.
+        return rng.random(len(values)) < len(values) * share
+    order = np.lexsort((rng.random(len(values)), values))
+    mask = np.zeros(len(values), dtype=bool)
+    mask[order[:k]] = True
+    return mask
+
+
+def _numbered(mask, issued, name):
+    """
+    Catalog numbers for the rows in `mask`, counting on from the `issued[name]` given out
+    by earlier chunks, so no two stars share one. Rows outside `mask` get a number too;
+    _column() blanks it.
+    """
+    numbers = issued[name] + np.cumsum(mask)
+    issued[name] += int(mask.sum())
+    return numbers
+
+
+def _column(values, mask):
+    """Python list for csv, None (written as an empty field) where `mask` is False."""
+    out = np.asarray(values).astype(object)
+    out[~mask] = None
+    return out.tolist()
+
+
+def _proper_names(rng, n):
+    lengths = rng.integers(2, 4, n)
+    picks = rng.integers(0, len(SYLLABLES), (n, 3))
+    return [
+        "".join(SYLLABLES[j] for j in row[:length]).capitalize()
+        for row, length in zip(picks, lengths)
+    ]
+
+
+def generate_chunk(rng, start, n, issued):
+    """
+    Columns for rows start..start+n-1, as lists keyed by COLUMNS.
+
+    `issued` counts the numbers already given out for each catalog id in earlier chunks,
+    and is advanced past the ones this chunk gives out.
+    """
+    ids = catalog_ids(start, n)
+
+    # Direction and distance. Every row has an ra/dec; NO_DISTANCE and sentinel rows
+    # lose their distance afterwards, as the real ones have.
+    gal = cube_surface(rng, half_widths(rng.random(n)))
+    eq = gal @ GAL_TO_EQ.T
+    dist = np.linalg.norm(eq, axis=1)
+    dist = np.maximum(dist, 1e-3)
+    ra = np.degrees(np.arctan2(eq[:, 1], eq[:, 0])) % 360 / 15
+    dec = np.degrees(np.arcsin(np.clip(eq[:, 2] / dist, -1, 1)))
+
+    draw = rng.random(n)
+    sentinel = draw < SENTINEL_SHARE
+    no_distance = (draw >= SENTINEL_SHARE) & (draw < SENTINEL_SHARE + NO_DISTANCE_SHARE)
+    positioned = ~(sentinel | no_distance)
+
+    # Nothing real is more luminous than ABSMAG_BRIGHTEST, so a distant star cannot be as
+    # bright in the sky as a near one; the floor on mag is what keeps check_distance_quality
+    # from flagging the synthetic catalog for impossible luminosities.
+    floor = np.maximum(MAG_BRIGHTEST, ABSMAG_BRIGHTEST + 5 * np.log10(dist) - 5)
+    mag = np.round(np.maximum(MAG_LIMIT - rng.exponential(MAG_SCALE, n), floor), 3)
+    file_dist = np.where(sentinel, SENTINEL_DIST, dist)
+    absmag = np.round(mag - 5 * np.log10(file_dist) + 5, 2)
+    has_dist = positioned | sentinel
+
+    columns = {"id": ids.tolist()}
+    masks = {}
+    for name, (share, rule) in ID_SHARES.items():
+        if rule == "bright":
+            masks[name] = _bottom(mag, share, rng)
+        elif rule == "near":
+            masks[name] = _bottom(np.where(positioned, dist, np.inf), share, rng)
+        else:
+            masks[name] = rng.random(n) < share
+
+    # One number per star, as in the real catalogs: a search for "HIP n" finds one row.
+    numbers = {name: _numbered(masks[name], issued, name) for name in ID_SHARES}
+    tyc = numbers["tyc"] - 1
+    columns["tyc"] = _column(
+        np.char.add(
+            np.char.add((tyc // TYC_PER_REGION + 1).astype(str), "-"),
+            np.char.add((tyc % TYC_PER_REGION + 1).astype(str), "-1"),
+        ),
+        masks["tyc"],
+    )
+    columns["gaia"] = _column((GAIA_FIRST + numbers["gaia"] * GAIA_STEP).astype(str), masks["gaia"])
+    columns["hyg"] = _column(ids, masks["hyg"])
+    columns["hip"] = _column(numbers["hip"].astype(str), masks["hip"])
+    columns["hd"] = _column(numbers["hd"].astype(str), masks["hd"])
+    columns["hr"] = _column(numbers["hr"].astype(str), masks["hr"])
+    prefix = np.where(rng.random(n) < 0.5, "Gl ", "GJ ")
+    columns["gl"] = _column(np.char.add(prefix, numbers["gl"].astype(str)), masks["gl"])
+
+    bright = _bottom(mag, 0.01, rng)
+    bayer = bright & (rng.random(n) < BAYER_SHARE / 0.01)
+    flam = bright & (rng.random(n) < FLAM_SHARE / 0.01)
+    proper = bright & (rng.random(n) < PROPER_SHARE / 0.01)
+    greek = np.array(GREEK)[rng.integers(0, len(GREEK), n)]
+    component = np.where(rng.random(n) < 0.1, np.char.add("-", rng.integers(1, 4, n).astype(str)), "")
+    columns["bayer"] = _column(np.char.add(greek, component), bayer)
+    columns["flam"] = _column(rng.integers(1, 141, n), flam)
+    columns["con"] = np.array(CONSTELLATIONS)[rng.integers(0, len(CONSTELLATIONS), n)].tolist()
+    names = np.full(n, None, dtype=object)
+    names[proper] = _proper_names(rng, int(proper.sum()))
+    columns["proper"] = names.tolist()
+
+    columns["ra"] = np.round(ra, 6).tolist()
+    columns["dec"] = np.round(dec, 6).tolist()
+    src = np.where(masks["hip"], "H", np.where(masks["tyc"], "T", "G")).astype(object)
+    columns["pos_src"] = src.tolist()
+    columns["dist"] = _column(np.round(file_dist, 4), has_dist)
+    for axis, name in enumerate(("x_eq", "y_eq", "z_eq")):
+        columns[name] = _column(np.round(eq[:, axis], 4), positioned)
+    dist_src = src.copy()
+    dist_src[sentinel] = "H"
+    columns["dist_src"] = _column(dist_src, has_dist)
+    columns["mag"] = mag.tolist()
+    columns["absmag"] = _column(absmag, has_dist)
+    columns["ci"] = np.round(rng.normal(0.8, 0.4, n), 3).tolist()
+    columns["mag_src"] = src.tolist()
+
+    # rv is rare and the velocities are derived from it; none of these columns reach the
+    # athyg table, but the file carries them so its size per row stays honest.
+    has_rv = masks["hip"] & (rng.random(n) < 0.5)
+    columns["rv"] = _column(np.round(rng.normal(0, 25, n), 1), has_rv)
+    columns["rv_src"] = _column(np.full(n, "H", dtype=object), has_rv)
+    has_pm = masks["gaia"] | masks["tyc"]
+    columns["pm_ra"] = _column(np.round(rng.normal(0, 30, n), 3), has_pm)
+    columns["pm_dec"] = _column(np.round(rng.normal(0, 30, n), 3), has_pm)
+    columns["pm_src"] = _column(src, has_pm)
+    for name in ("vx", "vy", "vz"):
+        columns[name] = _column(np.round(rng.normal(0, 2e-5, n), 8), has_rv)
+
+    has_spect = masks["hd"]
+    columns["spect"] = _column(
+        np.array(SPECTRAL_TYPES)[rng.integers(0, len(SPECTRAL_TYPES), n)], has_spect
+    )
+    columns["spect_src"] = _column(np.full(n, "HD", dtype=object), has_spect)
+    return columns
+
+
+def _open(path):
+    if path == "-":
+        return sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", newline="", compresslevel=3)
+    return open(path, "w", newline="")
+
+
+def write_catalog(path, rows, seed=0, chunk_rows=CHUNK_ROWS, progress=None):
+    """
+    Write `rows` synthetic stars to `path` ('-' for stdout, '.gz' to compress).
+
+    Generated and written a chunk at a time, so memory stays flat at any --rows.
+    `progress`, if given, is called with the number of rows written so far.
+    """
+    rng = np.random.default_rng(seed)
+    issued = dict.fromkeys(ID_SHARES, 0)
+    fh = _open(path)
+    try:
+        writer = csv.writer(fh, lineterminator="\n")
+        writer.writerow(COLUMNS)
+        for start in range(0, rows, chunk_rows):
+            n = min(chunk_rows, rows - start)
+            columns = generate_chunk(rng, start, n, issued)
+            writer.writerows(zip(*(columns[name] for name in COLUMNS)))
+            if progress:
+                progress(start + n)
+    finally:
+        if fh is not sys.stdout:
+            fh.close()
+    return rows
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    p.add_argument("--rows", type=parse_rows, default=REAL_ROWS,
+                   help="number of stars, e.g. 1M, 3M, 30M (default: AT-HYG's size)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--output", default="athyg_synthetic.csv",
+                   help="CSV path; '.gz' compresses, '-' writes to stdout")
+    args = p.parse_args(argv)
+
+    def progress(done):
+        print(f"  {done:,} / {args.rows:,} rows", file=sys.stderr)
+
+    write_catalog(args.output, args.rows, args.seed, progress=progress)
+    print(f"Wrote {args.rows:,} synthetic stars to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -34,14 +34,28 @@ Usage:
     cd db/scripts
     pip install -r requirements.txt
     python match_athyg_v3.py --v3 /path/to/athyg_v33-1.csv.gz /path/to/athyg_v33-2.csv.gz
+
+--jobs N (default: up to 2, env ATHYG_V3_JOBS) parses and matches on N processes; see
+match_parallel(). The output is identical for any N; memory use grows with it.
+
+--copy streams the ranges into the database's athyg_v3_ranges table instead of writing
+the CSV; import them with `psql -v from_stage=1 -f db/sql/11_import_athyg_v3_ids.sql`.
+See copy_stage.py.
 """
 
 import argparse
 import csv
+import gc
 import gzip
+import math
+import multiprocessing
 import os
 import sys
-from collections import Counter
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from copy_stage import copy_to_stage, finish_hint
 
 try:
     import psycopg2
@@ -49,6 +63,8 @@ except ImportError:  # importable for unit tests without a database
     psycopg2 = None
 
 OUTPUT_FILE = os.environ.get("ATHYG_V3_OUTPUT", "../data/athyg_v3_ids.csv")
+# The import that reads OUTPUT_FILE, and defines the staging table --copy fills instead.
+STAGE_SQL = "11_import_athyg_v3_ids.sql"
 
 DB_HOST = os.environ.get("DB_HOST", "localhost")
 DB_PORT = int(os.environ.get("DB_PORT", "5432"))
@@ -56,6 +72,14 @@ DB_NAME = os.environ.get("DB_NAME", "hygmap")
 DB_USER = os.environ.get("DB_USER", "hygmap_user")
 DB_PASS = os.environ.get("DB_PASS", "hygmap_pass")
 
+# Processes for the match cascade; 1 runs it in-process. Each worker copies the part of
+# the indexes its lookups touch (see match_parallel()), so the default stays low for the
+# small build boxes this script has to fit on. Raise it where memory allows.
+JOBS = int(os.environ.get("ATHYG_V3_JOBS", str(min(2, os.cpu_count() or 1))))
+
+# Rows per round trip when streaming athyg through a server-side cursor.
+FETCH_ROWS = 100_000
+
 CSV_COLUMNS = ["v3_start", "v3_end", "offset", "match_method"]
 
 # AT-HYG v3.3 column order. Not identical to v4: v3.3 has x0,y0,z0 where v4 has
@@ -111,21 +135,74 @@ def norm(value):
     return s
 
 
-def brightness_rank(row):
-    """Sort key that puts the brighter star first. Lower magnitude is brighter.
-
-    A star with no magnitude sorts last, not brightest — `None` is "we don't know", and
-    treating an unknown as -inf would hand every tie to the row with the least data. `id`
-    breaks exact ties so the choice is deterministic across runs and machines; without it
-    the index would depend on the order Postgres happened to return rows in, and the
-    committed CSV would churn for no reason.
-    """
-    mag = row.get("mag")
+def magnitude(value):
+    """A magnitude as a float, or NaN for "we don't know"."""
     try:
-        mag = float(mag)
+        mag = float(value)
     except (TypeError, ValueError):
-        mag = None
-    return (mag is None, mag if mag is not None else 0.0, row["id"])
+        return math.nan
+    return mag
+
+
+class IdentifierIndex:
+    """Current stars by legacy identifier, built one star at a time.
+
+    This used to be a list of 2.84M dicts, one per athyg row from fetchall(), which
+    build_index() then walked once per identifier. At peak that was the raw tuples, the
+    dicts and the indexes all at once -- several gigabytes of Python objects, and the
+    reason this script could not run on a small build box. Now each star is indexed as it
+    is read and then forgotten: what is kept is its id and magnitude, in two typed arrays,
+    and per identifier a dict from key to the star's position in them.
+
+    Collisions are settled as they arrive, by the rule build_index() documents.
+    """
+
+    def __init__(self, fields):
+        self.ids = array("q")
+        self.mags = array("d")
+        self.positions = {field: {} for field in fields}
+        self.ambiguous = {field: set() for field in fields}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rank(self, pos):
+        """Sort key that puts the brighter star first. Lower magnitude is brighter.
+
+        A star with no magnitude sorts last, not brightest -- NaN is "we don't know", and
+        treating an unknown as -inf would hand every tie to the row with the least data.
+        `id` breaks exact ties so the choice is deterministic across runs and machines;
+        without it the index would depend on the order Postgres happened to return rows
+        in, and the committed CSV would churn for no reason.
+        """
+        mag = self.mags[pos]
+        unknown = mag != mag
+        return (unknown, 0.0 if unknown else mag, self.ids[pos])
+
+    def add(self, star_id, mag, keys):
+        """Index one star. `keys` maps each field to its raw identifier value."""
+        pos = len(self.ids)
+        self.ids.append(star_id)
+        self.mags.append(magnitude(mag))
+        for field, value in keys.items():
+            key = norm(value)
+            if key is None:
+                continue
+            index = self.positions[field]
+            incumbent = index.get(key)
+            if incumbent is None:
+                index[key] = pos
+                continue
+            if self.ids[incumbent] == star_id:
+                continue
+            self.ambiguous[field].add(key)
+            if self.rank(pos) < self.rank(incumbent):
+                index[key] = pos
+
+    def index(self, field):
+        """Returns ({key: athyg id}, ambiguous_count) for one identifier."""
+        ids = self.ids
+        return {k: ids[pos] for k, pos in self.positions[field].items()}, len(self.ambiguous[field])
 
 
 def build_index(rows, field):
@@ -146,24 +223,30 @@ def build_index(rows, field):
     The count is still returned and still reported, because "1,166 of these were a judgement
     call" is worth printing even when the judgement is settled.
 
+    `rows` are dicts with id, the identifier and optionally mag. run() does not come this
+    way: load_current_stars() feeds an IdentifierIndex straight from the cursor.
+
     Returns (index, ambiguous_count).
     """
-    index = {}
-    ambiguous = set()
+    stars = IdentifierIndex([field])
     for row in rows:
-        key = norm(row.get(field))
-        if key is None:
-            continue
-        incumbent = index.get(key)
-        if incumbent is None:
-            index[key] = row
+        stars.add(row["id"], row.get("mag"), {field: row.get(field)})
+    return stars.index(field)
+
+
+def _open_v3(path):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    return opener(path, "rt", newline="")
+
+
+def parse_v3_lines(lines):
+    """Yield dict rows from v3.3 CSV text lines (header and short lines skipped)."""
+    for parts in csv.reader(lines):
+        if not parts or len(parts) < 8:
             continue
-        if incumbent["id"] == row["id"]:
+        if parts[0].strip() == "id":  # header line, only present in file 1
             continue
-        ambiguous.add(key)
-        if brightness_rank(row) < brightness_rank(incumbent):
-            index[key] = row
-    return {k: r["id"] for k, r in index.items()}, len(ambiguous)
+        yield dict(zip(V3_COLUMNS, parts))
 
 
 def read_v3_rows(paths):
@@ -174,15 +257,29 @@ def read_v3_rows(paths):
     by content rather than by position.
     """
     for path in paths:
-        opener = gzip.open if str(path).endswith(".gz") else open
-        with opener(path, "rt", newline="") as fh:
-            reader = csv.reader(fh)
-            for parts in reader:
-                if not parts or len(parts) < 8:
-                    continue
-                if parts[0].strip() == "id":  # header line, only present in file 1
-                    continue
-                yield dict(zip(V3_COLUMNS, parts))
+        with _open_v3(path) as fh:
+            yield from parse_v3_lines(fh)
+
+
+def read_v3_blocks(paths, size):
+    """Yield the v3.3 CSVs as lists of about `size` raw lines, for parse_v3_lines().
+
+    A block only ends between records. A quoted field may hold a newline, so a line that
+    leaves a quote open continues the record; an odd count of '"' is the test, since an
+    escaped quote is written as two.
+    """
+    for path in paths:
+        with _open_v3(path) as fh:
+            block, open_quote = [], False
+            for line in fh:
+                block.append(line)
+                if line.count('"') % 2:
+                    open_quote = not open_quote
+                if len(block) >= size and not open_quote:
+                    yield block
+                    block = []
+            if block:
+                yield block
 
 
 def match_rows(v3_rows, indexes):
@@ -213,6 +310,82 @@ def match_rows(v3_rows, indexes):
     return out, stats
 
 
+# Lines per block handed to a worker: big enough that sending it is noise beside parsing
+# and matching it, small enough that every worker gets several.
+BLOCK_LINES = 50_000
+
+# Set in each worker before it matches anything; see match_parallel().
+_worker_indexes = None
+
+
+def _match_block(lines):
+    return match_rows(parse_v3_lines(lines), _worker_indexes)
+
+
+def map_ahead(pool, fn, items, ahead):
+    """pool.map(fn, items), in order, with at most `ahead` items submitted and unfinished.
+
+    Executor.map submits every item before returning its first result, which here would
+    read, decompress and queue the whole of the v3.3 input -- about 2.5M lines of text --
+    in the parent while the workers were still on the first blocks. This takes the next
+    item only when the oldest result is collected, so `items` is consumed as fast as the
+    workers go and no faster.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def match_parallel(paths, indexes, jobs, block_lines=BLOCK_LINES):
+    """match_rows(read_v3_rows(paths)) across `jobs` processes: same (rows, stats), same order.
+
+    The cascade is independent per row, and at 2.5M rows reading and matching was the whole
+    of the run's time, on one core. Parsing the CSV costs more than the cascade does, so
+    the workers do both. The parent only decompresses and cuts the text into blocks of
+    lines, and the workers parse them (parse_v3_lines(), the same code read_v3_rows() uses)
+    and match them.
+
+    The indexes -- a few hundred MB of dicts -- are not sent to the workers. They are
+    forked from this process after the indexes exist and read them copy-on-write, so only
+    text blocks and matched triples cross the process boundary, and at most 2 x jobs blocks
+    are read ahead of the workers (map_ahead()). Blocks come back in input order, so the
+    output is identical to a single-process run, not merely equivalent after to_ranges()
+    sorts it.
+
+    Copy-on-write is not free in CPython. Every lookup writes the refcount of the id it
+    returns, so each worker ends up with private copies of the pages holding the ids it
+    has looked up -- measured at 85 MB a worker against a 450 MB, 2.5M-key str -> int
+    dict, about a fifth. gc.freeze() stops the collector adding to that by writing to
+    every tracked object the workers inherit. Memory therefore grows by that fifth per
+    worker, not by a whole copy of the indexes; hence the low default JOBS.
+
+    Where fork is unavailable (Windows; macOS defaults to spawn but still offers fork)
+    this runs in-process rather than pickling the indexes into every worker.
+    """
+    global _worker_indexes
+    if jobs <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return match_rows(read_v3_rows(paths), indexes)
+
+    _worker_indexes = indexes
+    out, stats = [], Counter()
+    gc.freeze()
+    try:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+            blocks = read_v3_blocks(paths, block_lines)
+            for rows, block_stats in map_ahead(pool, _match_block, blocks, ahead=2 * jobs):
+                out.extend(rows)
+                stats.update(block_stats)
+    finally:
+        gc.unfreeze()
+        _worker_indexes = None
+    return out, stats
+
+
 def to_ranges(rows):
     """Collapse (v3_id, athyg_id, method) triples into contiguous ranges.
 
@@ -288,29 +461,42 @@ def connect_db():
     )
 
 
-def load_current_stars(cur):
-    # `mag` is not an identifier — build_index() uses it to pick the brighter component
-    # when two current stars share one legacy identifier.
-    cur.execute("SELECT id, gaia, tyc, hip, hd, hr, gj, mag FROM athyg")
-    cols = ["id", "gaia", "tyc", "hip", "hd", "hr", "gj", "mag"]
-    return [dict(zip(cols, r)) for r in cur.fetchall()]
+def load_current_stars(conn):
+    """Stream athyg into an IdentifierIndex over MATCH_CASCADE.
+
+    A named cursor keeps the result set on the server; rows arrive FETCH_ROWS at a time
+    and are indexed as they come, so no more than one batch of tuples exists at once.
+    """
+    # `mag` is not an identifier — the index uses it to pick the brighter component when
+    # two current stars share one legacy identifier.
+    stars = IdentifierIndex(MATCH_CASCADE)
+    with conn.cursor(name="athyg_v3_current") as cur:
+        cur.itersize = FETCH_ROWS
+        cur.execute("SELECT id, mag, " + ", ".join(MATCH_CASCADE) + " FROM athyg")
+        while True:
+            batch = cur.fetchmany(FETCH_ROWS)
+            if not batch:
+                break
+            for star_id, mag, *keys in batch:
+                stars.add(star_id, mag, dict(zip(MATCH_CASCADE, keys)))
+    return stars
 
 
-def run(v3_paths, output_file):
+def run(v3_paths, output_file, jobs=1, copy=False):
     print("Loading current stars from the database...")
-    with connect_db() as conn, conn.cursor() as cur:
-        current = load_current_stars(cur)
+    with connect_db() as conn:
+        current = load_current_stars(conn)
     print(f"  {len(current):,} current stars")
 
     indexes = {}
     for method in MATCH_CASCADE:
-        idx, ambiguous = build_index(current, method)
+        idx, ambiguous = current.index(method)
         indexes[method] = idx
         note = f" ({ambiguous:,} shared by two stars, resolved to the brighter)" if ambiguous else ""
         print(f"  index {method}: {len(idx):,} keys{note}")
 
-    print("Matching v3.3 rows...")
-    rows, stats = match_rows(read_v3_rows(v3_paths), indexes)
+    print(f"Matching v3.3 rows ({jobs} process{'es' if jobs > 1 else ''})...")
+    rows, stats = match_parallel(v3_paths, indexes, jobs)
     assert_no_duplicate_v3_ids(rows)
 
     total = stats["v3_rows"]
@@ -332,6 +518,18 @@ def run(v3_paths, output_file):
             "expand back to what was matched."
         )
 
+    if copy:
+        conn = connect_db()
+        try:
+            copy_to_stage(conn, STAGE_SQL, "athyg_v3_ranges", ranges, header=CSV_COLUMNS)
+        finally:
+            conn.close()
+        print(
+            f"Staged {len(ranges):,} ranges covering {len(rows):,} ids in athyg_v3_ranges;"
+            f" import with: {finish_hint(STAGE_SQL)}"
+        )
+        return stats
+
     with open(output_file, "w", newline="") as fh:
         w = csv.writer(fh)
         w.writerow(CSV_COLUMNS)
@@ -347,8 +545,12 @@ def main(argv=None):
     p.add_argument("--v3", nargs="+", required=True,
                    help="AT-HYG v3.3 CSVs (.csv or .csv.gz), both parts")
     p.add_argument("--output", default=OUTPUT_FILE)
+    p.add_argument("--jobs", type=int, default=JOBS,
+                   help=f"processes for matching (default {JOBS}, env ATHYG_V3_JOBS)")
+    p.add_argument("--copy", action="store_true",
+                   help="stream the ranges into the athyg_v3_ranges staging table instead of --output")
     args = p.parse_args(argv)
-    run(args.v3, args.output)
+    run(args.v3, args.output, args.jobs, copy=args.copy)
     return 0
 
 
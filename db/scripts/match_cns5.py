@@ -9,6 +9,7 @@ Usage:
     cd db/scripts
     pip install -r requirements.txt
     python match_cns5.py
+    CNS5_COPY=1 python match_cns5.py  # into the database, no CSV; see copy_stage.py
 """
 
 import csv
@@ -16,14 +17,23 @@ import math
 import os
 from collections import Counter
 
+import numpy as np
 import psycopg2
 
+from astrometry import column, derive, propagate_to_j2000
+from copy_stage import copy_to_stage, finish_hint
+from fixed_width import INT_MISSING, Field, iter_records, parse_record, read_columns
+from sky_index import SkyIndex
+
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
 
 INPUT_FILE = os.environ.get("CNS5_INPUT", "cns5.dat")
 OUTPUT_FILE = os.environ.get("CNS5_OUTPUT", "../data/cns5.csv")
+# Set to stream the rows into the database's cns5_stage instead of writing OUTPUT_FILE;
+# import them with `psql -v from_stage=1 -f db/sql/06_import_cns5.sql`. See copy_stage.py.
+COPY_TO_STAGE = os.environ.get("CNS5_COPY", "") not in ("", "0")
 
 DB_HOST = os.environ.get("DB_HOST", "localhost")
 DB_PORT = int(os.environ.get("DB_PORT", "5432"))
@@ -51,186 +61,58 @@ CSV_COLUMNS = [
 # Parsing
 # ---------------------------------------------------------------------------
 
-def safe_float(s):
-    """Parse a float from a fixed-width field, returning None for blanks/dashes."""
-    s = s.strip()
-    if not s or s == "-":
-        return None
-    try:
-        return float(s)
-    except ValueError:
-        return None
-
-
-def safe_int(s):
-    """Parse an int from a fixed-width field, returning None for blanks/dashes."""
-    s = s.strip()
-    if not s or s == "-":
-        return None
-    try:
-        return int(s)
-    except ValueError:
-        return None
-
-
-def safe_str(s):
-    """Strip a fixed-width string field, returning None for blanks/dashes."""
-    s = s.strip()
-    if not s or s == "-":
-        return None
-    return s
+# Byte positions from the CNS5 ReadMe, as [start, end) offsets (ReadMe bytes start+1..end).
+FIELDS = [
+    Field("cns5_id", 0, 4, int),
+    Field("gj", 5, 11, str),
+    Field("comp", 12, 16, str),
+    Field("ncomp", 17, 18, int),
+    Field("primary_flag", 19, 20, int),
+    Field("gj_primary", 21, 26, str),
+    Field("gaia", 27, 46, str),
+    Field("hip", 47, 53, str),
+    Field("ra_deg", 54, 74, float),
+    Field("dec_deg", 75, 98, float),
+    Field("epoch", 99, 108, float),
+    Field("parallax", 129, 148, float),
+    Field("pmra", 183, 206, float),
+    Field("pmdec", 229, 252, float),
+    Field("rv", 296, 319, float),
+    Field("g_mag", 361, 371, float),
+    Field("bp_mag", 394, 404, float),
+    Field("rp_mag", 427, 437, float),
+]
 
 
 def parse_line(line):
     """Parse one fixed-width record from cns5.dat.
 
     Returns a dict with parsed fields, or None if the line is unparseable.
-    Byte positions are from the CNS5 ReadMe (1-indexed -> 0-indexed slicing).
+    run() reads the file column-wise with read_columns() and the same FIELDS.
     """
-    # Pad short lines so slicing doesn't fail
-    line = line.ljust(761)
-
-    rec = {}
-    rec["cns5_id"] = safe_int(line[0:4])
-    rec["gj"] = safe_str(line[5:11])
-    rec["comp"] = safe_str(line[12:16])
-    rec["ncomp"] = safe_int(line[17:18])
-    rec["primary_flag"] = safe_int(line[19:20])
-    rec["gj_primary"] = safe_str(line[21:26])
-    rec["gaia"] = safe_str(line[27:46])
-    rec["hip"] = safe_str(line[47:53])
-    rec["ra_deg"] = safe_float(line[54:74])
-    rec["dec_deg"] = safe_float(line[75:98])
-    rec["epoch"] = safe_float(line[99:108])
-    rec["parallax"] = safe_float(line[129:148])
-    rec["pmra"] = safe_float(line[183:206])
-    rec["pmdec"] = safe_float(line[229:252])
-    rec["rv"] = safe_float(line[296:319])
-    rec["g_mag"] = safe_float(line[361:371])
-    rec["bp_mag"] = safe_float(line[394:404])
-    rec["rp_mag"] = safe_float(line[427:437])
-
+    rec = parse_record(line, FIELDS)
     if rec["cns5_id"] is None:
         return None
     return rec
 
 
+def read_records(path):
+    """The records of cns5.dat, less the Sun, with a warning for each unparseable line."""
+    columns = read_columns(path, FIELDS, encoding="latin-1")
+    ids, lines = columns["cns5_id"], columns["line"]
+    for lineno in lines[ids == INT_MISSING]:
+        print(f"  WARNING: could not parse line {lineno}")
+    sun = (columns["gj"] == "Sun") | (ids == 0)
+    for lineno in lines[sun]:
+        print(f"  Skipping Sun record (line {lineno})")
+    keep = np.flatnonzero((ids != INT_MISSING) & ~sun)
+    return list(iter_records(columns, FIELDS, keep)), int((ids == INT_MISSING).sum()), len(lines)
+
+
 # ---------------------------------------------------------------------------
 # Astrometric helpers
 # ---------------------------------------------------------------------------
 
-def propagate_to_j2000(ra_deg, dec_deg, epoch, pmra_masyr, pmdec_masyr):
-    """Propagate a position from *epoch* to J2000.0 using proper motions.
-
-    pmra is already mu_alpha* (i.e. includes cos(dec) factor) in mas/yr.
-    Returns (ra_j2000_deg, dec_j2000_deg).
-    """
-    if epoch is None or pmra_masyr is None or pmdec_masyr is None:
-        return ra_deg, dec_deg  # can't propagate, return as-is
-    dt = 2000.0 - epoch  # negative for epochs after J2000
-    dec_rad = math.radians(dec_deg)
-    cos_dec = math.cos(dec_rad)
-    if cos_dec == 0:
-        return ra_deg, dec_deg
-    # Convert mas to degrees: 1 mas = 1/3_600_000 deg
-    ra_j2000 = ra_deg + (pmra_masyr * dt) / (3_600_000.0 * cos_dec)
-    dec_j2000 = dec_deg + (pmdec_masyr * dt) / 3_600_000.0
-    # Wrap RA to [0, 360)
-    ra_j2000 = ra_j2000 % 360.0
-    return ra_j2000, dec_j2000
-
-
-def estimate_vmag(g_mag, bp_mag, rp_mag):
-    """Estimate Johnson V from Gaia G and BP-RP color index.
-
-    Uses the polynomial: V = G - (-0.01760 - 0.006860*X + 0.1732*X^2)
-    where X = BP - RP.
-    Returns V magnitude or None.
-    """
-    if g_mag is None:
-        return None
-    if bp_mag is not None and rp_mag is not None:
-        bp_rp = bp_mag - rp_mag
-        correction = -0.01760 - 0.006860 * bp_rp + 0.1732 * bp_rp ** 2
-        return g_mag - correction
-    return None
-
-
-def compute_equatorial_coords(ra_hours, dec_deg, dist_pc):
-    """Compute equatorial Cartesian coordinates (x_eq, y_eq, z_eq).
-
-    ra_hours: RA in decimal hours
-    dec_deg:  Declination in degrees
-    dist_pc:  Distance in parsecs
-    """
-    if ra_hours is None or dec_deg is None or dist_pc is None:
-        return None, None, None
-    ra_rad = math.radians(ra_hours * 15.0)
-    dec_rad = math.radians(dec_deg)
-    x = dist_pc * math.cos(dec_rad) * math.cos(ra_rad)
-    y = dist_pc * math.cos(dec_rad) * math.sin(ra_rad)
-    z = dist_pc * math.sin(dec_rad)
-    return x, y, z
-
-
-def estimate_spectral_type(bp_rp, absmag):
-    """Estimate a rough spectral type from Gaia BP-RP color and absolute magnitude.
-
-    Returns a string like "G V", "K III", "D" (white dwarf), "L" (brown dwarf),
-    or None if classification is not possible.
-
-    Uses absolute magnitude to determine luminosity class:
-      III (giant), IV (subgiant), V (dwarf) by comparing against
-      expected main-sequence Mv for the color.
-    """
-    if bp_rp is None:
-        return None
-
-    # Brown dwarf: very red
-    if bp_rp >= 4.0:
-        return "L"
-
-    # White dwarf: faint with blue/moderate color
-    if absmag is not None and absmag > 10 and bp_rp < 1.5:
-        return "D"
-
-    # Without absolute magnitude, moderate colors are ambiguous
-    if absmag is None:
-        if bp_rp > 2.5:
-            return "M V"  # very red, virtually certain M dwarf within 25 pc
-        if bp_rp >= 0.5:
-            return None  # ambiguous without absmag
-
-    # Spectral letter + expected main-sequence absolute magnitude
-    # BP-RP boundaries based on Gaia EDR3 color-spectral type calibrations
-    if bp_rp < -0.3:
-        letter, ms_mv = "O", -4.0
-    elif bp_rp < 0.0:
-        letter, ms_mv = "B", 0.0
-    elif bp_rp < 0.35:
-        letter, ms_mv = "A", 1.5
-    elif bp_rp < 0.65:
-        letter, ms_mv = "F", 3.5
-    elif bp_rp < 1.0:
-        letter, ms_mv = "G", 5.0
-    elif bp_rp < 1.85:
-        letter, ms_mv = "K", 7.0
-    else:
-        letter, ms_mv = "M", 11.0
-
-    # Determine luminosity class from absolute magnitude.
-    # Require BOTH a relative offset from the MS AND an absolute brightness
-    # threshold to prevent dim stars from being misclassified as evolved.
-    if absmag is None:
-        return f"{letter} V"  # default to dwarf for blue stars without absmag
-
-    if absmag < ms_mv - 3.0 and absmag < 2.0:
-        return f"{letter} III"  # giant
-    if absmag < ms_mv - 1.5 and absmag < 4.0:
-        return f"{letter} IV"  # subgiant
-    return f"{letter} V"  # dwarf / main sequence
-
-
 def extract_gj_component(gj_str):
     """Extract trailing component letter(s) from a GJ designation.
 
@@ -306,49 +188,62 @@ def load_id_to_gj_index(cur):
     return index
 
 
-def match_by_position(cur, ra_j2000_deg, dec_j2000_deg, radius_arcsec):
-    """Try to match by J2000 position within a box. Returns athyg.id or None.
+def match_by_identifier(rec, gj_index, gaia_index, hip_index):
+    """Steps 1-3 of the cascade: GJ, then Gaia, then HIP. Returns (athyg_id, method)."""
+    if rec["gj"] is not None:
+        athyg_id = gj_index.get(rec["gj"])
+        # Try GJ + component (e.g., "150.1" + "B" -> "150.1B")
+        if athyg_id is None and rec["comp"] is not None:
+            athyg_id = gj_index.get(rec["gj"] + rec["comp"])
+        if athyg_id is not None:
+            return athyg_id, "gj_id"
+    if rec["gaia"] is not None and rec["gaia"] in gaia_index:
+        return gaia_index[rec["gaia"]], "gaia_source_id"
+    if rec["hip"] is not None and rec["hip"] in hip_index:
+        return hip_index[rec["hip"]], "hip_id"
+    return None, None
+
+
+def position_radius(rec):
+    """Match radius in arcsec: wider for high-proper-motion stars."""
+    total_pm = 0.0
+    if rec["pmra"] is not None and rec["pmdec"] is not None:
+        total_pm = math.sqrt(rec["pmra"] ** 2 + rec["pmdec"] ** 2)
+    return POS_RADIUS_HIGH_PM_ARCSEC if total_pm > HIGH_PM_THRESHOLD else POS_RADIUS_ARCSEC
 
-    athyg stores RA in hours and Dec in degrees.
+
+def match_by_position(conn, pending):
     """
-    if ra_j2000_deg is None or dec_j2000_deg is None:
-        return None
+    Step 4 for a whole batch. Takes {key: record} and returns {key: athyg.id} for each
+    record matched by epoch-corrected J2000 position.
+
+    This used to be one SQL query per record -- a scan of athyg each time, since nothing
+    indexes (ra, dec) -- so step 4 was most of the run and almost all of it was waiting
+    on the database. Now every position is loaded once and all records are matched in
+    one pass (sky_index.py). The result differs from the old SQL only where that SQL was
+    wrong: across RA 0h, which its box never crossed, and near the poles, where its
+    flat-sky separation was not close enough.
+    """
+    order = [
+        key for key, rec in pending.items()
+        if rec["ra_deg"] is not None and rec["dec_deg"] is not None
+    ]
+    if not order:
+        return {}
+    records = [pending[key] for key in order]
+    ra_deg, dec_deg = propagate_to_j2000(
+        *(column(records, name) for name in ("ra_deg", "dec_deg", "epoch", "pmra", "pmdec"))
+    )
 
-    ra_hours = ra_j2000_deg / 15.0
-    dec = dec_j2000_deg
+    print(f"  Loading athyg positions for {len(order)} positional matches ...")
+    index = SkyIndex.from_query(
+        conn, "SELECT id, ra, dec FROM athyg WHERE ra IS NOT NULL AND dec IS NOT NULL"
+    )
+    print(f"    {len(index)} positions loaded.")
 
-    # Convert radius from arcsec to degrees, then RA degrees to hours
-    radius_deg = radius_arcsec / 3600.0
-    dec_rad = math.radians(dec)
-    cos_dec = math.cos(dec_rad)
-    if cos_dec == 0:
-        return None
-    radius_ra_hours = radius_deg / (15.0 * cos_dec)
-    radius_dec_deg = radius_deg
-
-    cur.execute("""
-        SELECT id, ra, dec,
-               SQRT(POWER((ra - %s) * 15.0 * COS(RADIANS(dec)), 2)
-                  + POWER(dec - %s, 2)) AS sep_deg
-        FROM athyg
-        WHERE ra BETWEEN %s AND %s
-          AND dec BETWEEN %s AND %s
-          AND ra IS NOT NULL AND dec IS NOT NULL
-        ORDER BY sep_deg
-        LIMIT 1
-    """, (
-        ra_hours, dec,
-        ra_hours - radius_ra_hours, ra_hours + radius_ra_hours,
-        dec - radius_dec_deg, dec + radius_dec_deg,
-    ))
-    row = cur.fetchone()
-    if row is None:
-        return None
-    # Verify the match is actually within the angular radius
-    sep_deg = row[3]
-    if sep_deg <= radius_deg:
-        return row[0]
-    return None
+    radius = np.array([position_radius(rec) for rec in records])
+    ids, _ = index.nearest(ra_deg / 15.0, dec_deg, radius)
+    return {key: int(aid) for key, aid in zip(order, ids) if aid >= 0}
 
 
 # ---------------------------------------------------------------------------
@@ -389,36 +284,16 @@ def assert_no_duplicate_ids(output_rows):
         raise SystemExit("\n".join(lines))
 
 
-def build_output_row(rec, athyg_id, match_method, bright_unmatched):
-    """Build one CSV output row dict from a parsed CNS5 record."""
-    # Propagate position to J2000
-    ra_j2000_deg = rec["ra_deg"]
-    dec_j2000_deg = rec["dec_deg"]
-    if rec["ra_deg"] is not None and rec["dec_deg"] is not None:
-        ra_j2000_deg, dec_j2000_deg = propagate_to_j2000(
-            rec["ra_deg"], rec["dec_deg"], rec["epoch"],
-            rec["pmra"], rec["pmdec"],
-        )
-
-    ra_j2000_hours = ra_j2000_deg / 15.0 if ra_j2000_deg is not None else None
-    dist_pc = None
-    if rec["parallax"] is not None and rec["parallax"] > 0:
-        dist_pc = 1000.0 / rec["parallax"]
-
-    v_mag = estimate_vmag(rec["g_mag"], rec["bp_mag"], rec["rp_mag"])
-    absmag = None
-    if v_mag is not None and dist_pc is not None and dist_pc > 0:
-        absmag = v_mag - 5.0 * math.log10(dist_pc) + 5.0
-
-    x_eq, y_eq, z_eq = compute_equatorial_coords(
-        ra_j2000_hours, dec_j2000_deg, dist_pc
-    )
+def build_output_row(rec, athyg_id, match_method, bright_unmatched, derived=None):
+    """Build one CSV output row dict from a parsed CNS5 record.
 
-    # Estimate spectral type from color index
-    bp_rp = None
-    if rec["bp_mag"] is not None and rec["rp_mag"] is not None:
-        bp_rp = rec["bp_mag"] - rec["rp_mag"]
-    spect = estimate_spectral_type(bp_rp, absmag)
+    `derived` is the record's entry from astrometry.derive(), which run() computes for the
+    whole catalog at once; without it the record is derived on its own.
+    """
+    d = derived if derived is not None else derive([rec])[0]
+    ra_j2000_hours, dec_j2000_deg, dist_pc = d["ra_j2000"], d["dec_j2000"], d["dist"]
+    v_mag, absmag, spect = d["mag"], d["absmag"], d["spect"]
+    x_eq, y_eq, z_eq = d["x_eq"], d["y_eq"], d["z_eq"]
 
     return {
         "athyg_id": athyg_id,
@@ -450,24 +325,8 @@ def build_output_row(rec, athyg_id, match_method, bright_unmatched):
 
 def run():
     print(f"Reading {INPUT_FILE} ...")
-    with open(INPUT_FILE, "r", encoding="latin-1") as f:
-        raw_lines = f.readlines()
-    print(f"  {len(raw_lines)} lines read.")
-
-    # Parse all records
-    records = []
-    parse_errors = 0
-    for lineno, line in enumerate(raw_lines, 1):
-        rec = parse_line(line)
-        if rec is None:
-            parse_errors += 1
-            print(f"  WARNING: could not parse line {lineno}")
-            continue
-        # Skip the Sun record
-        if rec["gj"] == "Sun" or rec["cns5_id"] == 0:
-            print(f"  Skipping Sun record (line {lineno})")
-            continue
-        records.append(rec)
+    records, parse_errors, n_lines = read_records(INPUT_FILE)
+    print(f"  {n_lines} lines read.")
 
     print(f"  {len(records)} records to match ({parse_errors} parse errors).")
 
@@ -482,6 +341,13 @@ def run():
     hip_index = load_hip_index(cur)
     id_to_gj_index = load_id_to_gj_index(cur)
 
+    # Steps 1-3 are dictionary lookups; step 4 is needed only where they all miss, and
+    # is answered for all of those records at once before the cascade runs.
+    identified = [match_by_identifier(rec, gj_index, gaia_index, hip_index) for rec in records]
+    position_matches = match_by_position(
+        conn, {i: rec for i, (rec, (aid, _)) in enumerate(zip(records, identified)) if aid is None}
+    )
+
     # Track which athyg IDs have already been claimed (one per star)
     claimed_ids = {}  # athyg_id -> cns5_id of first claimer
 
@@ -505,50 +371,23 @@ def run():
     comp_mismatch_count = 0
     output_rows = []
 
+    # J2000 positions, distances, magnitudes and spectral types for every record, in a
+    # handful of array operations (astrometry.py) rather than per star in the loop below.
+    derived = derive(records)
+
     print(f"\nMatching {len(records)} CNS5 records ...")
 
     for i, rec in enumerate(records):
         if (i + 1) % 1000 == 0:
             print(f"  {i+1}/{len(records)} ...")
 
-        athyg_id = None
-        match_method = None
-
-        # --- Step 1: GJ number (in-memory lookup) ---
-        if rec["gj"] is not None:
-            athyg_id = gj_index.get(rec["gj"])
-            # Try GJ + component (e.g., "150.1" + "B" -> "150.1B")
-            if athyg_id is None and rec["comp"] is not None:
-                athyg_id = gj_index.get(rec["gj"] + rec["comp"])
-            if athyg_id is not None:
-                match_method = "gj_id"
-
-        # --- Step 2: Gaia source_id (in-memory lookup) ---
-        if athyg_id is None and rec["gaia"] is not None:
-            athyg_id = gaia_index.get(rec["gaia"])
-            if athyg_id is not None:
-                match_method = "gaia_source_id"
-
-        # --- Step 3: HIP ID (in-memory lookup) ---
-        if athyg_id is None and rec["hip"] is not None:
-            athyg_id = hip_index.get(rec["hip"])
-            if athyg_id is not None:
-                match_method = "hip_id"
-
-        # --- Step 4: Positional match (epoch-corrected, DB query) ---
-        if athyg_id is None and rec["ra_deg"] is not None and rec["dec_deg"] is not None:
-            ra_j2000, dec_j2000 = propagate_to_j2000(
-                rec["ra_deg"], rec["dec_deg"], rec["epoch"],
-                rec["pmra"], rec["pmdec"],
-            )
-            total_pm = 0.0
-            if rec["pmra"] is not None and rec["pmdec"] is not None:
-                total_pm = math.sqrt(rec["pmra"] ** 2 + rec["pmdec"] ** 2)
-            radius = POS_RADIUS_HIGH_PM_ARCSEC if total_pm > HIGH_PM_THRESHOLD else POS_RADIUS_ARCSEC
+        # --- Steps 1-3: GJ, Gaia source_id, HIP (in-memory lookups) ---
+        athyg_id, match_method = identified[i]
 
-            athyg_id = match_by_position(cur, ra_j2000, dec_j2000, radius)
-            if athyg_id is not None:
-                match_method = "position_j2000"
+        # --- Step 4: Positional match (epoch-corrected, batched above) ---
+        if athyg_id is None and i in position_matches:
+            athyg_id = position_matches[i]
+            match_method = "position_j2000"
 
         # --- Component validation for non-GJ matches ---
         if athyg_id is not None and match_method != "gj_id":
@@ -580,7 +419,7 @@ def run():
         # --- Brightness check for unmatched ---
         bright_unmatched = 0
         if athyg_id is None:
-            v_est = estimate_vmag(rec["g_mag"], rec["bp_mag"], rec["rp_mag"])
+            v_est = derived[i]["mag"]
             if v_est is not None and v_est <= 11.0:
                 bright_unmatched = 1
                 bright_unmatched_count += 1
@@ -600,7 +439,9 @@ def run():
             next_new_id += 1
 
         method_counts[match_method] += 1
-        output_rows.append(build_output_row(rec, athyg_id, match_method, bright_unmatched))
+        output_rows.append(
+            build_output_row(rec, athyg_id, match_method, bright_unmatched, derived[i])
+        )
 
     cur.close()
     conn.close()
@@ -612,13 +453,20 @@ def run():
     # is the only place it can be caught. Fail, do not warn.
     assert_no_duplicate_ids(output_rows)
 
-    # --- Write CSV ---
-    print(f"\nWriting {len(output_rows)} rows to {OUTPUT_FILE} ...")
-    os.makedirs(os.path.dirname(os.path.abspath(OUTPUT_FILE)), exist_ok=True)
-    with open(OUTPUT_FILE, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
-        writer.writeheader()
-        writer.writerows(output_rows)
+    # --- Write CSV, or stream the same rows into the staging table ---
+    if COPY_TO_STAGE:
+        print(f"\nCopying {len(output_rows)} rows into cns5_stage ...")
+        conn = connect_db()
+        copied = copy_to_stage(conn, "06_import_cns5.sql", "cns5_stage", output_rows, fieldnames=CSV_COLUMNS)
+        conn.close()
+        print(f"  {copied} rows staged; import with: {finish_hint('06_import_cns5.sql')}")
+    else:
+        print(f"\nWriting {len(output_rows)} rows to {OUTPUT_FILE} ...")
+        os.makedirs(os.path.dirname(os.path.abspath(OUTPUT_FILE)), exist_ok=True)
+        with open(OUTPUT_FILE, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            writer.writerows(output_rows)
     print("  Done.")
 
     # --- Audit report ---
@@ -20,21 +20,30 @@ Usage:
     cd db/scripts
     pip install -r requirements.txt
     python match_gcns.py
+    GCNS_COPY=1 python match_gcns.py  # into the database, no CSV; see copy_stage.py
 """
 
 import csv
-import math
 import os
 from collections import Counter
 
+import numpy as np
 import psycopg2
 
+from astrometry import column, derive, estimate_vmag, propagate_to_j2000
+from copy_stage import copy_to_stage, finish_hint
+from fixed_width import Field, iter_records, parse_record, read_columns
+from sky_index import SkyIndex
+
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
 
 INPUT_FILE = os.environ.get("GCNS_INPUT", "table1c.dat")
 OUTPUT_FILE = os.environ.get("GCNS_OUTPUT", "../data/gcns.csv")
+# Set to stream the rows into the database's gcns_stage instead of writing OUTPUT_FILE;
+# import them with `psql -v from_stage=1 -f db/sql/07_import_gcns.sql`. See copy_stage.py.
+COPY_TO_STAGE = os.environ.get("GCNS_COPY", "") not in ("", "0")
 
 DB_HOST = os.environ.get("DB_HOST", "localhost")
 DB_PORT = int(os.environ.get("DB_PORT", "5432"))
@@ -75,179 +84,59 @@ CSV_COLUMNS = [
 # Parsing
 # ---------------------------------------------------------------------------
 
-def safe_float(s):
-    """Parse a float from a CSV field, returning None for blanks/empty."""
-    if s is None:
-        return None
-    s = str(s).strip()
-    if not s or s == "" or s.lower() == "nan":
-        return None
-    try:
-        return float(s)
-    except ValueError:
-        return None
-
-
-def safe_str(s):
-    """Strip a string field, returning None for blanks."""
-    if s is None:
-        return None
-    s = str(s).strip()
-    if not s:
-        return None
-    return s
-
+# Byte positions from table1c.format, as [start, end) offsets (format bytes start+1..end):
+#   3-21 GaiaEDR3 source_id (I19), 23-36 RAdeg (F14.7), 46-59 DEdeg (F14.7),
+#   69-77 Plx (F9.3), 87-95 pmRA (F9.3), 105-113 pmDE (F9.3), 123-130 Gmag (F8.4),
+#   142-149 BPmag (F8.4), 161-168 RPmag (F8.4), 240-244 GCNSprob (F5.3) -- probability
+#   of good astrometry.
+FIELDS = [
+    Field("source_id", 2, 21, str),
+    Field("ra_deg", 22, 36, float),
+    Field("dec_deg", 45, 59, float),
+    Field("parallax", 68, 77, float),
+    Field("pmra", 86, 95, float),
+    Field("pmdec", 104, 113, float),
+    Field("g_mag", 122, 130, float),
+    Field("bp_mag", 141, 149, float),
+    Field("rp_mag", 160, 168, float),
+    Field("probastr", 239, 244, float),
+]
 
-def parse_fixed_width_line(line):
-    """Parse one line from table1c.dat (fixed-width format).
 
-    Byte positions from table1c.format (1-indexed, inclusive):
-      3-21:   GaiaEDR3 source_id (I19)
-      23-36:  RAdeg (F14.7)
-      46-59:  DEdeg (F14.7)
-      69-77:  Plx parallax (F9.3)
-      87-95:  pmRA (F9.3)
-      105-113: pmDE (F9.3)
-      123-130: Gmag (F8.4)
-      142-149: BPmag (F8.4)
-      161-168: RPmag (F8.4)
-      240-244: GCNSprob (F5.3) - probability of good astrometry
-      246-250: WDprob (F5.3) - white dwarf probability
-    
-    Note: Python slicing is 0-indexed and end-exclusive, so bytes N-M become [N-1:M]
-    """
-    rec = {}
-
-    # Extract fields using byte positions (convert 1-indexed to 0-indexed slicing)
-    rec["source_id"] = safe_str(line[2:21])      # bytes 3-21
-    rec["ra_deg"] = safe_float(line[22:36])      # bytes 23-36
-    rec["dec_deg"] = safe_float(line[45:59])     # bytes 46-59
-    rec["parallax"] = safe_float(line[68:77])    # bytes 69-77
-    rec["pmra"] = safe_float(line[86:95])        # bytes 87-95
-    rec["pmdec"] = safe_float(line[104:113])     # bytes 105-113
-    rec["g_mag"] = safe_float(line[122:130])     # bytes 123-130
-    rec["bp_mag"] = safe_float(line[141:149])    # bytes 142-149
-    rec["rp_mag"] = safe_float(line[160:168])    # bytes 161-168
-    rec["probastr"] = safe_float(line[239:244])  # bytes 240-244 (GCNSprob)
-    
+def with_prob100(rec):
     # For prob100, GCNS table1c uses GCNSprob as the quality indicator.
     # All stars in table1c are within 100 pc by definition, so we use GCNSprob
     # as our probability threshold (probability of good astrometry).
     rec["prob100"] = rec["probastr"]
-
-    if rec["source_id"] is None:
-        return None
     return rec
 
 
-# ---------------------------------------------------------------------------
-# Astrometric helpers
-# ---------------------------------------------------------------------------
-
-def propagate_to_j2000(ra_deg, dec_deg, epoch, pmra_masyr, pmdec_masyr):
-    """Propagate a position from *epoch* to J2000.0 using proper motions.
+def parse_fixed_width_line(line):
+    """Parse one line from table1c.dat (fixed-width format).
 
-    pmra is already mu_alpha* (i.e. includes cos(dec) factor) in mas/yr.
-    Returns (ra_j2000_deg, dec_j2000_deg).
+    Returns None if the line has no source_id. run() reads the file column-wise with
+    read_columns() and the same FIELDS.
     """
-    if epoch is None or pmra_masyr is None or pmdec_masyr is None:
-        return ra_deg, dec_deg  # can't propagate, return as-is
-    dt = 2000.0 - epoch  # negative for epochs after J2000
-    dec_rad = math.radians(dec_deg)
-    cos_dec = math.cos(dec_rad)
-    if cos_dec == 0:
-        return ra_deg, dec_deg
-    # Convert mas to degrees: 1 mas = 1/3_600_000 deg
-    ra_j2000 = ra_deg + (pmra_masyr * dt) / (3_600_000.0 * cos_dec)
-    dec_j2000 = dec_deg + (pmdec_masyr * dt) / 3_600_000.0
-    # Wrap RA to [0, 360)
-    ra_j2000 = ra_j2000 % 360.0
-    return ra_j2000, dec_j2000
-
-
-def estimate_vmag(g_mag, bp_mag, rp_mag):
-    """Estimate Johnson V from Gaia G and BP-RP color index.
-
-    Uses the polynomial: V = G - (-0.01760 - 0.006860*X + 0.1732*X^2)
-    where X = BP - RP.
-    Returns V magnitude or None.
-    """
-    if g_mag is None:
+    rec = parse_record(line, FIELDS)
+    if rec["source_id"] is None:
         return None
-    if bp_mag is not None and rp_mag is not None:
-        bp_rp = bp_mag - rp_mag
-        correction = -0.01760 - 0.006860 * bp_rp + 0.1732 * bp_rp ** 2
-        return g_mag - correction
-    return None
+    return with_prob100(rec)
 
 
-def compute_equatorial_coords(ra_hours, dec_deg, dist_pc):
-    """Compute equatorial Cartesian coordinates (x_eq, y_eq, z_eq).
-
-    ra_hours: RA in decimal hours
-    dec_deg:  Declination in degrees
-    dist_pc:  Distance in parsecs
+def read_records(path):
     """
-    if ra_hours is None or dec_deg is None or dist_pc is None:
-        return None, None, None
-    ra_rad = math.radians(ra_hours * 15.0)
-    dec_rad = math.radians(dec_deg)
-    x = dist_pc * math.cos(dec_rad) * math.cos(ra_rad)
-    y = dist_pc * math.cos(dec_rad) * math.sin(ra_rad)
-    z = dist_pc * math.sin(dec_rad)
-    return x, y, z
-
-
-def estimate_spectral_type(bp_rp, absmag):
-    """Estimate a rough spectral type from Gaia BP-RP color and absolute magnitude.
-
-    Returns a string like "G V", "K III", "D" (white dwarf), "L" (brown dwarf),
-    or None if classification is not possible.
+    The records of table1c.dat at or above MIN_PROB100, with a warning for each line
+    without a source_id. Returns (records, parse errors, low-prob skipped, lines read).
     """
-    if bp_rp is None:
-        return None
-
-    # Brown dwarf: very red
-    if bp_rp >= 4.0:
-        return "L"
-
-    # White dwarf: faint with blue/moderate color
-    if absmag is not None and absmag > 10 and bp_rp < 1.5:
-        return "D"
-
-    # Without absolute magnitude, moderate colors are ambiguous
-    if absmag is None:
-        if bp_rp > 2.5:
-            return "M V"  # very red, virtually certain M dwarf within 100 pc
-        if bp_rp >= 0.5:
-            return None  # ambiguous without absmag
-
-    # Spectral letter + expected main-sequence absolute magnitude
-    # BP-RP boundaries based on Gaia EDR3 color-spectral type calibrations
-    if bp_rp < -0.3:
-        letter, ms_mv = "O", -4.0
-    elif bp_rp < 0.0:
-        letter, ms_mv = "B", 0.0
-    elif bp_rp < 0.35:
-        letter, ms_mv = "A", 1.5
-    elif bp_rp < 0.65:
-        letter, ms_mv = "F", 3.5
-    elif bp_rp < 1.0:
-        letter, ms_mv = "G", 5.0
-    elif bp_rp < 1.85:
-        letter, ms_mv = "K", 7.0
-    else:
-        letter, ms_mv = "M", 11.0
-
-    # Determine luminosity class from absolute magnitude.
-    if absmag is None:
-        return f"{letter} V"  # default to dwarf for blue stars without absmag
-
-    if absmag < ms_mv - 3.0 and absmag < 2.0:
-        return f"{letter} III"  # giant
-    if absmag < ms_mv - 1.5 and absmag < 4.0:
-        return f"{letter} IV"  # subgiant
-    return f"{letter} V"  # dwarf / main sequence
+    columns = read_columns(path, FIELDS, encoding="utf-8")
+    invalid = columns["source_id"] == ""
+    for lineno in columns["line"][invalid]:
+        print(f"  WARNING: could not parse line {lineno}")
+    # A NaN probability is kept, as a missing one always was.
+    low_prob = ~invalid & (columns["probastr"] < MIN_PROB100)
+    keep = np.flatnonzero(~invalid & ~low_prob)
+    records = [with_prob100(rec) for rec in iter_records(columns, FIELDS, keep)]
+    return records, int(invalid.sum()), int(low_prob.sum()), len(columns["line"])
 
 
 # ---------------------------------------------------------------------------
@@ -286,100 +175,65 @@ def load_gaia_index(cur):
     return index
 
 
-def load_spatial_index(cur):
-    """Load all non-Gaia stars into an in-memory spatial index."""
-    print("  Loading spatial index for positional matching ...")
-    # Only load stars that don't have a Gaia ID (candidates for positional match)
-    cur.execute("SELECT id, ra, dec, mag FROM athyg WHERE (gaia IS NULL OR gaia = '') AND ra IS NOT NULL AND dec IS NOT NULL")
-    
-    index = SpatialIndex()
-    count = 0
-    for row in cur:
-        index.add(*row)
-        count += 1
-    
-    print(f"    {count} stars loaded into spatial index.")
-    return index
+def position_queries(records):
+    """
+    Where and how to look for each record positionally, as arrays: (ra_deg, dec_deg,
+    radius_arcsec, magnitude to compare, has_pm). Positions are J2000 when proper motion
+    allows it.
+    """
+    ra, dec, pmra, pmdec = (column(records, name) for name in ("ra_deg", "dec_deg", "pmra", "pmdec"))
+    has_pm = np.isfinite(pmra) & np.isfinite(pmdec)
+    # Without proper motion, we can't accurately propagate J2016 -> J2000: propagation
+    # leaves those positions as they are. The 16-year baseline means even a modest PM of
+    # 100 mas/yr = 1.6" offset, so they get the larger radius to account for uncertainty,
+    # but this risks false matches.
+    ra, dec = propagate_to_j2000(ra, dec, np.full(len(records), GCNS_EPOCH), pmra, pmdec)
+    total_pm = np.hypot(pmra, pmdec)
+    radius = np.where(
+        has_pm & ~(total_pm > HIGH_PM_THRESHOLD), POS_RADIUS_ARCSEC, POS_RADIUS_HIGH_PM_ARCSEC,
+    )
+    # Estimate V magnitude for the sanity check, falling back to G if it can't be estimated
+    g_mag = column(records, "g_mag")
+    vmag = estimate_vmag(g_mag, column(records, "bp_mag"), column(records, "rp_mag"))
+    mag = np.where(np.isnan(vmag), g_mag, vmag)
+    return ra, dec, radius, mag, has_pm
 
 
-class SpatialIndex:
-    """Simple grid-based spatial index for fast positional lookups."""
-    def __init__(self):
-        # Dictionary mapping (ra_bin, dec_bin) -> list of (id, ra, dec, mag)
-        # Bins are 1 hour (RA) x 1 degree (Dec)
-        self.bins = {}
-
-    def _get_bin(self, ra, dec):
-        # RA is 0-24h, Dec is -90 to +90 deg
-        ra_bin = int(ra) % 24
-        dec_bin = int(dec)
-        return ra_bin, dec_bin
-
-    def add(self, aid, ra, dec, mag):
-        b = self._get_bin(ra, dec)
-        if b not in self.bins:
-            self.bins[b] = []
-        self.bins[b].append((aid, ra, dec, mag))
-
-    def query_closest(self, ra, dec, radius_arcsec, gcns_mag=None):
-        """Find closest star within radius_arcsec."""
-        radius_deg = radius_arcsec / 3600.0
-        
-        # Check central bin and neighbors (3x3 grid covers >1 degree radius)
-        # Since radius is small (~5 arcsec), checking adjacent bins is sufficient
-        center_ra_bin = int(ra) % 24
-        center_dec_bin = int(dec)
-        
-        candidates = []
-        for d_off in [-1, 0, 1]:
-            d_bin = center_dec_bin + d_off
-            # Skip invalid declination bins
-            if d_bin < -90 or d_bin > 90:
-                continue
-                
-            for r_off in [-1, 0, 1]:
-                r_bin = (center_ra_bin + r_off) % 24
-                
-                if (r_bin, d_bin) in self.bins:
-                    candidates.extend(self.bins[(r_bin, d_bin)])
-        
-        best_match = None
-        best_sep_sq = (radius_deg) ** 2  # Compare squared distances
-        
-        for aid, c_ra, c_dec, c_mag in candidates:
-            # Magnitude check
-            if gcns_mag is not None and c_mag is not None:
-                if abs(gcns_mag - c_mag) > MAG_TOLERANCE:
-                    continue
-            
-            # Fast distance check (Euclidean approximation sufficient for small angles?)
-            # Or use full spherical distance if needed. 
-            # The original SQL used a slightly approximated formula:
-            # d^2 = (delta_ra * cos(dec))^2 + delta_dec^2
-            
-            ra_diff = abs(ra - c_ra)
-            ra_diff = min(ra_diff, 24.0 - ra_diff)
-            
-            # If RA diff is huge, skip early (optimization)
-            # 1 hour at equator is 15 degrees.
-            if ra_diff > 1.0: 
-                continue
+def position_query(rec):
+    """position_queries() for one record, as Python scalars (None for a missing magnitude)."""
+    ra, dec, radius, mag, has_pm = (values[0].item() for values in position_queries([rec]))
+    return ra, dec, radius, None if mag != mag else mag, has_pm
 
-            dec_diff = abs(dec - c_dec)
-            if dec_diff > radius_deg:
-                continue
 
-            # Calculate separation
-            # Use star's declination for cosine factor, as in original SQL
-            dec_rad = math.radians(c_dec)
-            sep_sq = (ra_diff * 15.0 * math.cos(dec_rad))**2 + (dec_diff)**2
-            
-            if sep_sq <= best_sep_sq:
-                best_sep_sq = sep_sq
-                best_match = (aid, math.sqrt(sep_sq) * 3600.0)
-                
-        return best_match if best_match else (None, None)
+def match_by_position(conn, pending):
+    """
+    Step 2 for a whole batch. Takes {key: record} and returns {key: athyg.id} for each
+    record matched positionally to a star without a Gaia id. The closest star within the
+    radius whose magnitude is within MAG_TOLERANCE wins.
+
+    This replaced a grid of 1 hour x 1 degree dict bins holding one Python tuple per
+    candidate, searched a record at a time. Near the poles one RA hour is a sliver of sky
+    but still a whole bin. A neighbour a few arcseconds away can be many hours of RA away,
+    and both the 3x3 bin neighbourhood and the one-hour RA cut-off then rejected it.
+    sky_index.py matches every record in one pass and measures separation exactly.
+    """
+    if not pending:
+        return {}
+    keys = list(pending)
+    ra, dec, radius, mag, _ = position_queries([pending[key] for key in keys])
+
+    print("  Loading non-Gaia athyg positions for positional matching ...")
+    # Only stars without a Gaia id are candidates: one with an id would have matched in
+    # step 1 if it were this star.
+    index = SkyIndex.from_query(
+        conn,
+        "SELECT id, ra, dec, mag FROM athyg "
+        "WHERE (gaia IS NULL OR gaia = '') AND ra IS NOT NULL AND dec IS NOT NULL",
+    )
+    print(f"    {len(index)} stars loaded.")
 
+    ids, _ = index.nearest(ra / 15.0, dec, radius, mag=mag, mag_tolerance=MAG_TOLERANCE)
+    return {key: int(aid) for key, aid in zip(keys, ids) if aid >= 0}
 
 
 # ---------------------------------------------------------------------------
@@ -420,36 +274,16 @@ def assert_no_duplicate_ids(output_rows):
         raise SystemExit("\n".join(lines))
 
 
-def build_output_row(rec, athyg_id, match_method, bright_unmatched):
-    """Build one CSV output row dict from a parsed GCNS record."""
-    # Propagate position to J2000
-    ra_j2000_deg = rec["ra_deg"]
-    dec_j2000_deg = rec["dec_deg"]
-    if rec["ra_deg"] is not None and rec["dec_deg"] is not None:
-        ra_j2000_deg, dec_j2000_deg = propagate_to_j2000(
-            rec["ra_deg"], rec["dec_deg"], GCNS_EPOCH,
-            rec["pmra"], rec["pmdec"],
-        )
-
-    ra_j2000_hours = ra_j2000_deg / 15.0 if ra_j2000_deg is not None else None
-    dist_pc = None
-    if rec["parallax"] is not None and rec["parallax"] > 0:
-        dist_pc = 1000.0 / rec["parallax"]
+def build_output_row(rec, athyg_id, match_method, bright_unmatched, derived=None):
+    """Build one CSV output row dict from a parsed GCNS record.
 
-    v_mag = estimate_vmag(rec["g_mag"], rec["bp_mag"], rec["rp_mag"])
-    absmag = None
-    if v_mag is not None and dist_pc is not None and dist_pc > 0:
-        absmag = v_mag - 5.0 * math.log10(dist_pc) + 5.0
-
-    x_eq, y_eq, z_eq = compute_equatorial_coords(
-        ra_j2000_hours, dec_j2000_deg, dist_pc
-    )
-
-    # Estimate spectral type from color index
-    bp_rp = None
-    if rec["bp_mag"] is not None and rec["rp_mag"] is not None:
-        bp_rp = rec["bp_mag"] - rec["rp_mag"]
-    spect = estimate_spectral_type(bp_rp, absmag)
+    `derived` is the record's entry from astrometry.derive(), which run() computes for the
+    whole catalog at once; without it the record is derived on its own.
+    """
+    d = derived if derived is not None else derive([rec], epoch=GCNS_EPOCH)[0]
+    ra_j2000_hours, dec_j2000_deg, dist_pc = d["ra_j2000"], d["dec_j2000"], d["dist"]
+    v_mag, absmag, spect = d["mag"], d["absmag"], d["spect"]
+    x_eq, y_eq, z_eq = d["x_eq"], d["y_eq"], d["z_eq"]
 
     return {
         "athyg_id": athyg_id,
@@ -478,28 +312,8 @@ def build_output_row(rec, athyg_id, match_method, bright_unmatched):
 
 def run():
     print(f"Reading {INPUT_FILE} (fixed-width format) ...")
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        raw_lines = f.readlines()
-    print(f"  {len(raw_lines)} lines read.")
-
-    # Parse all records, filtering by probability threshold
-    records = []
-    parse_errors = 0
-    low_prob_skipped = 0
-    for i, line in enumerate(raw_lines):
-        # Skip empty lines
-        if not line.strip():
-            continue
-        rec = parse_fixed_width_line(line)
-        if rec is None:
-            parse_errors += 1
-            print(f"  WARNING: could not parse line {i + 1}")
-            continue
-        # Filter by probability of good astrometry (GCNSprob)
-        if rec["prob100"] is not None and rec["prob100"] < MIN_PROB100:
-            low_prob_skipped += 1
-            continue
-        records.append(rec)
+    records, parse_errors, low_prob_skipped, n_lines = read_records(INPUT_FILE)
+    print(f"  {n_lines} lines read.")
 
     print(f"  {len(records)} records to match "
           f"({parse_errors} parse errors, {low_prob_skipped} low-prob skipped).")
@@ -511,7 +325,19 @@ def run():
     print("  Connected.")
 
     gaia_index = load_gaia_index(cur)
-    spatial_index = load_spatial_index(cur)
+
+    # Step 2 is needed only where the Gaia id misses, and is answered for all of those
+    # records at once before the cascade runs. source_id from read_records() is
+    # already stripped; gaia_index keys are stripped in load_gaia_index().
+    unidentified = {
+        i: rec for i, rec in enumerate(records)
+        if gaia_index.get(rec["source_id"]) is None
+        and rec["ra_deg"] is not None and rec["dec_deg"] is not None
+    }
+    position_matches = match_by_position(conn, unidentified)
+    missing_pm_count = sum(  # stars with missing proper motion for positional match
+        1 for rec in unidentified.values() if rec["pmra"] is None or rec["pmdec"] is None
+    )
 
     # Track which athyg IDs have already been claimed (one per star)
     claimed_ids = {}  # athyg_id -> (source_id, match_method) of claimer
@@ -529,9 +355,12 @@ def run():
     bright_unmatched_count = 0
     duplicate_count = 0
     duplicate_conflicts = []  # cases where Gaia ID match overrode positional match
-    missing_pm_count = 0  # stars with missing proper motion for positional match
     output_rows = []
 
+    # J2000 positions, distances, magnitudes and spectral types for every record, in a
+    # handful of array operations (astrometry.py) rather than per star in the loop below.
+    derived = derive(records, epoch=GCNS_EPOCH)
+
     print(f"\nMatching {len(records)} GCNS records ...")
 
     for i, rec in enumerate(records):
@@ -542,48 +371,16 @@ def run():
         match_method = None
 
         # --- Step 1: Gaia source_id exact match (primary path) ---
-        # source_id from parse_fixed_width_line is already stripped via safe_str()
-        # gaia_index keys are also stripped in load_gaia_index()
         if rec["source_id"] is not None:
-            lookup_key = rec["source_id"]  # already normalized
-            athyg_id = gaia_index.get(lookup_key)
+            athyg_id = gaia_index.get(rec["source_id"])
             if athyg_id is not None:
                 match_method = "gaia_source_id"
 
-        # --- Step 2: Positional match (epoch-corrected, DB query) ---
-        if athyg_id is None and rec["ra_deg"] is not None and rec["dec_deg"] is not None:
-            # Check if we can properly propagate to J2000
+        # --- Step 2: Positional match (epoch-corrected, batched above) ---
+        if athyg_id is None and i in position_matches:
+            athyg_id = position_matches[i]
             has_pm = rec["pmra"] is not None and rec["pmdec"] is not None
-            
-            if has_pm:
-                ra_j2000, dec_j2000 = propagate_to_j2000(
-                    rec["ra_deg"], rec["dec_deg"], GCNS_EPOCH,
-                    rec["pmra"], rec["pmdec"],
-                )
-                total_pm = math.sqrt(rec["pmra"] ** 2 + rec["pmdec"] ** 2)
-                radius = POS_RADIUS_HIGH_PM_ARCSEC if total_pm > HIGH_PM_THRESHOLD else POS_RADIUS_ARCSEC
-            else:
-                # Without proper motion, we can't accurately propagate J2016 -> J2000.
-                # The 16-year baseline means even a modest PM of 100 mas/yr = 1.6" offset.
-                # Use J2016 position with a larger radius to account for uncertainty,
-                # but this risks false matches.
-                ra_j2000, dec_j2000 = rec["ra_deg"], rec["dec_deg"]
-                radius = POS_RADIUS_HIGH_PM_ARCSEC  # Use larger radius due to uncertainty
-                missing_pm_count += 1
-
-            # Estimate V magnitude for magnitude sanity check
-            gcns_vmag = estimate_vmag(rec["g_mag"], rec["bp_mag"], rec["rp_mag"])
-            # Fall back to G magnitude if V can't be estimated
-            gcns_mag_for_match = gcns_vmag if gcns_vmag is not None else rec["g_mag"]
-            
-            # Convert RA J2000 (degrees) to hours for spatial index query
-            ra_j2000_hours = ra_j2000 / 15.0 if ra_j2000 is not None else None
-            
-            athyg_id, sep_arcsec = spatial_index.query_closest(
-                ra_j2000_hours, dec_j2000, radius, gcns_mag=gcns_mag_for_match
-            )
-            if athyg_id is not None:
-                match_method = "position_j2000" if has_pm else "position_j2016_no_pm"
+            match_method = "position_j2000" if has_pm else "position_j2016_no_pm"
 
         # --- Duplicate check: each athyg_id can only be claimed once ---
         # Priority: gaia_source_id > position_j2000
@@ -622,7 +419,7 @@ def run():
         # --- Brightness check for unmatched stars ---
         bright_unmatched = 0
         if athyg_id is None:
-            v_est = estimate_vmag(rec["g_mag"], rec["bp_mag"], rec["rp_mag"])
+            v_est = derived[i]["mag"]
             # G <= 10.9 without BP-RP is suspicious (Tycho-2 is 99%+ complete to V~11)
             if v_est is not None and v_est <= 11.0:
                 bright_unmatched = 1
@@ -641,7 +438,9 @@ def run():
             next_new_id += 1
 
         method_counts[match_method] += 1
-        output_rows.append(build_output_row(rec, athyg_id, match_method, bright_unmatched))
+        output_rows.append(
+            build_output_row(rec, athyg_id, match_method, bright_unmatched, derived[i])
+        )
 
     cur.close()
     conn.close()
@@ -649,13 +448,20 @@ def run():
     # --- Refuse to write a CSV that would silently drop a designation ---
     assert_no_duplicate_ids(output_rows)
 
-    # --- Write CSV ---
-    print(f"\nWriting {len(output_rows)} rows to {OUTPUT_FILE} ...")
-    os.makedirs(os.path.dirname(os.path.abspath(OUTPUT_FILE)), exist_ok=True)
-    with open(OUTPUT_FILE, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
-        writer.writeheader()
-        writer.writerows(output_rows)
+    # --- Write CSV, or stream the same rows into the staging table ---
+    if COPY_TO_STAGE:
+        print(f"\nCopying {len(output_rows)} rows into gcns_stage ...")
+        conn = connect_db()
+        copied = copy_to_stage(conn, "07_import_gcns.sql", "gcns_stage", output_rows, fieldnames=CSV_COLUMNS)
+        conn.close()
+        print(f"  {copied} rows staged; import with: {finish_hint('07_import_gcns.sql')}")
+    else:
+        print(f"\nWriting {len(output_rows)} rows to {OUTPUT_FILE} ...")
+        os.makedirs(os.path.dirname(os.path.abspath(OUTPUT_FILE)), exist_ok=True)
+        with open(OUTPUT_FILE, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            writer.writerows(output_rows)
     print("  Done.")
 
     # --- Audit report ---
@@ -0,0 +1,81 @@
+"""
+quality_checks.py -- the runner check_distance_quality.py and check_duplicates.py share.
+
+A check is a SQL condition over one row of some source (athyg itself, or one row per
+duplicate group) and a count of the rows it holds for. count_filtered() puts every check
+into one SELECT as a `count(*) FILTER (WHERE ...)` aggregate, so Postgres reads the source
+once however many checks there are. Before this each check was its own `SELECT count(*)`,
+run one after another, and each was a full scan of 2.84M rows: five for the distance
+checks, a sixth for the luminosity residue, and every new check added another.
+
+The duplicate checks are about groups of rows, not rows, and used to be a GROUP BY of their
+own: a second full pass after the distance checks' one, and a third to fetch example ids
+when one failed. ATHYG_WITH_GAIA_GROUPS instead attaches each row's Gaia group to the row
+with window functions, so check_duplicates.py's conditions are conditions on one row like
+any other and check_distance_quality.py counts both sets in the same SELECT. That costs a
+sort by (gaia, id); on a 2M-row synthetic catalog the one pass took 8.2 s against 3.6 s
+and 8.6 s for the two it replaces.
+
+report() prints one result in the format both scripts have always used, so the output is
+the same whether a count came from its own query or a shared one.
+"""
+
+# athyg, one row per star as before, plus the Gaia group each row belongs to: how many
+# rows share its gaia, its place among them by id, and the id and position of the first
+# and last of them. Aliased back to athyg so the per-row checks read it unchanged.
+ATHYG_WITH_GAIA_GROUPS = """(
+           SELECT athyg.*,
+                  count(*) OVER g AS gaia_rows,
+                  row_number() OVER g AS gaia_nth,
+                  last_value(id) OVER g AS gaia_hi_id,
+                  first_value(ra) OVER g AS gaia_lo_ra,
+                  first_value(dec) OVER g AS gaia_lo_dec,
+                  last_value(ra) OVER g AS gaia_hi_ra,
+                  last_value(dec) OVER g AS gaia_hi_dec
+           FROM athyg
+           WINDOW g AS (PARTITION BY gaia ORDER BY id
+                        ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+       ) athyg"""
+
+
+def count_query(conditions, source="athyg", extra=()):
+    """
+    The single SELECT that counts the rows of `source` matching each condition, followed
+    by any `extra` aggregate expressions.
+    """
+    columns = [f"count(*) FILTER (WHERE {c})" for c in conditions] + list(extra)
+    return "SELECT " + ",\n       ".join(columns) + f"\nFROM   {source}"
+
+
+def count_filtered(cur, conditions, source="athyg", params=None, extra=()):
+    """
+    Counts for each condition, in order, then the value of each `extra` aggregate, from
+    one pass over `source`. With params, a literal % in a condition must be written %%, as
+    anywhere in psycopg2.
+    """
+    cur.execute(count_query(conditions, source, extra), params)
+    return list(cur.fetchone())
+
+
+def report(label, count, hint, quiet=False, baseline=0, known=None):
+    """
+    Print one check's result and return how many rows it adds to the problem total.
+
+    With a baseline, a count up to it is a known residue rather than a failure -- only
+    growth fails -- and `known` says what that residue is.
+    """
+    if count > baseline:
+        if baseline:
+            print(f"FAIL  {count:>6,}  {label} (baseline {baseline}, so {count - baseline} new)")
+        else:
+            print(f"FAIL  {count:>6,}  {label}")
+        print(f"              -> {hint}")
+        return count - baseline
+    if not quiet:
+        if baseline:
+            print(f"ok  {count:>6,}  {label} (baseline {baseline})")
+        else:
+            print(f"ok         0  {label}")
+        if known:
+            print(f"              -> {known}")
+    return 0
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Run the db/sql import pipeline as a dependency graph, timing every stage.
+
+    python3 run_import.py                               # what the db image runs at first start
+    python3 run_import.py --report import_report.json   # also write the measurements as JSON
+    PGHOST=localhost PGUSER=hygmap_user PGDATABASE=hygmap python3 run_import.py --jobs 4
+    python3 run_import.py --incremental --plan          # what a rebuild would re-run, and why
+    python3 run_import.py --incremental                 # re-run only that
+
+Until 2026-10 the image ran db/sql/*.sql by the entrypoint's alphabetical rule, one after
+another, and said nothing about where the time went. Two things were wrong with that:
+
+  * **The order cost time for nothing.** 02_create_indexes.sql sorted before the data, so
+    every one of its ~20 indexes -- four of them GIN trigram -- was maintained row by row
+    through the 2.8M-row import and then through every UPDATE in 06-10. Building an index
+    once over finished data is several times faster than maintaining it, and the result
+    is the same index.
+  * **Independent work waited in line.** signals touches nothing else; fictional names and
+    the v3 id map need only the base import. None of that had to wait for the CNS5 /
+    GCNS / distance / override chain, which is where most of the time goes.
+
+So each file is a Stage with the stages it must follow. Ready stages run concurrently,
+each in its own psql session -- psql rather than a driver because the files use \\COPY
+and are written to be run by it, so they run here exactly as they always have. Index
+builds run last, several at a time, with maintenance_work_mem and
+max_parallel_maintenance_workers raised for those sessions only.
+
+What stays serial is everything that UPDATEs athyg: 06 -> 07 -> 08 -> 09 -> 10. Those
+are ordered by meaning, not convenience (07 allocates ids above 06's, 09 must run after
+every automated source so it "genuinely wins", and 10 fills constellations for the rows
+06 and 07 insert), and two large UPDATEs of one table running at once would contend on
+row locks for no gain.
+
+Each stage records its wall time, the rows its statements affected (from psql's command
+tags), and the size of the tables it writes or the index it builds. The summary is
+printed at the end and, with --report, written as JSON.
+
+**Incremental rebuilds.** Every completed stage is recorded in import_manifest with a
+SHA-256 of its inputs: the SQL it ran and every /data file that SQL reads. With
+--incremental, a stage whose hash still matches is skipped, so a one-line fix to
+athyg_overrides.csv re-runs 09 and an ANALYZE instead of re-importing 2.8M rows and
+rebuilding every index. Two declarations per stage make that safe:
+
+  * `restart_from` -- the stage cannot be re-applied on top of its own earlier result,
+    so a change to it rebuilds from that stage. 03 INSERTs the catalog; 06 and 07 only
+    fill gaps and add rows; 08 and 10 overwrite values without keeping what they
+    replaced. A changed input to any of them means a fresh athyg from 01.
+  * `invalidated_by` -- whose re-run makes this stage's result stale (by default, what
+    it follows). Indexes survive UPDATEs, so they are invalidated only by 01 recreating
+    the table, not by every stage that writes athyg.
+
+09 is the exception that can run on its own: it keeps the values it overwrote in
+athyg_override_prior and puts them back before applying the current CSV, so an override
+removed from the file is removed from the database too.
+
+Standard library only: this runs inside the postgres image, which has python3 and psql
+but nothing from requirements.txt.
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+SQL_DIR = os.environ.get("IMPORT_SQL_DIR", os.path.join(os.path.dirname(__file__), "..", "sql"))
+# Where the SQL's '/data/...' paths point. The files only run where that is true, so this
+# is only worth changing to hash a copy of the same files.
+DATA_DIR = os.environ.get("IMPORT_DATA_DIR", "/data")
+
+INDEX_FILE = "02_create_indexes.sql"
+
+# Session settings for the index builds. maintenance_work_mem is per build, so with
+# --jobs builds at once the total is jobs x this; the defaults keep three builds inside
+# the 2 GB minimum docs/setup.md asks for.
+MAINTENANCE_WORK_MEM = os.environ.get("IMPORT_MAINTENANCE_WORK_MEM", "256MB")
+MAX_PARALLEL_MAINTENANCE_WORKERS = os.environ.get("IMPORT_MAX_PARALLEL_MAINTENANCE_WORKERS", "2")
+
+# psql command tags that report a row count: "INSERT 0 12", "UPDATE 3", "COPY 2839957".
+COMMAND_TAG = re.compile(r"^(?:INSERT \d+|UPDATE|DELETE|COPY|SELECT \d+ INTO|MERGE) (\d+)$")
+CREATE_INDEX = re.compile(r"^CREATE INDEX (?:IF NOT EXISTS )?(\w+)", re.IGNORECASE)
+DATA_FILE = re.compile(r"'/data/([^']+)'")
+
+
+class Stage:
+    """One unit of the pipeline: a SQL file (or a single statement) and what it must follow."""
+
+    def __init__(self, name, after=(), writes=(), sql=None, options=None,
+                 restart_from=None, invalidated_by=None):
+        self.name = name
+        self.after = tuple(after)
+        self.writes = tuple(writes)
+        self.sql = sql  # inline SQL instead of db/sql/<name>.sql
+        self.options = options  # PGOPTIONS for this stage's session
+        # For --incremental; see the module docstring.
+        self.restart_from = restart_from
+        self.invalidated_by = self.after if invalidated_by is None else tuple(invalidated_by)
+
+    def copy(self, after):
+        return Stage(self.name, after, self.writes, self.sql, self.options,
+                     self.restart_from, self.invalidated_by)
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+
+# The pipeline, minus the index builds (see index_stages()). `after` is the real data
+# dependency, not the old file order; test_run_import.py checks every db/sql file is
+# here exactly once.
+#
+# 04, 05 and 11 drop and recreate their own tables, so they re-run in place.
+REBUILD = "01_create_table"
+STAGES = [
+    Stage("01_create_table", writes=("athyg",)),
+    Stage("03_import_data", after=("01_create_table",), writes=("athyg",), restart_from=REBUILD),
+    # Needs no catalog at all.
+    Stage("05_import_signals", writes=("signals",)),
+    # Join athyg on Tycho-2 / map onto AT-HYG ids; 06-10 add rows with neither.
+    Stage("04_import_fic", after=("03_import_data",), writes=("fic", "fic_worlds")),
+    Stage("11_import_athyg_v3_ids", after=("03_import_data",), writes=("athyg_v3_ids",)),
+    # The athyg UPDATE chain, serial by design (see the module docstring).
+    Stage("06_import_cns5", after=("03_import_data",), writes=("athyg",), restart_from=REBUILD),
+    Stage("07_import_gcns", after=("06_import_cns5",), writes=("athyg",), restart_from=REBUILD),
+    Stage("08_import_gaia_distances", after=("07_import_gcns",), writes=("athyg",),
+          restart_from=REBUILD),
+    # Undoes its own previous run first, so it is the one athyg writer that re-runs alone.
+    Stage("09_import_overrides", after=("08_import_gaia_distances",), writes=("athyg",)),
+    # Fills con for the rows 03, 06 and 07 create; 08 and 09 move neither those rows nor
+    # their positions, so re-running them leaves this stage's result valid.
+    Stage("10_import_constellations", after=("09_import_overrides",), writes=("athyg",),
+          restart_from=REBUILD,
+          invalidated_by=("03_import_data", "06_import_cns5", "07_import_gcns")),
+]
+LAST_WRITER = "10_import_constellations"
+
+
+def split_statements(sql):
+    """Statements of a plain SQL file (no functions or DO blocks), comments removed."""
+    lines = [line.split("--", 1)[0] for line in sql.splitlines()]
+    return [s.strip() for s in "\n".join(lines).split(";") if s.strip()]
+
+
+def index_stages(sql, after=LAST_WRITER):
+    """
+    02_create_indexes.sql as stages: its other statements (CREATE EXTENSION) first, then
+    one stage per CREATE INDEX, all free to run together.
+
+    Each build drops its index first, so an incremental run can rebuild one whose
+    definition changed. They are invalidated only by the table being recreated.
+    """
+    setup, indexes = [], []
+    for statement in split_statements(sql):
+        match = CREATE_INDEX.match(statement)
+        if match:
+            indexes.append((match.group(1), statement))
+        else:
+            setup.append(statement)
+
+    options = (f"-c maintenance_work_mem={MAINTENANCE_WORK_MEM} "
+               f"-c max_parallel_maintenance_workers={MAX_PARALLEL_MAINTENANCE_WORKERS}")
+    setup_stage = Stage("02_setup", after=(after,), sql=";\n".join(setup) + ";",
+                        invalidated_by=(REBUILD,))
+    stages = [setup_stage]
+    for name, statement in indexes:
+        stages.append(Stage(f"02_{name}", after=(setup_stage.name,), writes=(name,),
+                            sql=f"DROP INDEX IF EXISTS {name};\n{statement};", options=options,
+                            invalidated_by=(REBUILD,)))
+    return stages
+
+
+def pipeline(sql_dir=SQL_DIR):
+    """
+    Every stage, ending with an ANALYZE after all of them -- which the expression indexes
+    need before the planner has statistics for them, and which an incremental run needs
+    after whatever it did re-run.
+    """
+    with open(os.path.join(sql_dir, INDEX_FILE)) as fh:
+        stages = STAGES + index_stages(fh.read())
+    return stages + [Stage("analyze", after=tuple(s.name for s in stages), sql="ANALYZE;")]
+
+
+def stage_sql(stage, sql_dir=SQL_DIR):
+    if stage.sql is not None:
+        return stage.sql
+    with open(os.path.join(sql_dir, f"{stage.name}.sql")) as fh:
+        return fh.read()
+
+
+@functools.lru_cache(maxsize=None)
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_hash(stage, sql_dir=SQL_DIR, data_dir=DATA_DIR):
+    """SHA-256 over the SQL a stage runs and each /data file it reads, by name and content."""
+    sql = stage_sql(stage, sql_dir)
+    digest = hashlib.sha256(sql.encode())
+    for name in sorted(set(DATA_FILE.findall(sql))):
+        path = os.path.join(data_dir, name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{stage.name} reads {path}, which does not exist")
+        digest.update(f"\0{name}\0{file_hash(path)}".encode())
+    return digest.hexdigest()
+
+
+def plan_incremental(stages, hashes, recorded):
+    """
+    Which stages an incremental run must re-run, given their input hashes now and as
+    recorded, and why. Returns (stages to run, {name: reason}); the stages' `after` is cut
+    down to the ones running, keeping the order between them that ran through the others.
+
+    A recorded index stage that is no longer in the pipeline comes back as a DROP INDEX.
+    """
+    by_name = {s.name: s for s in stages}
+    reasons = {}
+    for stage in stages:
+        if stage.name not in recorded:
+            reasons[stage.name] = "not recorded as complete"
+        elif recorded[stage.name] != hashes[stage.name]:
+            reasons[stage.name] = "inputs changed"
+
+    grew = True
+    while grew:
+        grew = False
+        for stage in stages:
+            if stage.name in reasons:
+                target = stage.restart_from
+                if target and target not in reasons:
+                    reasons[target] = f"{stage.name} cannot be re-applied in place"
+                    grew = True
+            else:
+                stale = [d for d in stage.invalidated_by if d in reasons]
+                if stale:
+                    reasons[stage.name] = f"{stale[0]} re-runs"
+                    grew = True
+
+    def running_ancestors(name, seen):
+        found = set()
+        for dep in by_name[name].after:
+            if dep in seen:
+                continue
+            seen.add(dep)
+            found |= {dep} if dep in reasons else running_ancestors(dep, seen)
+        return found
+
+    plan = [s.copy(sorted(running_ancestors(s.name, set()))) for s in stages if s.name in reasons]
+    for name in sorted(set(recorded) - set(by_name)):
+        if name.startswith("02_idx_"):
+            reasons[f"drop_{name[3:]}"] = "index no longer in " + INDEX_FILE
+            plan.append(Stage(f"drop_{name[3:]}", sql=f"DROP INDEX IF EXISTS {name[3:]};"))
+    return plan, reasons
+
+
+def check_graph(stages):
+    """Raise ValueError on an unknown dependency, a duplicate or a cycle."""
+    names = [s.name for s in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("duplicate stage names")
+    known = set(names)
+    for stage in stages:
+        missing = set(stage.after) - known
+        if missing:
+            raise ValueError(f"{stage.name} follows unknown stage(s) {sorted(missing)}")
+    done, pending = set(), list(stages)
+    while pending:
+        ready = [s for s in pending if set(s.after) <= done]
+        if not ready:
+            raise ValueError(f"dependency cycle among {[s.name for s in pending]}")
+        done.update(s.name for s in ready)
+        pending = [s for s in pending if s.name not in done]
+
+
+def rows_affected(output):
+    """Sum of the row counts in psql's command tags."""
+    total = 0
+    for line in output.splitlines():
+        match = COMMAND_TAG.match(line.strip())
+        if match:
+            total += int(match.group(1))
+    return total
+
+
+def run_pipeline(stages, execute, jobs, log=print):
+    """
+    Run `stages` respecting `after`, up to `jobs` at once. `execute(stage)` runs one
+    stage and returns its measurements as a dict. Stops scheduling at the first failure,
+    lets running stages finish, and re-raises it.
+
+    Returns {stage name: measurements}, in completion order.
+    """
+    check_graph(stages)
+    results, done, failure = {}, set(), None
+    pending = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            if failure is None:
+                for stage in [s for s in pending if set(s.after) <= done][: jobs - len(running)]:
+                    pending.remove(stage)
+                    log(f"-> {stage.name}")
+                    running[pool.submit(execute, stage)] = stage
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                except Exception as exc:  # noqa: BLE001 -- reported, then re-raised
+                    log(f"!! {stage.name} failed: {exc}")
+                    failure = failure or exc
+                    continue
+                done.add(stage.name)
+                log(f"<- {stage.name} {results[stage.name]['seconds']:.1f}s")
+    if failure is not None:
+        raise failure
+    return results
+
+
+class Psql:
+    """Runs stages through psql. Connection settings come from the usual PG* variables."""
+
+    MANIFEST = """
+        CREATE TABLE IF NOT EXISTS import_manifest (
+          stage        TEXT PRIMARY KEY,
+          input_hash   TEXT NOT NULL,
+          seconds      REAL,
+          rows         BIGINT,
+          completed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """
+
+    SIZES = """
+        SELECT c.relname, pg_relation_size(c.oid), pg_total_relation_size(c.oid)
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = ANY (string_to_array(:'names', ','))
+    """
+
+    def __init__(self, sql_dir=SQL_DIR, psql="psql", extra_args=()):
+        self.sql_dir = sql_dir
+        self.base = [psql, "--no-psqlrc", "-v", "ON_ERROR_STOP=1", *extra_args]
+        self._log_lock = threading.Lock()
+
+    def __call__(self, stage):
+        env = dict(os.environ)
+        if stage.options:
+            env["PGOPTIONS"] = f"{env.get('PGOPTIONS', '')} {stage.options}".strip()
+        if stage.sql is None:
+            command = self.base + ["-f", os.path.join(self.sql_dir, f"{stage.name}.sql")]
+        else:
+            command = self.base + ["-c", stage.sql]
+
+        started = time.perf_counter()
+        proc = subprocess.run(command, env=env, capture_output=True, text=True)
+        seconds = time.perf_counter() - started
+        with self._log_lock:
+            # NOTICEs are the import's own progress report; keep them, attributed.
+            for line in proc.stderr.splitlines():
+                print(f"   [{stage.name}] {line}", file=sys.stderr)
+        if proc.returncode != 0:
+            raise RuntimeError(f"psql exited {proc.returncode}")
+        return {
+            "seconds": round(seconds, 2),
+            "rows": rows_affected(proc.stdout),
+            "sizes": self.sizes(stage.writes),
+        }
+
+    def query(self, sql, **variables):
+        args = [arg for k, v in variables.items() for arg in ("-v", f"{k}={v}")]
+        proc = subprocess.run(
+            self.base + ["-At", "-F", "\t", *args],
+            input=sql, capture_output=True, text=True, check=True,
+        )
+        return [line.split("\t") for line in proc.stdout.splitlines()]
+
+    def recorded(self):
+        """{stage: input hash} for every stage the manifest records as complete."""
+        # Read-only, so --plan can be run against a database that has never had one.
+        if self.query("SELECT to_regclass('import_manifest') IS NOT NULL;") != [["t"]]:
+            return {}
+        return dict(self.query("SELECT stage, input_hash FROM import_manifest;"))
+
+    def forget(self, names):
+        """Unrecord stages before they re-run, so a failed run leaves them marked stale."""
+        self.query(self.MANIFEST + "DELETE FROM import_manifest WHERE stage = ANY "
+                   "(string_to_array(:'names', ','));", names=",".join(names))
+
+    def record(self, name, input_hash, result):
+        self.query(
+            "INSERT INTO import_manifest (stage, input_hash, seconds, rows) "
+            "VALUES (:'stage', :'hash', :seconds, :rows) "
+            "ON CONFLICT (stage) DO UPDATE SET input_hash = EXCLUDED.input_hash, "
+            "seconds = EXCLUDED.seconds, rows = EXCLUDED.rows, completed_at = now();",
+            stage=name, hash=input_hash, seconds=result["seconds"], rows=result["rows"],
+        )
+
+    def sizes(self, names):
+        """{relation: {"bytes": own size, "total_bytes": with indexes and TOAST}}."""
+        if not names:
+            return {}
+        return {
+            name: {"bytes": int(own), "total_bytes": int(total)}
+            for name, own, total in self.query(self.SIZES, names=",".join(names))
+        }
+
+
+def format_summary(results, elapsed):
+    lines = [f"{'stage':<36} {'seconds':>8} {'rows':>10} {'size':>10}"]
+    for name, r in sorted(results.items(), key=lambda item: -item[1]["seconds"]):
+        size = sum(s["total_bytes"] for s in r["sizes"].values())
+        lines.append(f"{name:<36} {r['seconds']:>8.1f} {r['rows']:>10,} "
+                     f"{size / 2**20:>8.1f}MB")
+    busy = sum(r["seconds"] for r in results.values())
+    lines.append(f"wall {elapsed:.1f}s for {busy:.1f}s of stage time")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--sql-dir", default=SQL_DIR)
+    p.add_argument("--jobs", type=int, default=int(os.environ.get("IMPORT_JOBS", "3")),
+                   help="stages (and index builds) run at once")
+    p.add_argument("--data-dir", default=DATA_DIR, help="where the SQL's /data files are, for hashing")
+    p.add_argument("--psql", default="psql")
+    p.add_argument("--report", help="write the per-stage measurements here as JSON")
+    p.add_argument("--incremental", action="store_true",
+                   help="skip stages whose inputs match import_manifest")
+    p.add_argument("--plan", action="store_true", help="print what would run, and why, then stop")
+    args = p.parse_args(argv)
+
+    psql = Psql(args.sql_dir, args.psql)
+    stages = pipeline(args.sql_dir)
+    hashes = {s.name: stage_hash(s, args.sql_dir, args.data_dir) for s in stages}
+    recorded = psql.recorded()
+    stages, reasons = plan_incremental(stages, hashes, recorded if args.incremental else {})
+
+    if args.plan or not stages:
+        for stage in stages:
+            print(f"{stage.name:<36} {reasons[stage.name]}")
+        if not stages:
+            print("Nothing to do: every stage matches import_manifest.")
+        return 0
+
+    psql.forget([s.name for s in stages] + [name for name in recorded if name not in hashes])
+
+    def execute(stage):
+        result = psql(stage)
+        if stage.name in hashes:
+            psql.record(stage.name, hashes[stage.name], result)
+        return result
+
+    started = time.perf_counter()
+    results = run_pipeline(stages, execute, args.jobs)
+    elapsed = time.perf_counter() - started
+
+    print(format_summary(results, elapsed))
+    if args.report:
+        with open(args.report, "w") as fh:
+            json.dump({"wall_seconds": round(elapsed, 2), "jobs": args.jobs, "stages": results}, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Tests for the shared astrometry kernel.
+
+Run: python -m pytest test_astrometry.py -v
+
+The per-star behaviour is covered by the test_match_* suites, which call these functions
+with scalars as they always have. What is checked here is that whole arrays give the same
+answers as star-by-star calls, including where values are missing.
+"""
+import math
+
+import numpy as np
+import pytest
+
+from astrometry import (
+    absolute_magnitude,
+    compute_equatorial_coords,
+    derive,
+    estimate_spectral_type,
+    estimate_vmag,
+    propagate_to_j2000,
+)
+
+
+def reference_spectral_type(bp_rp, absmag):
+    """The per-star classifier both matchers carried before, kept verbatim as the oracle."""
+    if bp_rp is None:
+        return None
+    if bp_rp >= 4.0:
+        return "L"
+    if absmag is not None and absmag > 10 and bp_rp < 1.5:
+        return "D"
+    if absmag is None:
+        if bp_rp > 2.5:
+            return "M V"
+        if bp_rp >= 0.5:
+            return None
+    if bp_rp < -0.3:
+        letter, ms_mv = "O", -4.0
+    elif bp_rp < 0.0:
+        letter, ms_mv = "B", 0.0
+    elif bp_rp < 0.35:
+        letter, ms_mv = "A", 1.5
+    elif bp_rp < 0.65:
+        letter, ms_mv = "F", 3.5
+    elif bp_rp < 1.0:
+        letter, ms_mv = "G", 5.0
+    elif bp_rp < 1.85:
+        letter, ms_mv = "K", 7.0
+    else:
+        letter, ms_mv = "M", 11.0
+    if absmag is None:
+        return f"{letter} V"
+    if absmag < ms_mv - 3.0 and absmag < 2.0:
+        return f"{letter} III"
+    if absmag < ms_mv - 1.5 and absmag < 4.0:
+        return f"{letter} IV"
+    return f"{letter} V"
+
+
+def with_gaps(rng, values, fraction=0.2):
+    values = np.array(values, dtype=np.float64)
+    values[rng.random(len(values)) < fraction] = np.nan
+    return values
+
+
+def as_none(v):
+    return None if v is None or (isinstance(v, float) and math.isnan(v)) else float(v)
+
+
+class TestSpectralType:
+    def test_matches_the_per_star_classifier_everywhere(self):
+        # Every colour boundary and magnitude threshold, either side of each.
+        colours = [None, -0.5, -0.3, -0.1, 0.0, 0.2, 0.35, 0.5, 0.65, 0.8, 1.0, 1.4, 1.5,
+                   1.85, 2.0, 2.5, 2.6, 3.9, 4.0, 4.5]
+        absmags = [None, -6.0, -1.0, 0.5, 1.9, 2.0, 3.0, 3.9, 4.0, 6.0, 9.9, 10.0, 10.1, 14.0]
+        bp_rp = np.array([c for c in colours for _ in absmags], dtype=np.float64)
+        absmag = np.array([a for _ in colours for a in absmags], dtype=np.float64)
+        got = estimate_spectral_type(bp_rp, absmag)
+        expected = [reference_spectral_type(c, a) for c in colours for a in absmags]
+        assert got.tolist() == expected
+
+
+class TestArraysMatchScalars:
+    def setup_method(self):
+        rng = np.random.default_rng(2016)
+        n = 500
+        self.ra = rng.uniform(0, 360, n)
+        self.dec = rng.uniform(-90, 90, n)
+        self.epoch = with_gaps(rng, rng.choice([1991.25, 2015.5, 2016.0], n))
+        self.pmra = with_gaps(rng, rng.normal(0, 2000, n))
+        self.pmdec = with_gaps(rng, rng.normal(0, 2000, n))
+        self.g = with_gaps(rng, rng.uniform(3, 20, n))
+        self.bp = with_gaps(rng, self.g + rng.uniform(0, 1, n))
+        self.rp = with_gaps(rng, self.g - rng.uniform(0, 3, n))
+        self.dist = with_gaps(rng, rng.uniform(-1, 100, n))
+
+    def test_propagation(self):
+        ra, dec = propagate_to_j2000(self.ra, self.dec, self.epoch, self.pmra, self.pmdec)
+        for i in range(len(ra)):
+            args = [as_none(a[i]) for a in (self.ra, self.dec, self.epoch, self.pmra, self.pmdec)]
+            assert (ra[i], dec[i]) == pytest.approx(propagate_to_j2000(*args), abs=1e-12)
+
+    def test_vmag_and_absmag(self):
+        v = estimate_vmag(self.g, self.bp, self.rp)
+        absmag = absolute_magnitude(v, self.dist)
+        for i in range(len(v)):
+            one = estimate_vmag(as_none(self.g[i]), as_none(self.bp[i]), as_none(self.rp[i]))
+            assert as_none(v[i]) == one
+            assert as_none(absmag[i]) == absolute_magnitude(as_none(v[i]), as_none(self.dist[i]))
+
+    def test_equatorial_coords(self):
+        xyz = compute_equatorial_coords(self.ra / 15.0, self.dec, self.dist)
+        for i in range(len(self.ra)):
+            one = compute_equatorial_coords(self.ra[i] / 15.0, self.dec[i], as_none(self.dist[i]))
+            got = tuple(as_none(c[i]) for c in xyz)
+            if one[0] is None:
+                assert got == (None, None, None)
+            else:
+                assert got == pytest.approx(one, abs=1e-9)
+
+
+class TestDerive:
+    def record(self, **overrides):
+        rec = {"ra_deg": 180.0, "dec_deg": 30.0, "epoch": 2016.0, "pmra": 100.0,
+               "pmdec": -50.0, "parallax": 100.0, "g_mag": 10.0, "bp_mag": 10.5, "rp_mag": 9.5}
+        return {**rec, **overrides}
+
+    def test_one_record_at_a_time_equals_the_batch(self):
+        records = [self.record(), self.record(parallax=None), self.record(bp_mag=None),
+                   self.record(pmra=None), self.record(ra_deg=None, dec_deg=None)]
+        batch = derive(records)
+        assert batch == [derive([rec])[0] for rec in records]
+
+    def test_values(self):
+        d = derive([self.record()])[0]
+        assert d["dist"] == pytest.approx(10.0)
+        assert d["absmag"] == pytest.approx(d["mag"])  # at 10 pc, M = m
+        assert d["bp_rp"] == pytest.approx(1.0)
+        assert d["spect"] == "K V"
+        assert d["ra_j2000"] == pytest.approx(12.0, abs=1e-4)
+
+    def test_missing_parallax_leaves_distance_dependent_fields_empty(self):
+        d = derive([self.record(parallax=None)])[0]
+        assert d["dist"] is None and d["absmag"] is None and d["x_eq"] is None
+        assert d["mag"] is not None
+
+    def test_catalog_epoch_overrides_the_record(self):
+        rec = self.record(epoch=None)
+        assert derive([rec])[0]["dec_j2000"] == 30.0
+        assert derive([rec], epoch=2016.0)[0]["dec_j2000"] != 30.0
+
+    def test_empty(self):
+        assert derive([]) == []
@@ -6,28 +6,67 @@ Run: python -m pytest test_check_duplicates.py -v
 Two things are covered, because the guard exists in two places and either one drifting
 would matter:
 
-- the classification rule in check_duplicates.py, which is pure and testable directly
+- the query check_duplicates.py runs, executed in SQLite against planted groups (with
+  Postgres's array_agg and least supplied), as test_quality_checks.py does for the
+  distance checks
 - the SQL guard in the import files, which needs Postgres and 2.8M rows to execute, so
   what is asserted here is that it is still present and still tests the right invariant
 """
+import json
 import os
 import re
+import sqlite3
 
 import pytest
 
 from check_duplicates import (
+    DUPLICATE_CONDITIONS,
+    DUPLICATE_EXAMPLES,
     FIRST_IMPORTED_ID,
     KNOWN_INHERITED_BASELINE,
-    classify_group,
-    summarise,
 )
+from quality_checks import ATHYG_WITH_GAIA_GROUPS, count_query
 
 SQL_DIR = os.path.join(os.path.dirname(__file__), "..", "sql")
 
 
-class TestClassifyGroup:
+class ArrayAgg:
+    """Postgres's array_agg, as a SQLite aggregate; the array comes back as JSON text."""
+
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        self.values.append(value)
+
+    def finalize(self):
+        return json.dumps(self.values) if self.values else None
+
+
+def groups_db(rows):
+    """An athyg table of (id, gaia, ra, dec) rows, queryable with check_duplicates' SQL."""
+    conn = sqlite3.connect(":memory:")
+    conn.create_aggregate("array_agg", 1, ArrayAgg)
+    conn.create_function("least", 2, min)
+    conn.execute("CREATE TABLE athyg (id INTEGER PRIMARY KEY, gaia INTEGER, ra REAL, dec REAL)")
+    conn.executemany("INSERT INTO athyg VALUES (?, ?, ?, ?)", rows)
+    return conn
+
+
+def counts(rows):
+    """(created, inherited, far apart), as main() counts them."""
+    conn = groups_db(rows)
+    try:
+        sql = count_query(DUPLICATE_CONDITIONS, source=ATHYG_WITH_GAIA_GROUPS)
+        return conn.execute(sql).fetchone()
+    finally:
+        conn.close()
+
+
+class TestDuplicateGroups:
     """
-    The rule that separates "we made this duplicate" from "AT-HYG shipped it".
+    The rule that separates "we made this duplicate" from "AT-HYG shipped it", run as the
+    query main() runs.
 
     Getting this backwards in either direction is costly: blame AT-HYG for our own bug and
     the build stays green while inserting the same star twice; blame us for AT-HYG's real
@@ -36,38 +75,54 @@ class TestClassifyGroup:
 
     def test_two_athyg_rows_are_inherited(self):
         # A real close binary: Tycho-2 resolved both, Gaia recorded one source.
-        assert classify_group([1035811, 2413107]) == "inherited"
+        assert counts([(1035811, 1, 5.0, 10.0), (2413107, 1, 5.0, 10.0)]) == (0, 1, 0)
 
-    def test_a_supplement_inserted_row_makes_it_ours(self):
+    def test_two_supplement_rows_are_ours(self):
         # gaia 1005873614080407296, the measured CNS5/GCNS collision.
-        assert classify_group([5000426, 6069717]) == "created"
+        assert counts([(5000426, 1, 5.0, 10.0), (6069717, 1, 5.0, 10.0)]) == (1, 0, 0)
 
     def test_one_supplement_row_beside_an_athyg_row_is_ours(self):
         """The 39 measured cases where CNS5 re-inserted a star AT-HYG already had."""
-        assert classify_group([310581, 5000426]) == "created"
+        assert counts([(310581, 1, 5.0, 10.0), (5000426, 1, 5.0, 10.0)]) == (1, 0, 0)
 
     def test_the_boundary_id_counts_as_imported(self):
-        assert classify_group([1, FIRST_IMPORTED_ID]) == "created"
-        assert classify_group([1, FIRST_IMPORTED_ID - 1]) == "inherited"
-
-
-class TestSummarise:
-    def test_counts_each_class(self):
-        groups = {
-            "a": [100, 200],  # inherited
-            "b": [5000001, 6000001],  # created
-            "c": [300, 6000002],  # created
-            "d": [400, 500],  # inherited
-        }
-        assert summarise(groups) == (2, 2)
-
-    def test_ignores_singleton_groups(self):
+        assert counts([(1, 1, 5.0, 10.0), (FIRST_IMPORTED_ID, 1, 5.0, 10.0)]) == (1, 0, 0)
+        assert counts([(1, 1, 5.0, 10.0), (FIRST_IMPORTED_ID - 1, 1, 5.0, 10.0)]) == (0, 1, 0)
+
+    def test_each_group_counts_once(self):
+        rows = [
+            (100, 1, 5.0, 10.0), (200, 1, 5.0, 10.0), (300, 1, 5.0, 10.0),  # inherited
+            (5000001, 2, 5.0, 10.0), (6000001, 2, 5.0, 10.0),  # created
+            (400, 3, 5.0, 10.0), (6000002, 3, 5.0, 10.0),  # created
+        ]
+        assert counts(rows) == (2, 1, 0)
+
+    def test_unique_and_missing_gaia_ids_are_not_duplicates(self):
         """A star with a unique Gaia id is not a duplicate, however it got there."""
-        assert summarise({"a": [5000001], "b": [100]}) == (0, 0)
-
-    def test_no_duplicates_is_all_zero(self):
-        assert summarise({}) == (0, 0)
-
+        assert counts([(5000001, 1, 5.0, 10.0), (100, 2, 5.0, 10.0), (101, None, 5.0, 10.0),
+                       (102, None, 5.0, 10.0)]) == (0, 0, 0)
+
+    def test_wide_separation_is_measured_in_degrees_from_hours(self):
+        # 0.1 h of RA on the equator is 1.5 degrees: far apart only if ra is scaled by 15.
+        assert counts([(1, 1, 5.0, 0.0), (2, 1, 5.1, 0.0)]) == (0, 1, 1)
+        assert counts([(1, 1, 5.0, 0.0), (2, 1, 5.05, 0.0)]) == (0, 1, 0)
+
+    def test_examples_are_the_created_groups_from_the_same_pass(self):
+        conn = groups_db([
+            (100, 1, 5.0, 10.0), (200, 1, 5.0, 10.0),
+            (300, 2, 5.0, 10.0), (5000001, 2, 5.0, 10.0),
+            (400, 3, 5.0, 10.0), (6000001, 3, 5.0, 10.0), (6000002, 3, 5.0, 10.0),
+        ])
+        sql = count_query(DUPLICATE_CONDITIONS, source=ATHYG_WITH_GAIA_GROUPS, extra=[DUPLICATE_EXAMPLES])
+        try:
+            *found, examples = conn.execute(sql).fetchone()
+        finally:
+            conn.close()
+        assert found == [2, 1, 0]
+        assert sorted(json.loads(examples)) == [2, 3]
+
+
+class TestBaseline:
     def test_the_baseline_is_not_zero_and_that_is_deliberate(self):
         """
         Guards against someone "tidying" the baseline to 0 and then suppressing the
@@ -144,7 +199,7 @@ class TestSeparationIsMeasuredInTheRightUnits:
 
     def test_right_ascension_is_converted_from_hours(self):
         src = self._source()
-        assert re.search(r"radians\(\s*\(h\.ra\s*-\s*l\.ra\)\s*\*\s*15\s*\)", src), (
+        assert re.search(r"radians\(\s*\(gaia_hi_ra\s*-\s*gaia_lo_ra\)\s*\*\s*15\s*\)", src), (
             "the separation query no longer scales ra from hours to degrees; separations "
             "will read 15x too small"
         )
@@ -152,7 +207,7 @@ class TestSeparationIsMeasuredInTheRightUnits:
     def test_declination_is_not_scaled(self):
         """Dec is already in degrees -- scaling it too would be the opposite mistake."""
         src = self._source()
-        assert re.search(r"radians\(h\.dec\s*-\s*l\.dec\)", src)
+        assert re.search(r"radians\(gaia_hi_dec\s*-\s*gaia_lo_dec\)", src)
 
 
 class TestOverrideMechanismSupportsRetraction:
@@ -4,12 +4,19 @@ Tests for constellation computation.
 Run: python -m pytest test_compute_constellations.py -v
 """
 import os
+
+import numpy as np
 import pytest
+import compute_constellations
 from compute_constellations import (
+    BoundaryLookup,
+    b1875_positions,
+    check_all,
     load_boundaries,
     precess_to_b1875,
     constellation_independent,
     constellations_astropy,
+    constellations_fast,
     VERIFY_CASES,
 )
 
@@ -74,9 +81,9 @@ class TestImplementationsAgree:
     """
     The two implementations are carried on purpose; this is the check that makes that useful.
 
-    They diverge only for positions within about an arcsecond of a boundary, where the FK4
-    frame terms astropy models decide the answer. Measured agreement on a 30,000-star sample
-    was 99.993%.
+    They diverge only for positions within about 25 arcseconds of a boundary, where the
+    annual aberration astropy applies decides the answer. Measured agreement on a
+    30,000-star sample was 99.993%.
     """
 
     def test_agree_across_a_spread_of_positions(self):
@@ -100,6 +107,109 @@ class TestImplementationsAgree:
                 assert constellation_independent(ra, dec, BOUNDARIES) is not None
 
 
+def scan(ra_1875, dec_1875, boundaries=BOUNDARIES):
+    """Roman's first-match scan on an already-precessed position, as constellation_independent does it."""
+    for ra_low, ra_up, dec_low, con in boundaries:
+        if dec_1875 >= dec_low and ra_low <= ra_1875 < ra_up:
+            return con
+    return None
+
+
+class TestBoundaryLookup:
+    LOOKUP = BoundaryLookup(BOUNDARIES)
+
+    def test_equals_the_scan_everywhere(self):
+        rng = np.random.default_rng(1875)
+        ra = rng.uniform(0, 24, 20_000)
+        dec = np.degrees(np.arcsin(rng.uniform(-1, 1, 20_000)))
+        got = self.LOOKUP(ra, dec).tolist()
+        assert got == [scan(r, d) for r, d in zip(ra.tolist(), dec.tolist())]
+
+    def test_equals_the_scan_exactly_on_the_edges(self):
+        """Every corner of every row: ral <= ra < rau and dec >= floor, as the scan reads them."""
+        ra = np.array([b[i] for b in BOUNDARIES for i in (0, 1)] * 2)
+        dec = np.array([b[2] for b in BOUNDARIES for _ in (0, 1)] * 2)
+        dec[len(dec) // 2:] -= 1e-9
+        got = self.LOOKUP(ra % 24.0, dec).tolist()
+        assert got == [scan(r, d) for r, d in zip((ra % 24.0).tolist(), dec.tolist())]
+
+    def test_rejects_a_table_out_of_order(self):
+        with pytest.raises(ValueError):
+            BoundaryLookup(BOUNDARIES[::-1])
+
+    def test_near_edge(self):
+        lookup = BoundaryLookup([(0.0, 24.0, 10.0, "A"), (0.0, 12.0, -90.0, "B"), (12.0, 24.0, -90.0, "C")])
+        assert lookup(np.array([6.0, 6.0, 18.0]), np.array([20.0, 0.0, 0.0])).tolist() == ["A", "B", "C"]
+        arcsec = 1 / 3600
+        near = lookup.near_edge(
+            np.array([6.0, 6.0, 12.0 + 0.5 * arcsec / 15, 6.0]),
+            np.array([10.0 + 0.5 * arcsec, 10.0 + 2 * arcsec, 0.0, 0.0]),
+            1.0,
+        )
+        assert near.tolist() == [True, False, True, False]
+
+
+class TestFastPath:
+    """
+    The array engine must give astropy's answers: it replaces astropy's loop, not its
+    definition of where a star is.
+    """
+
+    LOOKUP = BoundaryLookup(BOUNDARIES)
+
+    def test_positions_match_astropy(self):
+        from astropy.coordinates import SkyCoord, PrecessedGeocentric
+        from astropy.time import Time
+        import astropy.units as u
+
+        ra, dec = np.array([0.5, 6.25, 13.0, 23.9]), np.array([-80.0, 12.0, 45.0, 89.0])
+        got_ra, got_dec = b1875_positions(ra, dec)
+        frame = PrecessedGeocentric(equinox=Time("B1875", scale="tt"), obstime=Time("J2000", scale="tt"))
+        ref = SkyCoord(ra=ra * 15.0 * u.deg, dec=dec * u.deg, frame="icrs").transform_to(frame)
+        assert got_ra == pytest.approx(ref.ra.hour, abs=1e-9)
+        assert got_dec == pytest.approx(ref.dec.deg, abs=1e-9)
+
+    def test_equals_astropy_on_a_random_sample(self):
+        rng = np.random.default_rng(30)
+        ra = rng.uniform(0, 24, 5_000)
+        dec = np.degrees(np.arcsin(rng.uniform(-1, 1, 5_000)))
+        got, _rechecked, _changed = constellations_fast(ra, dec, self.LOOKUP)
+        assert got.tolist() == constellations_astropy(list(zip(ra.tolist(), dec.tolist())))
+
+    def test_known_stars_and_poles(self):
+        cases = [(c[1], c[2]) for c in VERIFY_CASES] + [(ra, d) for d in (90.0, -90.0) for ra in (0.0, 12.0)]
+        ra, dec = (np.array(v) for v in zip(*cases))
+        got, _, _ = constellations_fast(ra, dec, self.LOOKUP, margin_arcsec=0.0)
+        assert got.tolist() == [c[3] for c in VERIFY_CASES] + ["UMi", "UMi", "Oct", "Oct"]
+
+    def test_edge_stars_are_given_astropy_answer(self):
+        """A margin wide enough to catch everything hands every star to astropy."""
+        ra, dec = np.array([1.0, 7.0]), np.array([10.0, -40.0])
+        got, rechecked, _ = constellations_fast(ra, dec, self.LOOKUP, margin_arcsec=1e9)
+        assert rechecked == 2
+        assert got.tolist() == constellations_astropy([(1.0, 10.0), (7.0, -40.0)])
+
+
+class TestCheckAll:
+    LOOKUP = BoundaryLookup(BOUNDARIES)
+
+    def stored(self, monkeypatch, cons):
+        ra, dec = np.array([6.7524628, 18.6156500]), np.array([-16.716116, 38.783689])
+        monkeypatch.setattr(
+            compute_constellations, "fetch_positions",
+            lambda conn, where: ([1, 2], ra, dec, cons),
+        )
+
+    def test_agreement_passes(self, monkeypatch, capsys):
+        self.stored(monkeypatch, ["CMa", "Lyr"])
+        assert check_all(None, self.LOOKUP) == 0
+
+    def test_any_disagreement_fails(self, monkeypatch, capsys):
+        self.stored(monkeypatch, ["CMa", "Cyg"])
+        assert check_all(None, self.LOOKUP) == 1
+        assert "stored Cyg computed Lyr: 1" in capsys.readouterr().out
+
+
 class TestSolIsExcluded:
     def test_the_origin_would_otherwise_get_a_constellation(self):
         """
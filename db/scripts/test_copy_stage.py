@@ -0,0 +1,137 @@
+"""
+Tests for streaming script output into the staging tables.
+
+Run: python -m pytest test_copy_stage.py -v
+
+What is checked without a database: the staging table copy_to_stage() creates is the one
+each import defines, its columns line up with what each script writes, each import has the
+from_stage branch that reads it, and the streamed text is exactly the CSV the script would
+have written.
+"""
+import csv
+import io
+import os
+import re
+
+import pytest
+
+import copy_stage
+from copy_stage import SQL_DIR, CsvStream, copy_to_stage, stage_columns
+from match_athyg_v3 import CSV_COLUMNS as V3_COLUMNS
+from match_cns5 import CSV_COLUMNS as CNS5_COLUMNS
+from match_gcns import CSV_COLUMNS as GCNS_COLUMNS
+
+# (sql file, staging table, the columns the script writes). The CSV header is not what
+# COPY matches on -- columns are positional -- so only the order has to agree; v3's
+# `offset` is `offset_` in SQL because OFFSET is reserved.
+STAGES = [
+    ("06_import_cns5.sql", "cns5_stage", CNS5_COLUMNS),
+    ("07_import_gcns.sql", "gcns_stage", GCNS_COLUMNS),
+    ("10_import_constellations.sql", "constellation_stage", ["athyg_id", "con"]),
+    ("11_import_athyg_v3_ids.sql", "athyg_v3_ranges", [c.replace("offset", "offset_") for c in V3_COLUMNS]),
+]
+
+
+def drain(stream, size):
+    chunks = []
+    while chunk := stream.read(size):
+        chunks.append(chunk)
+    return "".join(chunks)
+
+
+def written(rows, header=None, fieldnames=None):
+    fh = io.StringIO()
+    if fieldnames:
+        writer = csv.DictWriter(fh, fieldnames=fieldnames)
+        writer.writeheader()
+    else:
+        writer = csv.writer(fh)
+        writer.writerow(header)
+    writer.writerows(rows)
+    return fh.getvalue()
+
+
+@pytest.mark.parametrize("sql_file,table,columns", STAGES)
+class TestStages:
+    def test_columns_match_what_the_script_writes(self, sql_file, table, columns):
+        defined = [line.split()[0] for line in stage_columns(sql_file, table).splitlines()]
+        assert defined == columns
+
+    def test_import_reads_the_stage_when_asked(self, sql_file, table, columns):
+        with open(os.path.join(SQL_DIR, sql_file)) as fh:
+            sql = fh.read()
+        branch = re.search(r"\\if :\{\?from_stage\}\n(.*?)\\else\n(.*?)\\endif", sql, re.S)
+        assert branch, f"{sql_file} has no from_stage branch"
+        assert f"INSERT INTO {table} SELECT * FROM public.{table};" in branch.group(1)
+        assert f"DROP TABLE public.{table};" in branch.group(1)
+        assert re.search(rf"\\?COPY {table}\s+FROM '/data/", branch.group(2))
+
+
+class TestCsvStream:
+    ROWS = [[i, f"name {i}", "" if i % 3 else 1.5, 'say "hi", ok'] for i in range(12_345)]
+    HEADER = ["id", "name", "value", "note"]
+
+    @pytest.mark.parametrize("size", [1, 7, 8192, -1])
+    def test_same_text_as_csv_writer(self, size):
+        assert drain(CsvStream(self.ROWS, header=self.HEADER), size) == written(self.ROWS, header=self.HEADER)
+
+    def test_same_text_as_dict_writer(self):
+        rows = [dict(zip(self.HEADER, row)) for row in self.ROWS]
+        stream = CsvStream(iter(rows), fieldnames=self.HEADER)
+        assert drain(stream, 8192) == written(rows, fieldnames=self.HEADER)
+
+    def test_formats_rows_as_they_are_read(self, monkeypatch):
+        monkeypatch.setattr(copy_stage, "ROWS_PER_CHUNK", 100)
+        rows = iter(self.ROWS)
+        stream = CsvStream(rows, header=self.HEADER)
+        stream.read(len("id,name,value,note\r\n") + 1)
+        assert len(list(rows)) == len(self.ROWS) - 100
+
+    def test_no_rows_is_just_the_header(self):
+        assert drain(CsvStream([], header=self.HEADER), 8192) == "id,name,value,note\r\n"
+
+    def test_header_is_required(self):
+        with pytest.raises(ValueError, match="header"):
+            CsvStream(self.ROWS)
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log, self.rowcount = log, -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        self.log.append(sql)
+
+    def copy_expert(self, sql, stream):
+        text = drain(stream, 8192)
+        self.log.append((sql, text))
+        self.rowcount = text.count("\r\n") - 1
+
+
+class FakeConnection:
+    def __init__(self):
+        self.log, self.committed = [], False
+
+    def cursor(self):
+        return FakeCursor(self.log)
+
+    def commit(self):
+        self.committed = True
+
+
+def test_copy_to_stage_replaces_the_table_and_commits():
+    conn = FakeConnection()
+    count = copy_to_stage(conn, "10_import_constellations.sql", "constellation_stage",
+                          [{"athyg_id": 5000000, "con": "Cyg"}], fieldnames=["athyg_id", "con"])
+    drop, create, (copy, text) = conn.log
+    assert drop == "DROP TABLE IF EXISTS public.constellation_stage"
+    assert create.startswith("CREATE UNLOGGED TABLE public.constellation_stage (athyg_id INTEGER,")
+    assert copy.startswith("COPY public.constellation_stage FROM STDIN WITH (FORMAT csv, HEADER true")
+    assert text == "athyg_id,con\r\n5000000,Cyg\r\n"
+    assert count == 1 and conn.committed
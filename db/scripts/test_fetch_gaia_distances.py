@@ -0,0 +1,114 @@
+"""
+Tests for fetch_gaia_distances' chunked TAP fetching.
+
+Run: python -m pytest test_fetch_gaia_distances.py -v
+
+The TAP service is a stub HTTP server on localhost that answers the script's ADQL with a
+distance derived from each source id, so results, caching and resumption can be checked
+without the network.
+"""
+import re
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fetch_gaia_distances
+from fetch_gaia_distances import CHUNK, chunk_query, fetch_distances
+
+
+def rgeo(source_id):
+    return 10.0 + int(source_id) % 1000
+
+
+class StubTap(BaseHTTPRequestHandler):
+    """Answers doQuery with "Source,rgeo,rpgeo"; ids ending in 7 have no rpgeo, in 9 no entry."""
+
+    requests = []
+    failing = set()  # a query naming any of these ids gets a 500
+
+    def do_POST(self):
+        form = urllib.parse.parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        ids = re.search(r"IN \(([\d,]+)\)", form["QUERY"][0]).group(1).split(",")
+        type(self).requests.append(ids)
+        if self.failing.intersection(ids):
+            self.send_error(500)
+            return
+        lines = ["Source,rgeo,rpgeo"]
+        for sid in ids:
+            if not sid.endswith("9"):
+                lines.append(f"{sid},{rgeo(sid)},{'' if sid.endswith('7') else rgeo(sid) + 0.5}")
+        body = ("\n".join(lines) + "\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def tap():
+    StubTap.requests = []
+    StubTap.failing = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubTap)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/tap/sync"
+    server.shutdown()
+
+
+IDS = [str(4_000_000_000_000_000 + i) for i in range(1, 3 * CHUNK + 11)]
+
+
+def expected(ids):
+    return {
+        sid: (rgeo(sid), None if sid.endswith("7") else rgeo(sid) + 0.5)
+        for sid in ids
+        if not sid.endswith("9")
+    }
+
+
+class TestFetchDistances:
+    def test_every_chunk_fetched_concurrently(self, tap, tmp_path):
+        got = fetch_distances(IDS, tap_url=tap, jobs=3, cache_dir=str(tmp_path))
+        assert got == expected(IDS)
+        assert sorted(len(r) for r in StubTap.requests) == [10, CHUNK, CHUNK, CHUNK]
+
+    def test_a_second_run_is_served_from_the_cache(self, tap, tmp_path):
+        fetch_distances(IDS, tap_url=tap, jobs=2, cache_dir=str(tmp_path))
+        StubTap.requests = []
+        assert fetch_distances(IDS, tap_url=tap, jobs=2, cache_dir=str(tmp_path)) == expected(IDS)
+        assert StubTap.requests == []
+
+    def test_resumes_with_only_the_failed_chunks(self, tap, tmp_path):
+        StubTap.failing = {IDS[CHUNK + 5]}  # the second chunk
+        with pytest.raises(RuntimeError, match="1 of 4 chunks failed; rerun"):
+            fetch_distances(IDS, tap_url=tap, jobs=4, cache_dir=str(tmp_path))
+        assert len(list(tmp_path.iterdir())) == 3
+
+        StubTap.failing, StubTap.requests = set(), []
+        assert fetch_distances(IDS, tap_url=tap, jobs=4, cache_dir=str(tmp_path)) == expected(IDS)
+        assert StubTap.requests == [sorted(IDS[CHUNK : 2 * CHUNK], key=int)]
+
+    def test_without_a_cache_nothing_is_written(self, tap, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        assert fetch_distances(IDS[:5], tap_url=tap, jobs=1, cache_dir=None) == expected(IDS[:5])
+        assert list(tmp_path.iterdir()) == []
+
+    def test_no_ids(self, tap, tmp_path):
+        assert fetch_distances([], tap_url=tap, cache_dir=str(tmp_path)) == {}
+        assert StubTap.requests == []
+
+
+class TestChunkQuery:
+    def test_same_id_set_same_query(self):
+        """The cache key is the query, so it must not depend on the order ids arrive in."""
+        assert chunk_query(["30", "4", "200"]) == chunk_query(["200", "30", "4"])
+        assert '"Source" IN (4,30,200)' in chunk_query(["30", "4", "200"])
+
+    def test_names_the_catalogue(self):
+        assert f'FROM "{fetch_gaia_distances.CATALOGUE}"' in chunk_query(["1"])
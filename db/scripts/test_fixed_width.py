@@ -0,0 +1,103 @@
+"""
+Tests for the shared fixed-width reader.
+
+Run: python -m pytest test_fixed_width.py -v
+
+The column reader must give exactly what the per-line parsers give for the same bytes --
+the matchers' behaviour was pinned against parse_line()/parse_fixed_width_line() long
+before read_columns() existed.
+"""
+import math
+
+import numpy as np
+import pytest
+
+import match_cns5
+import match_gcns
+import test_match_cns5
+import test_match_gcns
+from fixed_width import INT_MISSING, Field, iter_records, parse_record, read_columns
+
+# The sample lines the per-line parser tests already use.
+CNS5_SAMPLE = test_match_cns5.TestParseLine.SAMPLE_LINE
+GCNS_SAMPLE = test_match_gcns.TestParseFixedWidthLine.SAMPLE_LINE
+
+FIELDS = [Field("id", 0, 4, int), Field("name", 5, 10, str), Field("x", 11, 18, float)]
+
+CNS5_LINES = [
+    CNS5_SAMPLE,
+    "5239 822.1  C    3 0       1964791549008457856 104887 318.69622421753587    "
+    "38.022506739978056     2016.0",
+    "   0 Sun         - 0",
+    "not a valid line at all",
+]
+
+
+def write(tmp_path, lines, encoding="ascii"):
+    path = tmp_path / "catalog.dat"
+    path.write_bytes("".join(line + "\n" for line in lines).encode(encoding))
+    return str(path)
+
+
+class TestAgreesWithPerLineParsers:
+    def test_cns5(self, tmp_path):
+        columns = read_columns(write(tmp_path, CNS5_LINES), match_cns5.FIELDS, encoding="latin-1")
+        for line, rec in zip(CNS5_LINES, iter_records(columns, match_cns5.FIELDS)):
+            # Exactly equal, floats included: both paths round the same decimal text.
+            assert rec == parse_record(line, match_cns5.FIELDS), line
+
+    def test_gcns(self, tmp_path):
+        lines = [GCNS_SAMPLE, " " * 30 + "180.0"]
+        columns = read_columns(write(tmp_path, lines), match_gcns.FIELDS)
+        for line, rec in zip(lines, iter_records(columns, match_gcns.FIELDS)):
+            assert rec == parse_record(line, match_gcns.FIELDS)
+
+
+class TestMissingValues:
+    def test_blank_dash_and_nan(self, tmp_path):
+        columns = read_columns(write(tmp_path, ["   7 -     nan", "   - abc    -1.5"]), FIELDS)
+        assert columns["id"].tolist() == [7, INT_MISSING]
+        assert columns["name"].tolist() == ["", "abc"]
+        assert math.isnan(columns["x"][0]) and columns["x"][1] == -1.5
+        assert list(iter_records(columns, FIELDS)) == [
+            {"id": 7, "name": None, "x": None},
+            {"id": None, "name": "abc", "x": -1.5},
+        ]
+
+    def test_an_unparseable_number_is_missing_without_spoiling_the_column(self, tmp_path):
+        columns = read_columns(write(tmp_path, ["   1 a      2.5", "   2 b      x.y"]), FIELDS)
+        assert columns["x"][0] == 2.5 and math.isnan(columns["x"][1])
+        assert parse_record("   2 b      x.y", FIELDS)["x"] is None
+
+
+class TestChunking:
+    def test_line_numbers_skip_blanks_across_chunks(self, tmp_path):
+        lines = [f"{i:4d} n{i:<3d} {i / 2:7.1f}" if i % 3 else "" for i in range(1, 11)]
+        columns = read_columns(write(tmp_path, lines), FIELDS, chunk_lines=4)
+        expected = [i for i in range(1, 11) if i % 3]
+        assert columns["line"].tolist() == expected
+        assert columns["id"].tolist() == expected
+        assert columns["x"].tolist() == [i / 2 for i in expected]
+
+    def test_empty_file(self, tmp_path):
+        columns = read_columns(write(tmp_path, []), FIELDS)
+        assert all(len(c) == 0 for c in columns.values())
+        assert columns["x"].dtype == np.float64
+
+
+class TestMatcherReaders:
+    def test_cns5_drops_the_sun_and_counts_garbage(self, tmp_path, capsys):
+        records, errors, n_lines = match_cns5.read_records(write(tmp_path, CNS5_LINES))
+        assert [r["cns5_id"] for r in records] == [5142, 5239]
+        assert (errors, n_lines) == (1, 4)
+        out = capsys.readouterr().out
+        assert "could not parse line 4" in out and "Sun record (line 3)" in out
+
+    @pytest.mark.parametrize("prob, kept", [("1.000", True), ("0.499", False), ("     ", True)])
+    def test_gcns_probability_cut(self, tmp_path, prob, kept):
+        line = GCNS_SAMPLE
+        line = line[:239] + prob + line[244:]
+        records, _, low_prob, _ = match_gcns.read_records(write(tmp_path, [line]))
+        assert len(records) == int(kept) and low_prob == int(not kept)
+        if kept:
+            assert records[0]["prob100"] == records[0]["probastr"]
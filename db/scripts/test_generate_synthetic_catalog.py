@@ -0,0 +1,173 @@
+"""
+Tests for the synthetic catalog generator.
+
+Run: python -m pytest test_generate_synthetic_catalog.py -v
+
+The generator is only useful if what it writes loads through 03_import_data.sql and looks
+like AT-HYG to the planner, so that is what is asserted: the column layout against the
+SQL itself, and each distribution the module docstring promises against the real figure
+it was taken from. Tolerances are wide enough for a 40,000-row sample and narrow enough
+that a broken distribution fails.
+"""
+import csv
+import gzip
+import os
+import re
+
+import numpy as np
+import pytest
+
+from generate_synthetic_catalog import (
+    COLUMNS,
+    EQ_TO_GAL,
+    RESERVED_IDS,
+    catalog_ids,
+    parse_rows,
+    write_catalog,
+)
+
+SQL_DIR = os.path.join(os.path.dirname(__file__), "..", "sql")
+ROWS = 40_000
+
+
+def staging_columns():
+    with open(os.path.join(SQL_DIR, "03_import_data.sql")) as fh:
+        sql = fh.read()
+    body = re.search(r"CREATE TEMP TABLE athyg_stage \((.*?)\);", sql, re.DOTALL).group(1)
+    return [line.split()[0] for line in body.strip().splitlines()]
+
+
+def read(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="") as fh:
+        return list(csv.reader(fh))
+
+
+@pytest.fixture(scope="module")
+def catalog(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("synthetic") / "athyg.csv")
+    # A small chunk size so the sample crosses several chunks.
+    write_catalog(path, ROWS, seed=1, chunk_rows=15_000)
+    header, *rows = read(path)
+    return header, [dict(zip(header, row)) for row in rows]
+
+
+def share(rows, predicate):
+    return sum(1 for r in rows if predicate(r)) / len(rows)
+
+
+class TestLayout:
+    def test_header_is_the_staging_table(self, catalog):
+        header, _ = catalog
+        assert header == COLUMNS == staging_columns()
+
+    def test_row_count_and_unique_ids(self, catalog):
+        _, rows = catalog
+        ids = [int(r["id"]) for r in rows]
+        assert len(ids) == ROWS
+        assert len(set(ids)) == ROWS
+
+    def test_flam_is_an_integer_column(self, catalog):
+        # athyg_stage.flam is INT; one "3.0" would fail the whole COPY.
+        _, rows = catalog
+        assert all(r["flam"].isdigit() for r in rows if r["flam"])
+
+    def test_gzip_and_seed_reproduce_the_same_file(self, tmp_path):
+        plain, packed = str(tmp_path / "a.csv"), str(tmp_path / "a.csv.gz")
+        write_catalog(plain, 500, seed=5)
+        write_catalog(packed, 500, seed=5)
+        assert read(plain) == read(packed)
+        write_catalog(plain, 500, seed=6)
+        assert read(plain) != read(packed)
+
+
+class TestIds:
+    def test_reserved_block_is_skipped(self):
+        low, high = RESERVED_IDS
+        ids = catalog_ids(low - 2, 4)
+        assert ids.tolist() == [low - 1, low + (high - low), high + 1, high + 2]
+
+    @pytest.mark.parametrize(
+        "text,rows", [("3000000", 3_000_000), ("3_000_000", 3_000_000), ("3M", 3_000_000),
+                      ("500k", 500_000), ("1.5m", 1_500_000)],
+    )
+    def test_parse_rows(self, text, rows):
+        assert parse_rows(text) == rows
+
+
+class TestDistributions:
+    @pytest.mark.parametrize("half_width,expected", [(50, 0.0280), (100, 0.1272), (500, 0.5525), (1000, 0.8157)])
+    def test_box_selectivity_matches_the_measured_catalog(self, catalog, half_width, expected):
+        # Through 03_import_data.sql's own equatorial -> galactic conversion.
+        _, rows = catalog
+        eq = np.array([[float(r[c]) for c in ("x_eq", "y_eq", "z_eq")] for r in rows if r["x_eq"]])
+        gal = eq @ EQ_TO_GAL.T
+        inside = (np.abs(gal) <= half_width).all(axis=1).sum() / len(rows)
+        assert inside == pytest.approx(expected, rel=0.1)
+
+    def test_ra_dec_agree_with_the_equatorial_position(self, catalog):
+        # Rows without x_eq get them recomputed from ra/dec/dist by the import.
+        _, rows = catalog
+        for r in rows[:500]:
+            if not r["x_eq"]:
+                continue
+            ra, dec, dist = np.radians(float(r["ra"]) * 15), np.radians(float(r["dec"])), float(r["dist"])
+            assert dist * np.cos(dec) * np.cos(ra) == pytest.approx(float(r["x_eq"]), abs=0.01)
+            assert dist * np.sin(dec) == pytest.approx(float(r["z_eq"]), abs=0.01)
+
+    def test_about_one_percent_have_no_distance(self, catalog):
+        _, rows = catalog
+        assert share(rows, lambda r: not r["dist"]) == pytest.approx(0.0089, abs=0.003)
+        assert all(r["ra"] and r["dec"] for r in rows)
+
+    def test_sentinel_rows_look_like_the_real_ones(self, tmp_path):
+        # 143 in 2.8M is too rare for the shared sample; 03_import_data.sql matches
+        # `dist = 100000` on a REAL column, so 100000.0 matches too.
+        path = str(tmp_path / "big.csv")
+        write_catalog(path, 200_000, seed=2)
+        header, *rows = read(path)
+        sentinel = [dict(zip(header, r)) for r in rows if r[header.index("dist")] in ("100000", "100000.0")]
+        assert sentinel
+        assert all(r["dist_src"] == "H" and not r["x_eq"] and r["absmag"] for r in sentinel)
+
+    def test_absmag_is_heavily_tied(self, catalog):
+        _, rows = catalog
+        values = [r["absmag"] for r in rows if r["absmag"]]
+        assert len(set(values)) < len(values) / 10
+        assert min(float(v) for v in values) >= -10
+
+    def test_catalog_id_coverage(self, catalog):
+        _, rows = catalog
+        assert share(rows, lambda r: r["hip"]) == pytest.approx(0.042, abs=0.003)
+        assert share(rows, lambda r: r["hd"]) == pytest.approx(0.126, abs=0.005)
+        assert share(rows, lambda r: r["gaia"]) == pytest.approx(0.90, abs=0.01)
+        assert share(rows, lambda r: r["tyc"]) == pytest.approx(0.90, abs=0.01)
+
+    @pytest.mark.parametrize("name", ["tyc", "gaia", "hyg", "hip", "hd", "hr", "gl"])
+    def test_each_catalog_number_names_one_star(self, catalog, name):
+        # Across chunks too: the fixture's sample spans three.
+        _, rows = catalog
+        values = [r[name] for r in rows if r[name]]
+        if name == "gl":
+            values = [v.split()[1] for v in values]
+        assert values and len(set(values)) == len(values)
+
+    def test_hipparcos_stars_are_the_bright_ones(self, catalog):
+        _, rows = catalog
+        hip = [float(r["mag"]) for r in rows if r["hip"]]
+        rest = [float(r["mag"]) for r in rows if not r["hip"]]
+        # Ranked per chunk, so the cut is not one global magnitude -- but it is close.
+        assert np.percentile(hip, 99) < np.percentile(rest, 1) + 0.5
+
+    def test_gliese_stars_are_the_near_ones_with_the_prefix_to_strip(self, catalog):
+        _, rows = catalog
+        gl = [r for r in rows if r["gl"]]
+        assert gl
+        assert all(re.match(r"^(Gl|GJ) \d+$", r["gl"]) for r in gl)
+        assert max(float(r["dist"]) for r in gl) < 20
+
+    def test_names_are_sparse(self, catalog):
+        _, rows = catalog
+        assert 0 < share(rows, lambda r: r["proper"]) < 0.001
+        assert 0 < share(rows, lambda r: r["bayer"]) < 0.002
+        assert 0 < share(rows, lambda r: r["flam"]) < 0.003
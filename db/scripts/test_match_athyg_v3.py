@@ -1,17 +1,24 @@
 """Tests for match_athyg_v3.py — the AT-HYG v3.3 -> v4.0 id mapping."""
 
 import csv
+import gc
 import gzip
 import io
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
 from match_athyg_v3 import (
+    MATCH_CASCADE,
     V3_COLUMNS,
+    IdentifierIndex,
     assert_no_duplicate_v3_ids,
     build_index,
     from_ranges,
+    map_ahead,
+    match_parallel,
     match_rows,
+    read_v3_blocks,
     norm,
     read_v3_rows,
     to_ranges,
@@ -114,6 +121,31 @@ class TestBuildIndex:
         assert idx == {"5": 12}
 
 
+class TestIdentifierIndex:
+    """What load_current_stars() builds from the cursor, one star at a time."""
+
+    ROWS = [
+        {"id": 10, "gaia": "999", "hip": "5", "mag": 8.4},
+        {"id": 11, "gaia": "999", "tyc": "6995-1264-1", "mag": 5.1},
+        {"id": 12, "hip": "5.0", "hd": "439", "mag": None},
+        {"id": 13, "gj": "551", "hd": " 439 ", "mag": "not a number"},
+    ]
+
+    def test_all_identifiers_at_once_agree_with_build_index(self):
+        stars = IdentifierIndex(MATCH_CASCADE)
+        for row in self.ROWS:
+            stars.add(row["id"], row.get("mag"), {f: row.get(f) for f in MATCH_CASCADE})
+        assert len(stars) == 4
+        for field in MATCH_CASCADE:
+            assert stars.index(field) == build_index(self.ROWS, field), field
+
+    def test_identifiers_are_normalised_before_they_collide(self):
+        idx, ambiguous = build_index(self.ROWS, "hip")
+        assert idx == {"5": 10} and ambiguous == 1
+        # Neither has a usable magnitude, so the lower id wins.
+        assert build_index(self.ROWS, "hd")[0] == {"439": 12}
+
+
 class TestReadV3Rows:
     def test_reads_header_file_and_headerless_file(self, tmp_path):
         """Part 2 of the v3.3 release has NO header — its first line is data.
@@ -197,6 +229,69 @@ class TestMatchRows:
         assert rows == [(7301, 7323, "gaia")]
 
 
+class TestMatchParallel:
+    """The process pool must change nothing but the wall-clock time."""
+
+    def files(self, tmp_path):
+        one = tmp_path / "athyg_v33-1.csv.gz"
+        with gzip.open(one, "wt", newline="") as fh:
+            fh.write(",".join(V3_COLUMNS) + "\n")
+            for i in range(1, 40):
+                fh.write(v3_line(id=i, gaia=1000 + i if i % 4 else "", tyc=f"{i}-1-1",
+                                 proper='Name, with "quotes"\nand a newline' if i == 7 else ""))
+        two = tmp_path / "athyg_v33-2.csv"
+        two.write_text("".join(v3_line(id=i, hip=i) for i in range(40, 60)))  # no header
+        return [str(one), str(two)]
+
+    def indexes(self):
+        return {
+            "gaia": {str(1000 + i): i + 5 for i in range(1, 40)},
+            "tyc": {f"{i}-1-1": i for i in range(1, 40)},
+            "hip": {str(i): i * 2 for i in range(40, 55)},
+        }
+
+    def test_same_rows_and_stats_in_the_same_order(self, tmp_path):
+        paths = self.files(tmp_path)
+        expected = match_rows(read_v3_rows(paths), self.indexes())
+        assert match_parallel(paths, self.indexes(), jobs=3, block_lines=5) == expected
+        assert expected[1]["v3_rows"] == 59 and expected[1]["unmatched"] == 5
+
+    def test_collector_is_unfrozen_afterwards(self, tmp_path):
+        # gc.freeze() is for the forked workers; the caller gets its collector back.
+        match_parallel(self.files(tmp_path), self.indexes(), jobs=2, block_lines=5)
+        assert gc.get_freeze_count() == 0
+
+    def test_blocks_never_split_a_quoted_newline(self, tmp_path):
+        paths = self.files(tmp_path)
+        record = v3_line(id=7, gaia=1007, tyc="7-1-1", proper='Name, with "quotes"\nand a newline')
+        for size in (1, 2, 3, 7):
+            blocks = ["".join(block) for block in read_v3_blocks(paths, size)]
+            assert sum(record in block for block in blocks) == 1, size
+
+
+class TestMapAhead:
+    def test_in_order_and_complete(self):
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            assert list(map_ahead(pool, lambda n: n * n, range(50), ahead=4)) == [n * n for n in range(50)]
+
+    def test_items_are_consumed_lazily(self):
+        """Executor.map would drain all 1,000 items before the first result came back."""
+        taken = []
+
+        def items():
+            for n in range(1000):
+                taken.append(n)
+                yield n
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = map_ahead(pool, lambda n: n, items(), ahead=4)
+            assert next(results) == 0
+            assert len(taken) == 4
+            assert next(results) == 1
+            assert len(taken) == 5
+            results.close()
+
+
 class TestAssertNoDuplicateV3Ids:
     def test_accepts_distinct(self):
         assert_no_duplicate_v3_ids([(1, 10, "gaia"), (2, 11, "gaia")])
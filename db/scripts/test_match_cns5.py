@@ -6,17 +6,14 @@ Run: python -m pytest test_match_cns5.py -v
 
 import math
 import pytest
+from astrometry import compute_equatorial_coords, estimate_spectral_type, estimate_vmag, propagate_to_j2000
 from match_cns5 import (
     parse_line,
-    propagate_to_j2000,
-    estimate_vmag,
-    estimate_spectral_type,
     extract_gj_component,
-    compute_equatorial_coords,
-    safe_float,
-    safe_int,
-    safe_str,
+    match_by_identifier,
+    position_radius,
 )
+from fixed_width import safe_float, safe_int, safe_str
 
 
 # ---------------------------------------------------------------------------
@@ -526,3 +523,44 @@ class TestNewIdAllocation:
         ids = self.allocate(5_000_000, 50, {5000005: "x", 5000010: "y"}, {5000007})
         assert len(ids) == len(set(ids))
         assert 5000005 not in ids and 5000010 not in ids and 5000007 not in ids
+
+
+# ---------------------------------------------------------------------------
+# Identifier cascade and positional radius
+# ---------------------------------------------------------------------------
+
+class TestMatchByIdentifier:
+    GJ = {"551": 1, "150.1B": 2}
+    GAIA = {"4472832130942575872": 3}
+    HIP = {"70890": 4}
+
+    @staticmethod
+    def rec(gj=None, comp=None, gaia=None, hip=None):
+        return {"gj": gj, "comp": comp, "gaia": gaia, "hip": hip}
+
+    def match(self, **fields):
+        return match_by_identifier(self.rec(**fields), self.GJ, self.GAIA, self.HIP)
+
+    def test_gj_first(self):
+        assert self.match(gj="551", gaia="4472832130942575872") == (1, "gj_id")
+
+    def test_gj_with_component(self):
+        assert self.match(gj="150.1", comp="B") == (2, "gj_id")
+
+    def test_falls_through_to_gaia_then_hip(self):
+        assert self.match(gj="999", gaia="4472832130942575872", hip="70890") == (3, "gaia_source_id")
+        assert self.match(gj="999", gaia="1", hip="70890") == (4, "hip_id")
+
+    def test_no_identifier_leaves_it_to_position(self):
+        assert self.match(gj="999", gaia="1", hip="2") == (None, None)
+
+
+class TestPositionRadius:
+    def test_ordinary_star(self):
+        assert position_radius({"pmra": 100.0, "pmdec": 100.0}) == 2.0
+
+    def test_high_proper_motion_star_gets_the_wider_radius(self):
+        assert position_radius({"pmra": 400.0, "pmdec": 400.0}) == 5.0
+
+    def test_missing_proper_motion(self):
+        assert position_radius({"pmra": None, "pmdec": 3.0}) == 2.0
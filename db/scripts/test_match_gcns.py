@@ -6,17 +6,48 @@ Run: python -m pytest test_match_gcns.py -v
 
 import math
 import pytest
+from astrometry import compute_equatorial_coords, estimate_spectral_type, estimate_vmag, propagate_to_j2000
 from match_gcns import (
     parse_fixed_width_line,
-    propagate_to_j2000,
-    estimate_vmag,
-    estimate_spectral_type,
-    compute_equatorial_coords,
-    safe_float,
-    safe_str,
     build_output_row,
+    position_query,
     GCNS_EPOCH,
+    POS_RADIUS_ARCSEC,
+    POS_RADIUS_HIGH_PM_ARCSEC,
 )
+from fixed_width import safe_float, safe_str
+
+
+# ---------------------------------------------------------------------------
+# position_query
+# ---------------------------------------------------------------------------
+
+class TestPositionQuery:
+    @staticmethod
+    def rec(pmra=None, pmdec=None, g_mag=9.0, bp_mag=None, rp_mag=None):
+        return {"ra_deg": 100.0, "dec_deg": 20.0, "pmra": pmra, "pmdec": pmdec,
+                "g_mag": g_mag, "bp_mag": bp_mag, "rp_mag": rp_mag}
+
+    def test_propagates_to_j2000_with_proper_motion(self):
+        ra, dec, radius, _, has_pm = position_query(self.rec(pmra=0.0, pmdec=1000.0))
+        assert has_pm
+        assert ra == pytest.approx(100.0)
+        assert dec == pytest.approx(20.0 - 16 * 1000 / 3.6e6)
+        assert radius == POS_RADIUS_HIGH_PM_ARCSEC
+
+    def test_slow_star_gets_the_tight_radius(self):
+        assert position_query(self.rec(pmra=10.0, pmdec=10.0))[2] == POS_RADIUS_ARCSEC
+
+    def test_no_proper_motion_stays_at_j2016_with_the_wide_radius(self):
+        ra, dec, radius, _, has_pm = position_query(self.rec())
+        assert not has_pm
+        assert (ra, dec) == (100.0, 20.0)
+        assert radius == POS_RADIUS_HIGH_PM_ARCSEC
+
+    def test_compares_v_when_it_can_be_estimated_else_g(self):
+        assert position_query(self.rec())[3] == 9.0
+        with_colour = position_query(self.rec(bp_mag=9.5, rp_mag=8.5))[3]
+        assert with_colour == estimate_vmag(9.0, 9.5, 8.5)
 
 
 # ---------------------------------------------------------------------------
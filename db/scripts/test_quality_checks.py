@@ -0,0 +1,133 @@
+"""
+Tests for the shared single-pass check runner.
+
+Run: python -m pytest test_quality_checks.py -v
+
+The checks run against Postgres, which is not available to the tests. SQLite understands
+`count(*) FILTER (WHERE ...)` and every function the distance checks use, so the query
+count_query() builds is executed for real against a small athyg table here: each check's
+condition must still pick out exactly the row planted to fail it.
+"""
+import re
+import sqlite3
+
+import pytest
+
+from check_distance_quality import CHECKS, SENTINEL_DIST
+from check_duplicates import DUPLICATE_CONDITIONS
+from quality_checks import ATHYG_WITH_GAIA_GROUPS, count_query, report
+
+ATHYG_COLUMNS = "id, dist, dist_src, cns5, absmag, gaia, x, y, z, x_eq, y_eq, z_eq"
+
+ROWS = [
+    # a healthy star: 3-4-12 triangle, so |xyz| = 13
+    (1, 13.0, None, None, 1.0, 11, 3.0, 4.0, 12.0, 3.0, 4.0, 12.0),
+    # the unknown-distance sentinel
+    (2, SENTINEL_DIST, None, None, 1.0, None, None, None, None, None, None, None),
+    # CNS5 star placed at 80 pc by AT-HYG
+    (3, 80.0, "H", 5142, 1.0, None, None, None, None, None, None, None),
+    # CNS5 star at 80 pc, but the distance is the supplement's own: not a contradiction
+    (4, 80.0, "CNS5", 5143, 1.0, None, None, None, None, None, None, None),
+    # position with no distance
+    (5, None, None, None, None, None, 1.0, 1.0, 1.0, None, None, None),
+    # galactic triple stale, equatorial fine
+    (6, 13.0, None, None, 1.0, None, 30.0, 40.0, 120.0, 3.0, 4.0, 12.0),
+    # equatorial triple stale, galactic fine
+    (7, 13.0, None, None, 1.0, None, 3.0, 4.0, 12.0, 30.0, 40.0, 120.0),
+    # implausibly luminous, with and without a Gaia id
+    (8, 13.0, None, None, -12.0, 88, None, None, None, None, None, None),
+    (9, 13.0, None, None, -11.0, None, None, None, None, None, None, None),
+]
+
+
+@pytest.fixture
+def db():
+    conn = sqlite3.connect(":memory:")
+    conn.create_function("least", 2, min)
+    # ra and dec are left NULL: only the duplicate checks read them.
+    conn.execute(f"CREATE TABLE athyg ({ATHYG_COLUMNS}, ra, dec)")
+    conn.executemany(
+        f"INSERT INTO athyg ({ATHYG_COLUMNS}) VALUES ({', '.join('?' * len(ROWS[0]))})", ROWS
+    )
+    yield conn
+    conn.close()
+
+
+class TestCountQuery:
+    def test_one_select_one_aggregate_per_condition(self):
+        sql = count_query(["a > 1", "b IS NULL"])
+        assert sql.count("SELECT") == 1
+        assert sql.count("count(*) FILTER (WHERE") == 2
+        assert sql.rstrip().endswith("FROM   athyg")
+
+    def test_other_sources(self):
+        assert count_query(["created"], source="(SELECT 1) g").endswith("FROM   (SELECT 1) g")
+
+    def test_counts_come_back_in_condition_order(self, db):
+        sql = count_query(["id > 7", "id > 0", "id < 0"])
+        assert db.execute(sql).fetchone() == (2, 9, 0)
+
+    def test_extra_aggregates_follow_the_counts(self, db):
+        sql = count_query(["id > 7"], extra=["max(id)", "min(dist)"])
+        assert sql.count("SELECT") == 1
+        assert db.execute(sql).fetchone() == (2, 9, 13.0)
+
+
+class TestDistanceChecksInOnePass:
+    def test_each_check_finds_exactly_its_planted_row(self, db):
+        conditions = [condition for _label, condition, _hint in CHECKS]
+        counts = db.execute(count_query(conditions)).fetchone()
+        assert dict(zip((label for label, _, _ in CHECKS), counts)) == {
+            "unknown-distance sentinel treated as a measurement": 1,
+            "CNS5 stars placed beyond its 25 pc sphere by AT-HYG": 1,
+            "positions inconsistent with a null distance": 1,
+            "galactic positions whose length disagrees with dist": 1,
+            "equatorial positions whose length disagrees with dist": 1,
+        }
+
+    def test_duplicate_checks_ride_in_the_same_pass(self, db):
+        """
+        check_distance_quality.py's one SELECT: the duplicate conditions added to the
+        distance ones, over athyg with its Gaia groups attached. The distance counts must
+        come out exactly as they do over the bare table.
+        """
+        conditions = [condition for _label, condition, _hint in CHECKS]
+        alone = db.execute(count_query(conditions)).fetchone()
+        db.execute("INSERT INTO athyg (id, gaia) VALUES (10, 11), (5000001, 88)")
+        sql = count_query(conditions + DUPLICATE_CONDITIONS, source=ATHYG_WITH_GAIA_GROUPS)
+        # One read of the table: the window subquery's, which the counts aggregate over.
+        assert len(re.findall(r"FROM\s+athyg\b", sql)) == 1
+        counts = db.execute(sql).fetchone()
+        assert counts[: len(conditions)] == alone
+        # gaia 11 is now two AT-HYG rows and gaia 88 has gained a supplement row; with no
+        # ra/dec in the fixture, neither can be measured apart.
+        assert counts[len(conditions):] == (1, 1, 0)
+
+    def test_residue_counts(self, db):
+        # The same two aggregates main() adds, in SQLite's parameter style.
+        sql = count_query(["absmag < :floor", "absmag < :floor AND gaia IS NOT NULL"])
+        assert db.execute(sql, {"floor": -10.0}).fetchone() == (2, 1)
+
+
+class TestReport:
+    def test_zero_is_ok(self, capsys):
+        assert report("things", 0, "fix it") == 0
+        assert capsys.readouterr().out == "ok         0  things\n"
+
+    def test_quiet_hides_ok(self, capsys):
+        assert report("things", 0, "fix it", quiet=True) == 0
+        assert capsys.readouterr().out == ""
+
+    def test_any_count_fails_without_a_baseline(self, capsys):
+        assert report("things", 3, "fix it", quiet=True) == 3
+        out = capsys.readouterr().out
+        assert "FAIL       3  things" in out and "-> fix it" in out
+
+    def test_within_the_baseline_is_a_known_residue(self, capsys):
+        assert report("things", 5, "fix it", baseline=5, known="they are fine") == 0
+        out = capsys.readouterr().out
+        assert "ok       5  things (baseline 5)" in out and "-> they are fine" in out
+
+    def test_only_growth_past_the_baseline_counts(self, capsys):
+        assert report("things", 7, "fix it", baseline=5) == 2
+        assert "(baseline 5, so 2 new)" in capsys.readouterr().out
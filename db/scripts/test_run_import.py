@@ -0,0 +1,249 @@
+"""
+Tests for the import orchestrator.
+
+Run: python -m pytest test_run_import.py -v
+
+No database is needed: the graph is checked against db/sql itself, and the scheduler is
+driven with a fake execute. What matters most is that a SQL file added to db/sql cannot
+be silently left out of the import -- the image no longer picks files up by name.
+"""
+import os
+import threading
+import time
+
+import pytest
+
+from run_import import (
+    DATA_FILE,
+    INDEX_FILE,
+    STAGES,
+    Stage,
+    check_graph,
+    file_hash,
+    index_stages,
+    pipeline,
+    plan_incremental,
+    rows_affected,
+    run_pipeline,
+    split_statements,
+    stage_hash,
+    stage_sql,
+)
+
+SQL_DIR = os.path.join(os.path.dirname(__file__), "..", "sql")
+
+
+def read_sql(name):
+    with open(os.path.join(SQL_DIR, name)) as fh:
+        return fh.read()
+
+
+class TestGraph:
+    def test_every_sql_file_is_a_stage_exactly_once(self):
+        files = sorted(f[:-4] for f in os.listdir(SQL_DIR) if f.endswith(".sql"))
+        staged = sorted([s.name for s in STAGES] + [INDEX_FILE[:-4]])
+        assert staged == files
+
+    def test_pipeline_is_acyclic_and_complete(self):
+        stages = pipeline(SQL_DIR)
+        check_graph(stages)
+        assert stages[-1].name == "analyze"
+        assert set(stages[-1].after) == {s.name for s in stages[:-1]}
+
+    def test_athyg_writers_form_one_chain(self):
+        # Everything after the base import that writes athyg must be strictly ordered.
+        by_name = {s.name: s for s in STAGES}
+        chain = ["06_import_cns5", "07_import_gcns", "08_import_gaia_distances",
+                 "09_import_overrides", "10_import_constellations"]
+        for earlier, later in zip(chain, chain[1:]):
+            assert by_name[later].after == (earlier,)
+        assert {s.name for s in STAGES if "athyg" in s.writes} == {
+            "01_create_table", "03_import_data", *chain}
+
+    def test_indexes_wait_for_the_last_writer(self):
+        setup = index_stages(read_sql(INDEX_FILE))[0]
+        assert setup.after == ("10_import_constellations",)
+
+    @pytest.mark.parametrize("stages, message", [
+        ([Stage("a", after=("b",))], "unknown"),
+        ([Stage("a", after=("b",)), Stage("b", after=("a",))], "cycle"),
+        ([Stage("a"), Stage("a")], "duplicate"),
+    ])
+    def test_bad_graphs_are_refused(self, stages, message):
+        with pytest.raises(ValueError, match=message):
+            check_graph(stages)
+
+
+class TestIndexFile:
+    def test_every_create_index_becomes_its_own_stage(self):
+        sql = read_sql(INDEX_FILE)
+        stages = index_stages(sql)
+        built = [s for s in stages if s.name.startswith("02_idx_")]
+        assert len(built) == sql.count("CREATE INDEX")
+        for stage in built:
+            assert stage.after == ("02_setup",)
+            assert stage.writes == (stage.name[3:],)
+            assert "maintenance_work_mem" in stage.options
+            assert stage.sql.startswith(f"DROP INDEX IF EXISTS {stage.name[3:]};")
+
+    def test_extension_is_created_before_any_index(self):
+        setup = index_stages(read_sql(INDEX_FILE))[0]
+        assert setup.sql == "CREATE EXTENSION IF NOT EXISTS pg_trgm;"
+
+    def test_comments_and_multiline_statements_survive_splitting(self):
+        sql = "-- a; comment\nCREATE INDEX i\n  ON t (a); -- trailing\nCREATE INDEX j ON t (b);\n"
+        assert split_statements(sql) == ["CREATE INDEX i\n  ON t (a)", "CREATE INDEX j ON t (b)"]
+
+
+class TestRowsAffected:
+    def test_command_tags_are_summed(self):
+        output = "DROP TABLE\nCREATE TABLE\nCOPY 2839957\nINSERT 0 12\nUPDATE 3\nDELETE 1\nANALYZE\n"
+        assert rows_affected(output) == 2839957 + 12 + 3 + 1
+
+    def test_query_output_is_not_mistaken_for_a_tag(self):
+        assert rows_affected(" count \n-------\n  42\n(1 row)\n\nSELECT 1\n") == 0
+
+
+class TestScheduler:
+    def test_dependencies_are_respected_and_independent_stages_overlap(self):
+        stages = [
+            Stage("a"), Stage("b"),
+            Stage("c", after=("a",)), Stage("d", after=("a", "b")),
+            Stage("e", after=("c", "d")),
+        ]
+        finished, lock = {}, threading.Lock()
+        running, peak = [0], [0]
+
+        def execute(stage):
+            with lock:
+                for dep in stage.after:
+                    assert dep in finished, f"{stage.name} started before {dep}"
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+                finished[stage.name] = True
+            return {"seconds": 0.02, "rows": 0, "sizes": {}}
+
+        results = run_pipeline(stages, execute, jobs=3, log=lambda _: None)
+        assert set(results) == {"a", "b", "c", "d", "e"}
+        assert peak[0] >= 2
+        assert list(results)[-1] == "e"
+
+    def test_jobs_bounds_concurrency(self):
+        stages = [Stage(str(i)) for i in range(8)]
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def execute(stage):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return {"seconds": 0.01, "rows": 0, "sizes": {}}
+
+        run_pipeline(stages, execute, jobs=2, log=lambda _: None)
+        assert peak[0] == 2
+
+    def test_failure_stops_dependents_and_is_raised(self):
+        stages = [Stage("a"), Stage("b", after=("a",))]
+        started = []
+
+        def execute(stage):
+            started.append(stage.name)
+            raise RuntimeError("psql exited 3")
+
+        with pytest.raises(RuntimeError, match="psql exited 3"):
+            run_pipeline(stages, execute, jobs=2, log=lambda _: None)
+        assert started == ["a"]
+
+
+class TestIncremental:
+    """What --incremental re-runs. The stage graph is the real one; only the hashes are made up."""
+
+    def setup_method(self):
+        self.stages = pipeline(SQL_DIR)
+        self.hashes = {s.name: "h" for s in self.stages}
+
+    def plan(self, changed=(), recorded=None):
+        recorded = dict(self.hashes) if recorded is None else recorded
+        for name in changed:
+            recorded[name] = "old"
+        stages, reasons = plan_incremental(self.stages, self.hashes, recorded)
+        return {s.name: s for s in stages}, reasons
+
+    def test_nothing_changed_runs_nothing(self):
+        assert self.plan() == ({}, {})
+
+    def test_an_empty_manifest_runs_everything(self):
+        stages, _ = self.plan(recorded={})
+        assert set(stages) == set(self.hashes)
+        assert stages["07_import_gcns"].after == ("06_import_cns5",)
+
+    def test_an_override_edit_reruns_only_overrides_and_analyze(self):
+        stages, reasons = self.plan(changed=["09_import_overrides"])
+        assert set(stages) == {"09_import_overrides", "analyze"}
+        assert stages["09_import_overrides"].after == ()
+        assert stages["analyze"].after == ("09_import_overrides",)
+        assert reasons["09_import_overrides"] == "inputs changed"
+
+    def test_a_supplement_edit_rebuilds_athyg_and_everything_on_it(self):
+        stages, reasons = self.plan(changed=["03_import_data"])
+        assert reasons["01_create_table"] == "03_import_data cannot be re-applied in place"
+        assert "05_import_signals" not in stages
+        assert {"04_import_fic", "11_import_athyg_v3_ids", "10_import_constellations",
+                "02_idx_athyg_absmag_bbox"} <= set(stages)
+        assert stages["03_import_data"].after == ("01_create_table",)
+
+    def test_gap_filling_stages_restart_from_the_table(self):
+        for name in ("06_import_cns5", "07_import_gcns", "08_import_gaia_distances",
+                     "10_import_constellations"):
+            stages, _ = self.plan(changed=[name])
+            assert "01_create_table" in stages, name
+
+    def test_signals_rerun_alone(self):
+        stages, _ = self.plan(changed=["05_import_signals"])
+        assert set(stages) == {"05_import_signals", "analyze"}
+
+    def test_a_changed_index_is_rebuilt_alone(self):
+        stages, _ = self.plan(changed=["02_idx_athyg_hip"])
+        assert set(stages) == {"02_idx_athyg_hip", "analyze"}
+
+    def test_ordering_is_kept_through_skipped_stages(self):
+        # 02_setup is not running, but the index must still wait for the athyg writer.
+        stages, _ = self.plan(changed=["09_import_overrides", "02_idx_athyg_hip"])
+        assert stages["02_idx_athyg_hip"].after == ("09_import_overrides",)
+
+    def test_an_index_removed_from_the_file_is_dropped(self):
+        recorded = dict(self.hashes, **{"02_idx_athyg_retired": "h"})
+        stages, reasons = plan_incremental(self.stages, self.hashes, recorded)
+        assert [s.sql for s in stages] == ["DROP INDEX IF EXISTS idx_athyg_retired;"]
+        assert "no longer" in reasons["drop_idx_athyg_retired"]
+
+
+class TestStageHash:
+    def test_hash_covers_the_data_files_the_sql_reads(self, tmp_path):
+        data = tmp_path / "overrides.csv"
+        data.write_text("gaia,dist\n1,2\n")
+        stage = Stage("x", sql="\\COPY t FROM '/data/overrides.csv' WITH (FORMAT csv);")
+        before = stage_hash(stage, SQL_DIR, str(tmp_path))
+        assert stage_hash(stage, SQL_DIR, str(tmp_path)) == before
+
+        file_hash.cache_clear()  # hashes are cached per path for the length of one run
+        data.write_text("gaia,dist\n1,3\n")
+        assert stage_hash(stage, SQL_DIR, str(tmp_path)) != before
+
+    def test_a_missing_data_file_is_an_error(self, tmp_path):
+        stage = Stage("x", sql="COPY t FROM '/data/absent.csv';")
+        with pytest.raises(FileNotFoundError, match="absent.csv"):
+            stage_hash(stage, SQL_DIR, str(tmp_path))
+
+    def test_every_data_file_a_stage_reads_is_in_the_image(self):
+        # A file the image lacks would fail the hash before the import, not just the import.
+        with open(os.path.join(SQL_DIR, "..", "Dockerfile")) as fh:
+            dockerfile = fh.read()
+        for stage in pipeline(SQL_DIR):
+            for name in DATA_FILE.findall(stage_sql(stage, SQL_DIR)):
+                assert f"/data/{name}" in dockerfile or f"data/{name} /data/" in dockerfile, name
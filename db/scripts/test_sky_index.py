@@ -0,0 +1,108 @@
+"""
+Unit tests for sky_index.py.
+
+Run: python -m pytest test_sky_index.py -v
+
+The batched answer is checked against a brute-force scan of every candidate, and the
+places a hand-rolled positional match goes wrong get a test each: RA 0h/24h, the poles,
+ties, and positions that are missing.
+"""
+
+import numpy as np
+import pytest
+
+import sky_index
+from sky_index import SkyIndex, arcsec_for_chord, unit_vectors
+
+
+def brute_force(ids, ra, dec, q_ra, q_dec, radius):
+    xyz = unit_vectors(ra, dec)
+    best_ids, best_sep = [], []
+    for qx, r in zip(unit_vectors(q_ra, q_dec), np.broadcast_to(radius, len(q_ra))):
+        sep = arcsec_for_chord(np.sqrt(((xyz - qx) ** 2).sum(axis=1)))
+        inside = np.flatnonzero(sep <= r)
+        if not len(inside):
+            best_ids.append(-1)
+            best_sep.append(np.nan)
+            continue
+        i = inside[np.lexsort((ids[inside], sep[inside]))[0]]
+        best_ids.append(ids[i])
+        best_sep.append(sep[i])
+    return np.array(best_ids), np.array(best_sep)
+
+
+class TestNearest:
+    def test_agrees_with_brute_force(self, monkeypatch):
+        # A small MAX_PAIRS forces the batch through several steps.
+        monkeypatch.setattr(sky_index, "MAX_PAIRS", 500)
+        rng = np.random.default_rng(4)
+        n = 4000
+        ids = np.arange(1, n + 1)
+        ra = rng.uniform(0, 24, n)
+        dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+        # Queries near existing stars, plus some far from anything.
+        pick = rng.integers(0, n, 300)
+        q_ra = (ra[pick] + rng.normal(0, 3e-3, 300)) % 24
+        q_dec = np.clip(dec[pick] + rng.normal(0, 3e-2, 300), -90, 90)
+        radius = rng.choice([2.0, 5.0, 300.0], 300)
+
+        got = SkyIndex(ids, ra, dec).nearest(q_ra, q_dec, radius)
+        want = brute_force(ids, ra, dec, q_ra, q_dec, radius)
+        np.testing.assert_array_equal(got[0], want[0])
+        np.testing.assert_allclose(got[1], want[1], rtol=1e-9)
+        assert (got[0] > 0).sum() > 50
+
+    def test_matches_across_ra_zero(self):
+        index = SkyIndex([7], [23.99995], [10.0])
+        ids, sep = index.nearest([0.00005], [10.0], 6.0)
+        assert ids[0] == 7
+        assert sep[0] == pytest.approx(0.0001 * 15 * 3600 * np.cos(np.radians(10.0)), rel=1e-6)
+
+    def test_matches_near_the_pole(self):
+        # 12 hours apart in RA, but 2" apart on the sky, straddling the pole.
+        index = SkyIndex([1, 2], [0.0, 6.0], [89.9997222, 89.99])
+        ids, sep = index.nearest([12.0], [89.9997222], 3.0)
+        assert ids[0] == 1
+        assert sep[0] == pytest.approx(2.0, abs=1e-3)
+
+    def test_nothing_in_range(self):
+        ids, sep = SkyIndex([1], [5.0], [0.0]).nearest([5.0], [0.01], 2.0)
+        assert ids[0] == -1 and np.isnan(sep[0])
+
+    def test_closest_wins_and_ties_go_to_the_lower_id(self):
+        index = SkyIndex([30, 20, 10], [1.0, 1.0, 1.0], [0.0005, -0.0005, 0.0002])
+        assert index.nearest([1.0], [0.0], 5.0)[0][0] == 10
+        index = SkyIndex([30, 20], [1.0, 1.0], [0.0005, -0.0005])
+        assert index.nearest([1.0], [0.0], 5.0)[0][0] == 20
+
+    def test_missing_positions_are_skipped(self):
+        index = SkyIndex([1, 2], [np.nan, 3.0], [0.0, 0.0])
+        assert len(index) == 1
+        ids, _ = index.nearest([np.nan, 3.0], [0.0, 0.0], 1.0)
+        assert list(ids) == [-1, 2]
+
+    def test_empty_batches(self):
+        ids, sep = SkyIndex([1], [1.0], [1.0]).nearest([], [], 1.0)
+        assert len(ids) == 0 and len(sep) == 0
+        ids, _ = SkyIndex([], [], []).nearest([1.0], [1.0], 1.0)
+        assert list(ids) == [-1]
+
+
+class TestMagnitudeTolerance:
+    INDEX = SkyIndex([1, 2], [3.0, 3.0], [0.0, 0.0004], mag=[5.0, np.nan])
+
+    def test_closest_is_passed_over_when_its_magnitude_disagrees(self):
+        ids, _ = self.INDEX.nearest([3.0], [0.0], 5.0, mag=[12.0], mag_tolerance=3.0)
+        assert ids[0] == 2
+
+    def test_close_enough_magnitude_keeps_the_closest(self):
+        ids, _ = self.INDEX.nearest([3.0], [0.0], 5.0, mag=[7.0], mag_tolerance=3.0)
+        assert ids[0] == 1
+
+    def test_unknown_query_magnitude_matches_on_position(self):
+        ids, _ = self.INDEX.nearest([3.0], [0.0], 5.0, mag=[np.nan], mag_tolerance=3.0)
+        assert ids[0] == 1
+
+    def test_needs_magnitudes_in_the_index(self):
+        with pytest.raises(ValueError):
+            SkyIndex([1], [3.0], [0.0]).nearest([3.0], [0.0], 5.0, mag=[1.0], mag_tolerance=3.0)
@@ -0,0 +1,141 @@
+"""
+Tests for the offline artifact validator.
+
+Run: python -m pytest test_validate_data.py -v
+
+Each test builds a small data directory that passes, breaks one invariant, and checks that
+exactly that check fails. The committed db/data/ itself must pass, which is the check CI
+relies on.
+"""
+import os
+import shutil
+
+import pytest
+
+from validate_data import DATA_DIR, DuplicateFinder, Validator, duplicates
+
+CNS5_HEADER = "athyg_id,match_method,gaia,dist,absmag,x_eq,y_eq,z_eq"
+CNS5_ROWS = [
+    "2244443,gj_id,1871118140493076224,13.0,11.8,3.0,4.0,12.0",
+    "5000000,new,1873146567646378880,13.0,10.5,3.0,4.0,12.0",
+    "5000001,new,,,,,,",
+]
+GCNS_ROWS = [
+    "100,gaia_source_id,42,13.0,5.0,3.0,4.0,12.0",
+    "6000000,new,43,13.0,5.0,3.0,4.0,12.0",
+]
+DISTANCES = ["athyg_id,gaia,dist,rpgeo,old_dist,old_absmag,old_dist_src,mag",
+             "28074,430614112599738112,4613.76,2141.88,117620.45,-10.06,G_R3,10.29"]
+CONSTELLATIONS = ["athyg_id,con", "5000000,Cyg", "5000001,Lyr"]
+V3 = ["v3_start,v3_end,offset,match_method", "2,98,0,gaia", "99,120,5,tyc"]
+
+
+def write(directory, name, lines):
+    with open(os.path.join(directory, name), "w") as fh:
+        fh.write("\n".join(lines) + "\n")
+
+
+@pytest.fixture
+def data(tmp_path):
+    shutil.copy(os.path.join(DATA_DIR, "constellation_boundaries.csv"), tmp_path)
+    write(tmp_path, "cns5.csv", [CNS5_HEADER] + CNS5_ROWS)
+    write(tmp_path, "gcns.csv", [CNS5_HEADER] + GCNS_ROWS)
+    write(tmp_path, "gaia_distances.csv", DISTANCES)
+    write(tmp_path, "constellations.csv", CONSTELLATIONS)
+    write(tmp_path, "athyg_v3_ids.csv", V3)
+    return tmp_path
+
+
+def failures(directory, capsys):
+    problems = Validator(str(directory), quiet=True).run()
+    out = capsys.readouterr().out
+    return problems, [line for line in out.splitlines() if line.startswith("FAIL")]
+
+
+class TestCommittedData:
+    def test_db_data_passes(self, capsys):
+        assert Validator(quiet=True).run() == 0, capsys.readouterr().out
+
+
+class TestValidator:
+    def test_clean_directory_passes(self, data, capsys):
+        assert failures(data, capsys) == (0, [])
+
+    def test_gcns_is_optional(self, data, capsys):
+        os.remove(data / "gcns.csv")
+        assert failures(data, capsys) == (0, [])
+
+    def test_duplicate_athyg_id(self, data, capsys):
+        write(data, "cns5.csv", [CNS5_HEADER] + CNS5_ROWS + [CNS5_ROWS[0].replace("gj_id", "hip_id")])
+        problems, failed = failures(data, capsys)
+        assert problems == 1 and "cns5.csv: duplicate athyg_id" in failed[0]
+
+    def test_sentinel_and_drift(self, data, capsys):
+        write(data, "gcns.csv", [CNS5_HEADER, "100,gaia_source_id,42,100000,5.0,,,"])
+        _, failed = failures(data, capsys)
+        assert len(failed) == 1 and "sentinel" in failed[0]
+        write(data, "gcns.csv", [CNS5_HEADER, "100,gaia_source_id,42,14.0,5.0,3.0,4.0,12.0"])
+        _, failed = failures(data, capsys)
+        assert len(failed) == 1 and "length disagrees" in failed[0]
+
+    def test_implausible_luminosity(self, data, capsys):
+        write(data, "cns5.csv", [CNS5_HEADER, "1,gj_id,,13.0,-10.5,3.0,4.0,12.0"])
+        _, failed = failures(data, capsys)
+        assert len(failed) == 1 and "cns5.csv: implausibly luminous" in failed[0]
+
+    def test_corrected_distance_still_implausible(self, data, capsys):
+        # mag 10.29 at 4613 pc is absmag -3.03; at 4.6 Mpc it would be -18.
+        write(data, "gaia_distances.csv", [DISTANCES[0], DISTANCES[1].replace("4613.76", "4613760")])
+        _, failed = failures(data, capsys)
+        assert len(failed) == 1 and "gaia_distances.csv: implausibly luminous" in failed[0]
+
+    def test_new_star_numbered_into_athyg(self, data, capsys):
+        write(data, "cns5.csv", [CNS5_HEADER, "4999999,new,,13.0,5.0,3.0,4.0,12.0"])
+        _, failed = failures(data, capsys)
+        assert len(failed) == 1 and "numbered below 5000000" in failed[0]
+
+    def test_same_star_new_in_both_supplements(self, data, capsys):
+        write(data, "gcns.csv", [CNS5_HEADER, "6000000,new,1873146567646378880,13.0,5.0,3.0,4.0,12.0"])
+        problems, failed = failures(data, capsys)
+        assert problems == 1 and "inserted as new more than once" in failed[0]
+
+    def test_matched_rows_may_share_a_gaia_id_with_a_new_one(self, data, capsys):
+        """Only inserts create stars; a match refers to one that already exists."""
+        write(data, "gcns.csv", [CNS5_HEADER, "100,gaia_source_id,1873146567646378880,13.0,5.0,3.0,4.0,12.0"])
+        assert failures(data, capsys) == (0, [])
+
+    def test_unknown_constellation(self, data, capsys):
+        write(data, "constellations.csv", CONSTELLATIONS + ["5000002,Xyz"])
+        _, failed = failures(data, capsys)
+        assert len(failed) == 1 and "not in the boundary table" in failed[0]
+
+    def test_overlapping_v3_ranges(self, data, capsys):
+        write(data, "athyg_v3_ids.csv", V3 + ["110,130,7,gaia"])
+        _, failed = failures(data, capsys)
+        assert len(failed) == 1 and "out of order or overlapping" in failed[0]
+
+    def test_malformed_range_and_method(self, data, capsys):
+        write(data, "athyg_v3_ids.csv", V3 + ["200,150,0,gaia", "300,301,0,name"])
+        _, failed = failures(data, capsys)
+        assert len(failed) == 2
+
+
+class TestDuplicateFinder:
+    def test_collisions_are_confirmed_away(self):
+        """With 8 slots, nearly everything collides; only real repeats may come out."""
+        keys = list(range(100)) + [7, 7, 42]
+        finder = DuplicateFinder(bits=8)
+        for key in keys:
+            finder.see(key)
+        assert len(finder.candidates) > 3
+        assert finder.confirm(keys) == {7: 3, 42: 2}
+
+    def test_dense_ids_never_collide(self):
+        finder = DuplicateFinder()
+        for key in range(5_000_000, 5_010_000):
+            finder.see(key)
+        assert finder.candidates == set()
+
+    def test_duplicates_reads_each_column(self, tmp_path):
+        write(tmp_path, "x.csv", ["a,b", "1,5", "2,5", "1,", "3,6"])
+        assert duplicates(str(tmp_path / "x.csv"), "a", "b") == {"a": {1: 2}, "b": {5: 2}}
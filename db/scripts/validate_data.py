@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Check the committed import artifacts in db/data/ without a database.
+
+Read-only, and needs nothing beyond the standard library and this directory.
+
+    python3 db/scripts/validate_data.py            # exits 1 if anything is found
+    python3 db/scripts/validate_data.py --quiet --data-dir /tmp/rebuilt
+
+The invariants here are the ones the match scripts assert before writing and the database
+checks report after importing -- assert_no_duplicate_ids (match_cns5.py, match_gcns.py),
+assert_no_duplicate_v3_ids (match_athyg_v3.py) and check_distance_quality.py -- applied
+to the CSVs themselves. Those only ran at the ends of the pipeline: a bad artifact that
+reached the repository by any other route (a hand edit, a merge, a regenerated file from
+an older script) was found only after a full Postgres import, minutes later, or not at
+all -- a duplicate athyg_id imports silently, one row overwriting the other. This runs in
+about 1.5 seconds on the whole of db/data/, so CI can run it on every change.
+
+    cns5.csv, gcns.csv   athyg_id unique; new rows numbered from FIRST_IMPORTED_ID; no
+                         sentinel or non-positive distance; |x_eq,y_eq,z_eq| = dist;
+                         absmag no brighter than ABSMAG_FLOOR; and no Gaia id inserted as
+                         new twice, within or across the two files (the CNS5/GCNS
+                         double insert).
+    gaia_distances.csv   athyg_id and gaia unique; distance positive and not the sentinel;
+                         the corrected absmag no brighter than ABSMAG_FLOOR.
+    constellations.csv   athyg_id unique; con one of the 88 in the boundary table.
+    athyg_v3_ids.csv     ranges well formed, ascending and disjoint -- so no v3 id is
+                         mapped twice -- with a known match method.
+
+gcns.csv is produced during the build rather than committed, so it is checked when present.
+
+Memory does not grow with the files. Rows are streamed, and duplicates are found in two
+passes (DuplicateFinder): the first sets one bit per key in a fixed-size table, the second
+counts exactly only the keys whose bit was already set, which is the true duplicates plus
+a few hash collisions.
+"""
+import argparse
+import csv
+import math
+import os
+import sys
+from collections import Counter
+
+from check_distance_quality import ABSMAG_FLOOR, COORD_TOLERANCE_FRACTION, SENTINEL_DIST
+from check_duplicates import FIRST_IMPORTED_ID
+from match_athyg_v3 import MATCH_CASCADE
+from quality_checks import report
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+# Bits in DuplicateFinder's table: 8 MB. At the size of the largest artifact (280k keys)
+# about 0.4% of keys collide and are re-counted exactly in the second pass.
+HASH_BITS = 1 << 26
+
+
+class DuplicateFinder:
+    """
+    Keys seen more than once, in memory that does not depend on how many keys there are.
+
+    see() is the first pass; `candidates` then holds every key whose bit was already set
+    when it arrived. Feed the same keys to confirm() for the exact duplicates.
+    """
+
+    def __init__(self, bits=HASH_BITS):
+        self.mask = bits - 1
+        self.table = bytearray(bits // 8)
+        self.candidates = set()
+
+    def see(self, key):
+        slot = hash(key) & self.mask
+        byte, bit = slot >> 3, 1 << (slot & 7)
+        if self.table[byte] & bit:
+            self.candidates.add(key)
+        else:
+            self.table[byte] |= bit
+
+    def confirm(self, keys):
+        """{key: count} for the keys that really occur more than once."""
+        counts = Counter(key for key in keys if key in self.candidates)
+        return {key: n for key, n in counts.items() if n > 1}
+
+
+def read_rows(path):
+    with open(path, newline="") as fh:
+        yield from csv.DictReader(fh)
+
+
+def duplicates(path, *columns, check_row=None):
+    """
+    Exact duplicates of each column's non-empty values: {column: {value: count}}. The
+    columns hold integer ids, hashed as ints: athyg ids are dense and below HASH_BITS, so
+    they never collide and the second pass is skipped unless something is really repeated.
+    check_row, if given, also sees every (line, row) of the first pass.
+    """
+    finders = {column: DuplicateFinder() for column in columns}
+    for line, row in enumerate(read_rows(path), start=2):
+        if check_row:
+            check_row(line, row)
+        for column, finder in finders.items():
+            if row[column]:
+                finder.see(int(row[column]))
+    out = {}
+    for column, finder in finders.items():
+        out[column] = (
+            finder.confirm(int(row[column]) for row in read_rows(path) if row[column])
+            if finder.candidates else {}
+        )
+    return out
+
+
+def example(values, limit=5):
+    return ", ".join(str(v) for v in sorted(values)[:limit])
+
+
+class Validator:
+    """Runs the checks against one data directory, printing as check_distance_quality does."""
+
+    def __init__(self, data_dir=DATA_DIR, quiet=False):
+        self.data_dir = data_dir
+        self.quiet = quiet
+        self.problems = 0
+
+    def path(self, name):
+        return os.path.normpath(os.path.join(self.data_dir, name))
+
+    def check(self, label, bad, hint):
+        """bad: the offending values (any collection); reports their count and a few of them."""
+        found = report(label, len(bad), hint, self.quiet)
+        if found:
+            print(f"              -> e.g. {example(bad)}")
+        self.problems += found
+
+    def distance_rows(self, name, with_position):
+        """The row-level distance invariants, in one pass over the file."""
+        path = self.path(name)
+        sentinel, nonpositive, drift, luminous, misnumbered = [], [], [], [], []
+        for line, row in enumerate(read_rows(path), start=2):
+            where = f"{name}:{line}"
+            dist = float(row["dist"]) if row["dist"] else None
+            if dist is not None:
+                if dist == SENTINEL_DIST:
+                    sentinel.append(where)
+                elif dist <= 0:
+                    nonpositive.append(where)
+            if with_position:
+                if row["match_method"] == "new" and int(row["athyg_id"]) < FIRST_IMPORTED_ID:
+                    misnumbered.append(where)
+                if dist and row["x_eq"]:
+                    length = math.sqrt(sum(float(row[c]) ** 2 for c in ("x_eq", "y_eq", "z_eq")))
+                    if abs(length - dist) > COORD_TOLERANCE_FRACTION * dist:
+                        drift.append(where)
+                absmag = float(row["absmag"]) if row["absmag"] else None
+            else:
+                absmag = (
+                    float(row["mag"]) - 5.0 * math.log10(dist) + 5.0
+                    if row["mag"] and dist and dist > 0 else None
+                )
+            if absmag is not None and absmag < ABSMAG_FLOOR:
+                luminous.append(where)
+
+        self.check(f"{name}: unknown-distance sentinel as a distance", sentinel,
+                   f"{SENTINEL_DIST} pc is HYG's placeholder for an unusable parallax")
+        self.check(f"{name}: non-positive distances", nonpositive,
+                   "a distance must be positive or empty")
+        self.check(f"{name}: implausibly luminous stars", luminous,
+                   f"absmag below {ABSMAG_FLOOR} means the distance is wrong")
+        if with_position:
+            self.check(f"{name}: equatorial positions whose length disagrees with dist", drift,
+                       "x_eq/y_eq/z_eq were not derived from this row's distance")
+            self.check(f"{name}: new stars numbered below {FIRST_IMPORTED_ID}", misnumbered,
+                       "a new star's athyg_id would collide with an AT-HYG row")
+
+    def supplement(self, name):
+        """cns5.csv / gcns.csv. False if the file is absent."""
+        if not os.path.exists(self.path(name)):
+            if not self.quiet:
+                print(f"--         {name} not present; skipped")
+            return False
+        dupes = duplicates(self.path(name), "athyg_id")["athyg_id"]
+        self.check(f"{name}: duplicate athyg_id", dupes,
+                   "each would silently overwrite the other on import (assert_no_duplicate_ids)")
+        self.distance_rows(name, with_position=True)
+        return True
+
+    def new_gaia_repeated(self, names):
+        """Gaia ids the supplements insert as new more than once -- the same star twice."""
+        def new_gaia():
+            for name in names:
+                for row in read_rows(self.path(name)):
+                    if row["match_method"] == "new" and row["gaia"]:
+                        yield row["gaia"]
+
+        finder = DuplicateFinder()
+        for gaia in new_gaia():
+            finder.see(gaia)
+        repeated = finder.confirm(new_gaia()) if finder.candidates else {}
+        self.check(f"Gaia ids inserted as new more than once ({' + '.join(names)})", repeated,
+                   "the CNS5/GCNS double insert: the 07_import_gcns.sql guard will refuse this"
+                   " build; regenerate gcns.csv against a database that already has CNS5")
+
+    def gaia_distances(self):
+        name = "gaia_distances.csv"
+        dupes = duplicates(self.path(name), "athyg_id", "gaia")
+        self.check(f"{name}: duplicate athyg_id", dupes["athyg_id"],
+                   "two distances for one star; the import would apply either")
+        self.check(f"{name}: duplicate gaia", dupes["gaia"],
+                   "one Gaia source given to two stars")
+        self.distance_rows(name, with_position=False)
+
+    def constellations(self):
+        name = "constellations.csv"
+        with open(self.path("constellation_boundaries.csv"), newline="") as fh:
+            known = {row["con"] for row in csv.DictReader(fh)}
+        unknown = []
+
+        def check_con(line, row):
+            if row["con"] not in known:
+                unknown.append(f"{name}:{line} {row['con']!r}")
+
+        dupes = duplicates(self.path(name), "athyg_id", check_row=check_con)["athyg_id"]
+        self.check(f"{name}: constellation not in the boundary table", unknown,
+                   "con must be one of the 88 IAU abbreviations")
+        self.check(f"{name}: duplicate athyg_id", dupes,
+                   "two constellations for one star")
+
+    def v3_ranges(self):
+        name = "athyg_v3_ids.csv"
+        malformed, overlapping, methods = [], [], []
+        previous_end = None
+        for line, row in enumerate(read_rows(self.path(name)), start=2):
+            start, end = int(row["v3_start"]), int(row["v3_end"])
+            if end < start:
+                malformed.append(f"{name}:{line}")
+            # Ascending and disjoint is what makes every v3 id appear at most once;
+            # to_ranges() writes them sorted, so this holds one range in memory.
+            if previous_end is not None and start <= previous_end:
+                overlapping.append(f"{name}:{line}")
+            if row["match_method"] not in MATCH_CASCADE:
+                methods.append(f"{name}:{line} {row['match_method']!r}")
+            previous_end = end
+        self.check(f"{name}: ranges ending before they start", malformed,
+                   "v3_end must be at least v3_start")
+        self.check(f"{name}: ranges out of order or overlapping", overlapping,
+                   "a v3 id would be mapped more than once (assert_no_duplicate_v3_ids)")
+        self.check(f"{name}: unknown match_method", methods,
+                   f"match_method must be one of {', '.join(MATCH_CASCADE)}")
+
+    def run(self):
+        present = [name for name in ("cns5.csv", "gcns.csv") if self.supplement(name)]
+        if present:
+            self.new_gaia_repeated(present)
+        self.gaia_distances()
+        self.constellations()
+        self.v3_ranges()
+        return self.problems
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--data-dir", default=DATA_DIR, help="directory holding the CSVs")
+    ap.add_argument("--quiet", action="store_true", help="only report problems")
+    args = ap.parse_args()
+
+    problems = Validator(args.data_dir, args.quiet).run()
+    if problems:
+        print(f"\n{problems:,} problem(s) need attention")
+        return 1
+    if not args.quiet:
+        print("\nno problems found in the import artifacts")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,6 @@
 DROP TABLE IF EXISTS athyg CASCADE;
+-- 09_import_overrides.sql's saved pre-override values belong to the athyg just dropped.
+DROP TABLE IF EXISTS athyg_override_prior;
 
 CREATE TABLE athyg (
   id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
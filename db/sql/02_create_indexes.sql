@@ -10,6 +10,8 @@ CREATE INDEX idx_bbox_mag ON athyg (x, y, z, mag);
 -- Measured share of all 2,839,957 rows inside the box, by half-width:
 --   ±20 pc 0.27%   ±50 2.80%   ±100 12.72%   ±250 28.68%
 --   ±500 55.25%    ±1000 81.57%   ±1500 92.11%
+-- (Both synthetic catalogs -- db/scripts/generate_synthetic_catalog.py and
+-- hygmap-api/bench/catalog.py -- read their box distribution from these two lines.)
 -- At ±1500 the planner chose a sequential scan because that is the correct plan for 92%
 -- selectivity. The cost was never the filter; it was `ORDER BY absmag LIMIT`, which had to
 -- sort ~2.6M rows and spilled to a disk-based external merge (~211MB across 3 workers).
@@ -37,7 +37,11 @@ COPY signals_stage
 FROM '/data/signals.csv'
 WITH (FORMAT CSV, HEADER);
 
--- 5. Insert from the staging table into the final table, with calculations
+-- 5. Insert from the staging table into the final table, with calculations.
+-- x, y, z are where each signal's light had reached at import time, and go stale by a
+-- light-day a day. The API does not read them: get_signals recomputes the same position
+-- for the request's epoch (hygmap-api/app/api/signals.py, same rotation coefficients).
+-- They are kept for SQL users as a snapshot dated by last_updated.
 INSERT INTO signals (
     id, name, type, time, ra, dec, frequency, notes, x, y, z, last_updated
 )
@@ -30,9 +30,16 @@ CREATE TEMP TABLE cns5_stage (
   bright_unmatched INTEGER
 );
 
+\if :{?from_stage}
+-- Rows streamed in by match_cns5.py with CNS5_COPY=1 (db/scripts/copy_stage.py) rather than read
+-- from the CSV. public.cns5_stage was created from the definition above.
+INSERT INTO cns5_stage SELECT * FROM public.cns5_stage;
+DROP TABLE public.cns5_stage;
+\else
 COPY cns5_stage
 FROM '/data/cns5.csv'
 WITH (FORMAT csv, HEADER true, NULL '', DELIMITER ',');
+\endif
 
 DO $$
 BEGIN
@@ -27,9 +27,16 @@ CREATE TEMP TABLE gcns_stage (
   bright_unmatched INTEGER
 );
 
+\if :{?from_stage}
+-- Rows streamed in by match_gcns.py with GCNS_COPY=1 (db/scripts/copy_stage.py) rather than read
+-- from the CSV. public.gcns_stage was created from the definition above.
+INSERT INTO gcns_stage SELECT * FROM public.gcns_stage;
+DROP TABLE public.gcns_stage;
+\else
 COPY gcns_stage
 FROM '/data/gcns.csv'
 WITH (FORMAT csv, HEADER true, NULL '', DELIMITER ',');
+\endif
 
 DO $$
 BEGIN
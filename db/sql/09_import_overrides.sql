@@ -27,10 +27,43 @@
 --    CSV went unnoticed for months. expect_proper is the tripwire: it makes a drifted or
 --    mistyped key impossible to miss.
 --
--- To add a field: extend the staging table and the UPDATE below. Leave a cell empty to mean
--- "do not touch".
+-- To add a field: extend the staging table and the UPDATE below, and athyg_override_prior
+-- with every column it writes. Leave a cell empty to mean "do not touch".
 --
 
+--
+-- Undo the previous run before applying this one.
+--
+-- This file is re-run on its own when only athyg_overrides.csv has changed (see
+-- db/scripts/run_import.py --incremental), rather than after re-importing the whole
+-- catalog. Re-applying the UPDATEs below on top of their earlier result is not enough on
+-- its own. An override deleted from the CSV, or re-keyed to another star, would leave its
+-- old value in place. A clear_gaia row keyed on Gaia would no longer match anything, and
+-- Rule 3 would abort.
+--
+-- So every row this file touches has its previous values saved here first, and the next
+-- run puts them back before doing anything else. After the restore, athyg is exactly what
+-- 08 left it, whatever the CSV said last time. 01_create_table.sql drops this table with
+-- athyg, so a full rebuild starts with nothing to restore.
+--
+CREATE TABLE IF NOT EXISTS athyg_override_prior (
+  athyg_id INTEGER PRIMARY KEY,
+  gaia     TEXT,
+  dist     REAL,
+  dist_src TEXT,
+  absmag   REAL,
+  x REAL, y REAL, z REAL,
+  x_eq REAL, y_eq REAL, z_eq REAL
+);
+
+UPDATE athyg a
+SET    gaia = p.gaia, dist = p.dist, dist_src = p.dist_src, absmag = p.absmag,
+       x = p.x, y = p.y, z = p.z, x_eq = p.x_eq, y_eq = p.y_eq, z_eq = p.z_eq
+FROM   athyg_override_prior p
+WHERE  a.id = p.athyg_id;
+
+TRUNCATE athyg_override_prior;
+
 CREATE TEMP TABLE override_stage (
   gaia          TEXT,
   hip           TEXT,
@@ -89,6 +122,12 @@ BEGIN
   END IF;
 END $$;
 
+-- Keep what is about to be overwritten, for the next run's restore.
+INSERT INTO athyg_override_prior
+SELECT a.id, a.gaia, a.dist, a.dist_src, a.absmag, a.x, a.y, a.z, a.x_eq, a.y_eq, a.z_eq
+FROM   athyg a
+WHERE  a.id IN (SELECT athyg_id FROM override_resolved);
+
 --
 -- Apply. dist_src marks the value as manual so it is never mistaken for a measurement, and
 -- absmag and the coordinates are recomputed from it in the same statement -- a distance that
@@ -17,7 +17,14 @@ CREATE TEMP TABLE constellation_stage (
   con      TEXT
 );
 
+\if :{?from_stage}
+-- Rows streamed in by compute_constellations.py --copy (db/scripts/copy_stage.py) rather than read
+-- from the CSV. public.constellation_stage was created from the definition above.
+INSERT INTO constellation_stage SELECT * FROM public.constellation_stage;
+DROP TABLE public.constellation_stage;
+\else
 \COPY constellation_stage FROM '/data/constellations.csv' WITH (FORMAT csv, HEADER true, NULL '');
+\endif
 
 --
 -- Refuse a stale CSV, as 06 and 07 now do.
@@ -57,7 +57,14 @@ CREATE TEMP TABLE athyg_v3_ranges (
   match_method TEXT    NOT NULL
 );
 
+\if :{?from_stage}
+-- Rows streamed in by match_athyg_v3.py --copy (db/scripts/copy_stage.py) rather than read
+-- from the CSV. public.athyg_v3_ranges was created from the definition above.
+INSERT INTO athyg_v3_ranges SELECT * FROM public.athyg_v3_ranges;
+DROP TABLE public.athyg_v3_ranges;
+\else
 \COPY athyg_v3_ranges FROM '/data/athyg_v3_ids.csv' WITH (FORMAT csv, HEADER true, NULL '');
+\endif
 
 --
 -- Reject a malformed range before it becomes 2.5M wrong rows. An inverted range expands
@@ -1,13 +1,18 @@
 """Signal API endpoints"""
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+import math
+from datetime import UTC, datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import metrics
 from app.config import settings
-from app.database import get_db
+from app.database import LazySession, get_db
 from app.limiter import limiter
 from app.schemas import Signal, SignalListResponse
+from app.singleflight import flights
 
 router = APIRouter()
 
@@ -31,6 +36,56 @@ ORDER_CLAUSES = {
 }
 DEFAULT_ORDER = "time desc"
 
+# A signal's position is how far light has carried it since `time`, in its direction on
+# the sky. That grows by a light-year a year, so it is computed per request for the
+# epoch asked for (`at`, default now) rather than read from signals.x/y/z, which
+# 05_import_signals.sql fills in once at import and which were a day stale by the next
+# day. Twelve rows; plain arithmetic is cheaper than anything vectorised would be.
+SECONDS_PER_YEAR = 365.25 * 24 * 60 * 60
+LIGHT_YEARS_PER_PARSEC = 3.26156
+
+# Equatorial to galactic rotation, with the same coefficients as 05_import_signals.sql,
+# so a position computed here at the import's timestamp is the one the import stored.
+EQUATORIAL_TO_GALACTIC = (
+    (-0.055, -0.8734, -0.4839),
+    (0.494, -0.4449, 0.747),
+    (-0.8677, -0.1979, 0.4560),
+)
+
+
+def as_utc(value: datetime | str) -> datetime:
+    """A timestamp as an aware UTC datetime. SQLite hands back ISO text; naive means UTC."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+def signal_position(
+    signal_type: str, time: datetime, ra: float, dec: float, at: datetime
+) -> tuple[float, float, float] | None:
+    """
+    Galactic x, y, z (parsecs) of a signal at `at`, or None before it was sent or received.
+
+    A transmission has travelled outward toward (ra, dec). A received signal is drawn as
+    the light that has passed Earth and carried on, so it points the opposite way.
+    """
+    years = (at - time).total_seconds() / SECONDS_PER_YEAR
+    if years < 0:
+        return None
+    dist = years / LIGHT_YEARS_PER_PARSEC
+    if signal_type == "transmit":
+        ra_rad, dec_rad = math.radians(ra * 15.0), math.radians(dec)
+    else:
+        ra_rad, dec_rad = math.radians((ra + 12.0) % 24.0 * 15.0), math.radians(-dec)
+    eq = (
+        dist * math.cos(dec_rad) * math.cos(ra_rad),
+        dist * math.cos(dec_rad) * math.sin(ra_rad),
+        dist * math.sin(dec_rad),
+    )
+    return tuple(sum(m * e for m, e in zip(row, eq, strict=True)) for row in EQUATORIAL_TO_GALACTIC)
+
 
 @router.get("/", response_model=SignalListResponse)
 @limiter.limit(settings.RATE_LIMIT)
@@ -49,9 +104,13 @@ async def get_signals(
         pattern="^(transmit|receive)$",
         description="Optional signal type filter",
     ),
-    db: AsyncSession = Depends(get_db),
+    at: datetime | None = Query(
+        None,
+        description="Epoch for the signal positions (ISO 8601, default now; naive means UTC)",
+    ),
+    db: LazySession = Depends(get_db),
 ):
-    """Fetch signals that fall within a 3D bounding box."""
+    """Fetch signals whose position at `at` falls within a 3D bounding box."""
 
     # Validate coordinates within absolute bounds
     coordinates = [xmin, xmax, ymin, ymax, zmin, zmax]
@@ -85,15 +144,7 @@ async def get_signals(
         )
 
     type_filter = ""
-    params: dict[str, float | int | str] = {
-        "xmin": xmin,
-        "xmax": xmax,
-        "ymin": ymin,
-        "ymax": ymax,
-        "zmin": zmin,
-        "zmax": zmax,
-        "limit": limit,
-    }
+    params: dict[str, str] = {}
 
     if signal_type:
         type_filter = "AND type = :signal_type"
@@ -109,23 +160,41 @@ async def get_signals(
             ra,
             dec,
             frequency,
-            notes,
-            x,
-            y,
-            z,
-            last_updated
+            notes
         FROM signals
-        WHERE x > :xmin AND x < :xmax
-          AND y > :ymin AND y < :ymax
-          AND z > :zmin AND z < :zmax
+        WHERE time IS NOT NULL AND ra IS NOT NULL AND dec IS NOT NULL
           {type_filter}
         ORDER BY {order_clause}
-        LIMIT :limit
     """
     )
+    epoch = as_utc(at) if at else None
+
+    async def run() -> bytes:
+        result = await db.execute(query, params)
+        rows = result.mappings().all()
+        await db.release()
+        metrics.record_rows(len(rows))
 
-    result = await db.execute(query, params)
-    rows = result.mappings().all()
-    signals = [Signal(**row) for row in rows]
+        with metrics.phase("build"):
+            # Positions move, so the box is applied here, to this epoch's positions, and
+            # the limit after it; the SQL above only filters by type and sorts.
+            when = epoch or datetime.now(UTC)
+            signals = []
+            for row in rows:
+                position = signal_position(row["type"], as_utc(row["time"]), row["ra"], row["dec"], when)
+                if position is None:
+                    continue
+                x, y, z = position
+                if xmin < x < xmax and ymin < y < ymax and zmin < z < zmax:
+                    signals.append(Signal(**row, x=x, y=y, z=z, last_updated=when))
+                    if len(signals) == limit:
+                        break
+            response = SignalListResponse(result="success", data=signals, length=len(signals))
+        with metrics.phase("ser"):
+            return response.model_dump_json().encode()
 
-    return SignalListResponse(result="success", data=signals, length=len(signals))
+    # Same arrangement as get_stars: identical concurrent requests share one query and
+    # one serialized body. See app/singleflight.py.
+    key = ("signals", xmin, xmax, ymin, ymax, zmin, zmax, limit, signal_type, order_clause, epoch)
+    body = await flights.do(key, run)
+    return Response(content=body, media_type="application/json")
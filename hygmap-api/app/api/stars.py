@@ -1,11 +1,12 @@
 """
 Star API endpoints
 """
-from fastapi import APIRouter, Depends, Path, Query, HTTPException, Request
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Path, Query, HTTPException, Request, Response
 from sqlalchemy import text
 from app.limiter import limiter
-from app.database import get_db
+from app.database import LazySession, get_db
+from app import metrics
+from app.singleflight import flights
 from app.schemas import (
     StarListResponse,
     StarDetailResponse,
@@ -122,7 +123,7 @@ async def get_stars(
     limit: int = Query(10000, ge=1, le=50000, description="Maximum number of stars to return"),
     world_id: int = Query(0, ge=0, le=PG_INT_MAX, description="Fictional world ID for fictional names (0 = no fictional names)"),
     order: str = Query(DEFAULT_ORDER, description="Sort order (absmag/mag/proper/dist asc|desc)"),
-    db: AsyncSession = Depends(get_db),
+    db: LazySession = Depends(get_db),
 ):
     """
     Get stars within specified 3D spatial bounds.
@@ -164,6 +165,8 @@ async def get_stars(
             detail="Invalid order parameter. Allowed values: absmag, mag, proper, dist (asc/desc)"
         )
 
+    metrics.record_bbox(xmax - xmin, ymax - ymin, zmax - zmin)
+
     # Build query with optional magnitude filter and fictional name join
     mag_filter = "AND a.absmag < :mag_max" if mag_max is not None else ""
     query = text(f"""
@@ -211,16 +214,34 @@ async def get_stars(
     if mag_max is not None:
         params["mag_max"] = mag_max
 
-    result = await db.execute(query, params)
-
-    rows = result.mappings().all()
-    stars = [StarBase(**row) for row in rows]
+    async def run() -> bytes:
+        result = await db.execute(query, params)
+
+        rows = result.mappings().all()
+        # Hand the connection back before building and serializing up to 50,000 models,
+        # which is most of this request's time. See LazySession.
+        await db.release()
+        metrics.record_rows(len(rows))
+
+        with metrics.phase("build"):
+            stars = [StarBase(**row) for row in rows]
+            response = StarListResponse(
+                result="success",
+                data=stars,
+                length=len(stars),
+            )
+        with metrics.phase("ser"):
+            return response.model_dump_json().encode()
 
-    return StarListResponse(
-        result="success",
-        data=stars,
-        length=len(stars),
-    )
+    # Keyed on the normalized request: the resolved ORDER BY clause rather than the raw
+    # `order` string, so "absmag", "ABSMAG " and "absmag asc" share one query.
+    #
+    # Coalesced requests share the serialized bytes and each gets its own Response, since
+    # middleware writes headers onto it. Returning a Response skips FastAPI's second pass
+    # through response_model; the body was produced by that same model inside run().
+    key = ("stars", xmin, xmax, ymin, ymax, zmin, zmax, mag_max, limit, world_id, order_clause)
+    body = await flights.do(key, run)
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/search", response_model=StarListResponse)
@@ -230,7 +251,7 @@ async def search_stars(
     q: str = Query(..., min_length=1, max_length=100, description="Search query (name or catalog ID)"),
     limit: int = Query(20, ge=1, le=100, description="Maximum number of results"),
     world_id: int = Query(0, ge=0, le=PG_INT_MAX, description="Fictional world ID for fictional names (0 = no fictional names)"),
-    db: AsyncSession = Depends(get_db),
+    db: LazySession = Depends(get_db),
 ):
     """
     Search for stars by name or catalog ID.
@@ -266,8 +287,9 @@ async def search_stars(
     # cannot leak onto a pooled connection and silently throttle some later request.
     #
     # Guarded on the dialect because the test suite runs on SQLite, which has no such
-    # setting. That is a real gap and worth naming: this line is exercised in production
-    # and by the PHP integration suite against the live stack, but not by the API tests.
+    # setting. That is a real gap and worth naming: this line is exercised in production,
+    # by the PHP integration suite against the live stack, and by the query-plan suite
+    # (tests/plans/, `make test-plans`), but not by the ordinary API tests.
     if db.bind and db.bind.dialect.name == "postgresql":
         await db.execute(
             text(f"SET LOCAL statement_timeout = {int(settings.SEARCH_STATEMENT_TIMEOUT_MS)}")
@@ -549,6 +571,7 @@ async def search_stars(
         )
 
     rows = result.mappings().all()
+    metrics.record_rows(len(rows))
     stars = [StarBase(**{k: v for k, v in row.items() if k in StarBase.model_fields}) for row in rows]
 
     return StarListResponse(
@@ -562,7 +585,7 @@ async def search_stars(
 @limiter.limit(settings.RATE_LIMIT)
 async def get_proper_names(
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: LazySession = Depends(get_db),
 ):
     """
     Get all stars with proper names for dropdown selection.
@@ -591,7 +614,7 @@ async def get_proper_names(
 async def get_fictional_names(
     request: Request,
     world_id: int = Query(..., ge=1, le=PG_INT_MAX, description="Fictional world ID to filter by"),
-    db: AsyncSession = Depends(get_db),
+    db: LazySession = Depends(get_db),
 ):
     """
     Get all fictional star names for a specific world/universe.
@@ -619,7 +642,7 @@ async def get_fictional_names(
 @limiter.limit(settings.RATE_LIMIT)
 async def get_worlds(
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: LazySession = Depends(get_db),
 ):
     """
     Get all fictional worlds/universes available.
@@ -648,7 +671,7 @@ async def get_star_by_legacy_id(
     request: Request,  # Required for rate limiter
     v3_id: int = Path(..., ge=1, le=PG_INT_MAX),
     world_id: int = Query(0, ge=0, le=PG_INT_MAX, description="Fictional world ID for fictional name (0 = no fictional name)"),
-    db: AsyncSession = Depends(get_db),
+    db: LazySession = Depends(get_db),
 ):
     """
     Resolve an AT-HYG v3.3 star id to the star it names in the current catalog.
@@ -698,7 +721,7 @@ async def get_star_by_id(
     request: Request,  # Required for rate limiter
     star_id: int = Path(..., ge=1, le=PG_INT_MAX),
     world_id: int = Query(0, ge=0, le=PG_INT_MAX, description="Fictional world ID for fictional name (0 = no fictional name)"),
-    db: AsyncSession = Depends(get_db),
+    db: LazySession = Depends(get_db),
 ):
     """
     Get detailed information for a specific star by its database ID.
@@ -1,16 +1,95 @@
 """
 Database connection and session management
 """
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import time
+import uuid
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from app.config import settings
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app import metrics
+from app.slow_queries import create_slow_query_log
+from app.config import Settings, settings
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    The default async queue pool, counting who is waiting for a connection.
+
+    QueuePool reports how many connections are checked out and how far into overflow it
+    is, but not how many requests are blocked on it -- which is the number that says a
+    burst is queuing rather than being served. Before this, a request stuck waiting on
+    the pool looked, from the outside, exactly like a slow query.
+
+    Counted around the public `connect()`, so "waiting" covers the whole checkout: the
+    queue wait, plus opening a connection when the pool grows and the pre-ping when that
+    is on. All three are time a request spends before its first query can start.
+    tests/test_database.py checks the counters through a real checkout.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+        self.wait_seconds_total = 0.0
+        self.checkouts_total = 0
+
+    def connect(self):
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            elapsed = time.perf_counter() - start
+            self.waiting -= 1
+            self.wait_seconds_total += elapsed
+            self.checkouts_total += 1
+            metrics.POOL_WAIT.observe(elapsed)
+
+
+def engine_options(config: Settings = settings) -> dict:
+    """
+    Keyword arguments for create_async_engine, derived from settings.
+
+    Separate from the engine itself so the mapping from settings to pool behaviour can
+    be checked without connecting to anything.
+    """
+    options = {
+        "echo": config.DEBUG,
+        "future": True,
+        "poolclass": InstrumentedPool,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+
+    # Statement-cache controls are asyncpg connect() arguments; any other driver would
+    # reject them, and the test suite runs on aiosqlite.
+    if make_url(config.DATABASE_URL).drivername == "postgresql+asyncpg":
+        if config.DB_PGBOUNCER:
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                # Unique names, so a statement prepared on one server connection can never
+                # collide with a same-named one PgBouncer routes us to next.
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            }
+        else:
+            options["connect_args"] = {
+                "statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+                "prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+            }
+
+    return options
+
 
 # Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    future=True,
-)
+engine = create_async_engine(settings.DATABASE_URL, **engine_options())
+metrics.instrument_engine(engine.sync_engine)
+slow_queries = create_slow_query_log(engine)
 
 # Create session factory
 AsyncSessionLocal = async_sessionmaker(
@@ -25,10 +104,79 @@ AsyncSessionLocal = async_sessionmaker(
 Base = declarative_base()
 
 
-async def get_db() -> AsyncSession:
-    """Dependency to get database session"""
-    async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
+def pool_status(target: AsyncEngine = engine) -> dict:
+    """
+    Live connection pool statistics, for instrumentation.
+
+    `checked_out` connections are serving a request now; `waiting` requests are blocked
+    until one is returned. A non-zero `waiting` under load is the pool being the
+    bottleneck, and `overflow` above zero means it has already grown past DB_POOL_SIZE to
+    cope. A plain QueuePool, which keeps no such counters, reports zeros for them.
+    """
+    pool = target.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "waiting": getattr(pool, "waiting", 0),
+        "wait_seconds_total": round(getattr(pool, "wait_seconds_total", 0.0), 6),
+        "checkouts_total": getattr(pool, "checkouts_total", 0),
+    }
+
+
+metrics.REGISTRY.register(metrics.PoolCollector(pool_status))
+
+
+class LazySession:
+    """
+    A database handle that holds a pooled connection only while it needs one.
+
+    Route handlers used to receive an AsyncSession created up front. The session itself
+    already deferred checking out a connection until its first execute, so a request
+    rejected before any SQL -- the 400s in get_stars and get_signals, or a request that
+    joins someone else's in-flight query -- never touched the pool. But once a query had
+    run, the connection stayed checked out until dependency teardown, which FastAPI runs
+    after the response has been serialized and sent. For a 10,000-star response the
+    connection sat idle through the most expensive part of the request.
+
+    This makes both halves explicit: nothing is created until `execute`, and `release`
+    hands the connection back as soon as the rows are in hand. Results from `execute` are
+    fully buffered (asyncpg fetches eagerly under SQLAlchemy's async API), so they remain
+    readable after release. Release ends the transaction, so anything relying on
+    transaction scope -- search_stars' SET LOCAL -- must finish its queries first.
+    """
+
+    def __init__(self, factory: async_sessionmaker):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def bind(self):
+        """The engine queries will run on, available without opening anything."""
+        return self._factory.kw.get("bind")
+
+    @property
+    def active(self) -> bool:
+        """True while a session (and possibly a connection) is held."""
+        return self._session is not None
+
+    async def execute(self, *args, **kwargs):
+        if self._session is None:
+            self._session = self._factory()
+        return await self._session.execute(*args, **kwargs)
+
+    async def release(self) -> None:
+        """Return the connection to the pool now. Safe to call when nothing is held."""
+        if self._session is not None:
+            session, self._session = self._session, None
             await session.close()
+
+
+async def get_db() -> AsyncIterator[LazySession]:
+    """Dependency to get a lazily-connecting database handle"""
+    handle = LazySession(AsyncSessionLocal)
+    try:
+        yield handle
+    finally:
+        await handle.release()
@@ -22,12 +22,14 @@ Every module that limits a route imports `limiter` from here. Do not construct a
 `Limiter` anywhere else.
 """
 import ipaddress
+import time
 from typing import Any, Callable, Optional
 
 from fastapi import Request
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
+from app import metrics
 from app.config import settings
 
 
@@ -81,6 +83,23 @@ class ProxyAwareLimiter(Limiter):
         request: Request,
         endpoint_func: Optional[Callable[..., Any]],
         in_middleware: bool = True,
+    ) -> None:
+        # Timed as the "limiter" phase of Server-Timing. With in-memory storage this is
+        # microseconds; the phase is there so that a remote storage backend cannot
+        # quietly become the slowest part of every request.
+        start = time.perf_counter()
+        try:
+            return self._check_or_exempt(request, endpoint_func, in_middleware)
+        finally:
+            request_metrics = metrics.current()
+            if request_metrics is not None:
+                request_metrics.add_phase("limiter", time.perf_counter() - start)
+
+    def _check_or_exempt(
+        self,
+        request: Request,
+        endpoint_func: Optional[Callable[..., Any]],
+        in_middleware: bool,
     ) -> None:
         if is_internal_client(request):
             # slowapi's route wrapper unconditionally reads request.state.view_rate_limit
@@ -1,12 +1,15 @@
 """
 FastAPI main application entry point for HYGMap star visualization
 """
+import itertools
+import secrets
 import time
 import uuid
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from app.config import settings
@@ -14,80 +17,161 @@ from app.limiter import limiter
 from app.api import stars
 from app.api import signals
 from app.logger import logger
+from app import metrics
+from app.database import pool_status, slow_queries
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware to log all requests and responses with timing"""
+class LoggingMiddleware:
+    """
+    Log every request and its outcome with timing.
 
-    async def dispatch(self, request: Request, call_next) -> Response:
-        # Generate unique request ID for correlation
-        request_id = str(uuid.uuid4())
-        request.state.request_id = request_id
+    Plain ASGI rather than Starlette's BaseHTTPMiddleware. That base class runs the rest
+    of the app in a separate task and relays the response through a memory stream, so
+    every request paid an extra task and a copy of its body per middleware -- and this
+    app stacked two of them. It also buffers streaming bodies, which makes a streamed
+    response impossible behind it. Wrapping `send` does the same job in-line.
 
-        # Log incoming request
-        start_time = time.time()
-        logger.info(
-            "Request started",
-            extra={
-                "request_id": request_id,
-                "method": request.method,
-                "path": request.url.path,
-                "query_params": str(request.query_params),
-                "client_ip": request.client.host if request.client else None,
-            }
-        )
+    The request is complete when the app returns, which is after the last body chunk has
+    gone to the server, so `duration_ms` now covers sending the body too. Under
+    BaseHTTPMiddleware it stopped when the headers were ready.
 
-        # Process request
-        try:
-            response = await call_next(request)
-            duration_ms = (time.time() - start_time) * 1000
+    Sampled: with LOG_REQUEST_SAMPLE_RATE=N, one request in N is logged at both ends.
+    The rest are logged only on completion, and only if they failed or were slow -- in
+    which case the completion record carries the query and client itself, since there is
+    no start record to correlate it with. `sampled` on every record says which it was.
+
+    Also adds the Server-Timing header (see metrics.server_timing): it is the one place
+    that both holds the request's phase timings and sees the headers go out.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.sample_rate = max(settings.LOG_REQUEST_SAMPLE_RATE, 1)
+        self._counter = itertools.count()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Generate unique request ID for correlation. Stored where Starlette's
+        # request.state reads from, so handlers still see request.state.request_id.
+        request_id = str(uuid.uuid4())
+        scope.setdefault("state", {})["request_id"] = request_id
+        method = scope["method"]
+        path = scope["path"]
+        client = scope.get("client")
+        request_details = {
+            "query_params": scope.get("query_string", b"").decode("latin-1"),
+            "client_ip": client[0] if client else None,
+        }
+        sampled = next(self._counter) % self.sample_rate == 0
 
-            # Log successful response
+        # Log incoming request
+        start_time = time.perf_counter()
+        if sampled:
             logger.info(
-                "Request completed",
+                "Request started",
                 extra={
                     "request_id": request_id,
-                    "method": request.method,
-                    "path": request.url.path,
-                    "status_code": response.status_code,
-                    "duration_ms": round(duration_ms, 2),
+                    "method": method,
+                    "path": path,
+                    "sampled": True,
+                    **request_details,
                 }
             )
-            return response
+
+        status_code = None
+        body_bytes = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, body_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                request_metrics = metrics.current()
+                if settings.SERVER_TIMING_ENABLED and request_metrics is not None:
+                    headers = MutableHeaders(scope=message)
+                    headers["Server-Timing"] = metrics.server_timing(
+                        request_metrics, time.perf_counter() - start_time
+                    )
+                    # Without this a browser hides the entries from the cross-origin
+                    # React app's Resource Timing API; devtools shows them either way.
+                    headers["Timing-Allow-Origin"] = ", ".join(settings.cors_origins_list)
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+            await send(message)
+
+        # Process request
+        try:
+            with metrics.track_request(scope) as request_metrics:
+                await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            duration_ms = (time.time() - start_time) * 1000
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            metrics.record_request(method, scope, 500, duration_ms / 1000, body_bytes)
             # Log error
             logger.error(
                 "Request failed",
                 extra={
                     "request_id": request_id,
-                    "method": request.method,
-                    "path": request.url.path,
+                    "method": method,
+                    "path": path,
                     "duration_ms": round(duration_ms, 2),
                     "error": str(e),
                     "error_type": type(e).__name__,
+                    "sampled": sampled,
+                    **request_details,
                 },
                 exc_info=True
             )
             raise
 
+        duration_ms = (time.perf_counter() - start_time) * 1000
+        metrics.record_request(
+            method, scope, status_code, duration_ms / 1000, body_bytes, request_metrics.bbox
+        )
+        failed = status_code is None or status_code >= 400
+        slow = duration_ms >= settings.LOG_SLOW_REQUEST_MS
+        if not (sampled or failed or slow):
+            return
+
+        # Log the response
+        extra = {
+            "request_id": request_id,
+            "method": method,
+            "path": path,
+            "status_code": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "sampled": sampled,
+        }
+        if not sampled:
+            extra.update(request_details)
+        logger.info("Request completed", extra=extra)
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Middleware to add security headers to all responses"""
 
-    async def dispatch(self, request: Request, call_next) -> Response:
-        response = await call_next(request)
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        if not settings.DEBUG:
-            # HSTS only in production (requires HTTPS)
-            response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        return response
+class SecurityHeadersMiddleware:
+    """Add security headers to all responses, as the response starts."""
 
-# Rate limiter: the one shared instance. See app/limiter.py for why it lives there
-# rather than being constructed here.
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-Content-Type-Options"] = "nosniff"
+                headers["X-Frame-Options"] = "DENY"
+                headers["X-XSS-Protection"] = "1; mode=block"
+                headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+                if not settings.DEBUG:
+                    # HSTS only in production (requires HTTPS)
+                    headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 app = FastAPI(
     title="HYGMap API",
@@ -100,9 +184,17 @@ app = FastAPI(
     openapi_url="/openapi.json" if settings.ENABLE_DOCS else None,
 )
 
-# Attach limiter to app state and add exception handler
+
+async def rate_limit_exceeded(request: Request, exc: RateLimitExceeded) -> Response:
+    """slowapi's 429 response, counted first."""
+    metrics.RATE_LIMITED.labels(route=metrics.route_label(request.scope)).inc()
+    return _rate_limit_exceeded_handler(request, exc)
+
+
+# Rate limiter: the one shared instance. See app/limiter.py for why it lives there
+# rather than being constructed here. Attach it to app state and add the 429 handler.
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded)
 
 # CORS middleware for frontend access
 app.add_middleware(
@@ -136,5 +228,41 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health check for monitoring"""
-    return {"status": "healthy"}
+    """
+    Health check for monitoring.
+
+    Includes the connection pool's live counters, so a monitor polling this can tell a
+    burst queuing on the pool (`waiting` > 0) from a slow database. Reading them does not
+    touch the database.
+    """
+    return {"status": "healthy", "pool": pool_status()}
+
+
+if settings.ENABLE_METRICS:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        """Prometheus scrape endpoint. See app/metrics.py for what is recorded."""
+        return Response(generate_latest(metrics.REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+def require_admin(request: Request) -> None:
+    """
+    Bearer-token check for /admin routes.
+
+    With no ADMIN_TOKEN configured they answer 404, as if absent, rather than 403: there
+    is no credential that would work, so there is nothing to be forbidden from.
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(
+        token.encode(), settings.ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/admin/slow-queries", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def admin_slow_queries():
+    """Recent slow statements with their plans, oldest first. See app/slow_queries.py."""
+    return {"threshold_ms": slow_queries.threshold_ms, "data": slow_queries.records()}
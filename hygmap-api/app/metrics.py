@@ -0,0 +1,273 @@
+"""
+Prometheus metrics for the API, served at /metrics.
+
+Before this, the only performance signal was `duration_ms` in the JSON request logs, so
+a p99 meant scraping and parsing logs, and nothing at all recorded where inside a request
+the time went. Everything here is aggregated in-process and read on scrape.
+
+What feeds what:
+
+  * LoggingMiddleware (app/main.py) opens a RequestMetrics for each request and, when
+    the response is done, records the request count, duration and response size.
+  * instrument_engine() hooks SQLAlchemy's cursor events, so every statement's time is
+    charged to the route that ran it.
+  * Route handlers record what only they know: rows returned, time spent building and
+    serializing the response, and the bbox size class of a /api/stars query.
+  * ProxyAwareLimiter (app/limiter.py) times its own check as the "limiter" phase.
+  * InstrumentedPool (app/database.py) observes each connection checkout's wait.
+  * The RateLimitExceeded handler counts rejections.
+
+The same per-request phases -- db, build, ser, limiter -- are also returned to the
+caller in a Server-Timing header, so one slow request can be diagnosed from browser
+devtools or from PHP without access to this endpoint.
+
+Labels are route TEMPLATES ("/api/stars/{star_id}"), never raw paths, and requests that
+match no route share one "unmatched" label. A raw path label would create a time series
+per star id, and a scanner walking random URLs could grow this process without bound.
+
+The process runs a single uvicorn worker (see Dockerfile.prod). prometheus_client keeps
+per-process state, so running several workers would need its multiprocess mode.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# A private registry rather than prometheus_client's global one, so that what /metrics
+# exposes is exactly what is defined here.
+REGISTRY = CollectorRegistry()
+
+# Request latency buckets, in seconds. Dense below 100 ms, where healthy requests live:
+# a chunk query is tens of milliseconds and a catalog lookup is single digits.
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Upper bounds (parsecs) of the bbox size classes, by the box's longest side. 40 is the
+# React chunk loader's CHUNK_SIZE; 100 is the default view; 3000 is MAX_SPATIAL_RANGE.
+BBOX_CLASSES = (40, 100, 300, 1000, 3000)
+
+UNMATCHED_ROUTE = "unmatched"
+
+REQUESTS = Counter(
+    "hygmap_http_requests_total",
+    "HTTP requests, by route template and status code.",
+    ["method", "route", "status"],
+    registry=REGISTRY,
+)
+REQUEST_DURATION = Histogram(
+    "hygmap_http_request_duration_seconds",
+    "Time from request arrival to the last body byte sent. bbox is the size class of a "
+    "star box query's longest side in parsecs, or 'none' for every other request.",
+    ["method", "route", "bbox"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+RESPONSE_BYTES = Histogram(
+    "hygmap_http_response_bytes",
+    "Response body size.",
+    ["route"],
+    buckets=tuple(256 * 4**i for i in range(10)),  # 256 B .. 64 MiB
+    registry=REGISTRY,
+)
+DB_QUERY_DURATION = Histogram(
+    "hygmap_db_query_duration_seconds",
+    "Time per SQL statement, from cursor execute to result, by the route that ran it.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+DB_ROWS = Histogram(
+    "hygmap_db_rows_returned",
+    "Rows returned to a route handler by its query.",
+    ["route"],
+    buckets=(0, 1, 10, 100, 1000, 5000, 10000, 25000, 50000),
+    registry=REGISTRY,
+)
+SERIALIZATION_DURATION = Histogram(
+    "hygmap_serialization_duration_seconds",
+    "Time turning rows into a response: phase 'build' constructs the Pydantic models, "
+    "phase 'ser' dumps them to JSON.",
+    ["route", "phase"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+POOL_WAIT = Histogram(
+    "hygmap_db_pool_wait_seconds",
+    "Time a request waited to check out a database connection.",
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+RATE_LIMITED = Counter(
+    "hygmap_rate_limited_total",
+    "Requests rejected by the rate limiter, by route template.",
+    ["route"],
+    registry=REGISTRY,
+)
+
+
+class RequestMetrics:
+    """
+    Per-request accumulator, reachable from anywhere in the request via current().
+
+    Holds the ASGI scope rather than a route name, because the route is not known until
+    the router has run -- after the middleware that creates this.
+    """
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.bbox = "none"
+        # Seconds per named phase, for the Server-Timing header. Accumulated, because a
+        # request can run several statements.
+        self.phases: dict[str, float] = {}
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope)
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+def route_label(scope: dict) -> str:
+    """The matched route's template, or UNMATCHED_ROUTE."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def current() -> Optional[RequestMetrics]:
+    """The running request's metrics, or None outside a request."""
+    return _current.get()
+
+
+@contextmanager
+def track_request(scope: dict) -> Iterator[RequestMetrics]:
+    """Make a RequestMetrics current for the duration of one request."""
+    request_metrics = RequestMetrics(scope)
+    token = _current.set(request_metrics)
+    try:
+        yield request_metrics
+    finally:
+        _current.reset(token)
+
+
+def bbox_class(*extents: float) -> str:
+    """Size class label for a box, by its longest side."""
+    longest = max(extents)
+    for bound in BBOX_CLASSES:
+        if longest <= bound:
+            return str(bound)
+    return f">{BBOX_CLASSES[-1]}"
+
+
+def record_bbox(*extents: float) -> None:
+    request_metrics = current()
+    if request_metrics is not None:
+        request_metrics.bbox = bbox_class(*extents)
+
+
+def record_rows(count: int) -> None:
+    request_metrics = current()
+    route = request_metrics.route if request_metrics is not None else UNMATCHED_ROUTE
+    DB_ROWS.labels(route=route).observe(count)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Time a block as a named phase of the current request.
+
+    "build" and "ser" also feed SERIALIZATION_DURATION. Any name appears in the request's
+    Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        request_metrics = current()
+        route = UNMATCHED_ROUTE
+        if request_metrics is not None:
+            request_metrics.add_phase(name, elapsed)
+            route = request_metrics.route
+        if name in ("build", "ser"):
+            SERIALIZATION_DURATION.labels(route=route, phase=name).observe(elapsed)
+
+
+def server_timing(request_metrics: RequestMetrics, total_seconds: float) -> str:
+    """
+    A Server-Timing header value: each recorded phase, then `app` for the whole request
+    up to the moment the header is sent. Durations are milliseconds, per the spec.
+
+    Phases do not have to add up to `app`. The remainder is routing, validation,
+    middleware and, for a coalesced request, waiting on another request's query.
+    """
+    entries = [
+        f"{name};dur={seconds * 1000:.2f}" for name, seconds in request_metrics.phases.items()
+    ]
+    entries.append(f"app;dur={total_seconds * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def record_request(
+    method: str, scope: dict, status: Optional[int], seconds: float, body_bytes: int,
+    bbox: str = "none",
+) -> None:
+    route = route_label(scope)
+    REQUESTS.labels(method=method, route=route, status=str(status)).inc()
+    REQUEST_DURATION.labels(method=method, route=route, bbox=bbox).observe(seconds)
+    RESPONSE_BYTES.labels(route=route).observe(body_bytes)
+
+
+def instrument_engine(target: Engine) -> None:
+    """
+    Time every statement run on `target` (a sync Engine; pass AsyncEngine.sync_engine).
+
+    The start time is stashed on the execution context, which is per statement, so
+    concurrent statements on different connections cannot see each other's clocks.
+    """
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._hygmap_query_start = time.perf_counter()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_hygmap_query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        request_metrics = current()
+        if request_metrics is not None:
+            request_metrics.add_phase("db", elapsed)
+            route = request_metrics.route
+        else:
+            route = UNMATCHED_ROUTE
+        DB_QUERY_DURATION.labels(route=route).observe(elapsed)
+
+
+class PoolCollector:
+    """Connection pool gauges, read fresh from the pool at each scrape."""
+
+    def __init__(self, status: Callable[[], dict]):
+        self._status = status
+
+    def collect(self):
+        status = self._status()
+        for key, help_text in (
+            ("checked_out", "Connections currently serving a request."),
+            ("waiting", "Requests currently blocked waiting for a connection."),
+            ("overflow", "Connections open beyond DB_POOL_SIZE."),
+            ("size", "Configured pool size."),
+        ):
+            gauge = GaugeMetricFamily(f"hygmap_db_pool_{key}", help_text)
+            gauge.add_metric([], status[key])
+            yield gauge
@@ -21,10 +21,12 @@ class Signal(BaseModel):
     dec: Optional[float] = None
     frequency: Optional[float] = None
     notes: Optional[str] = None
-    x: float = Field(..., description="Galactic X coordinate in parsecs")
-    y: float = Field(..., description="Galactic Y coordinate in parsecs")
-    z: float = Field(..., description="Galactic Z coordinate in parsecs")
-    last_updated: Optional[datetime] = None
+    x: float = Field(..., description="Galactic X coordinate in parsecs, at last_updated")
+    y: float = Field(..., description="Galactic Y coordinate in parsecs, at last_updated")
+    z: float = Field(..., description="Galactic Z coordinate in parsecs, at last_updated")
+    last_updated: Optional[datetime] = Field(
+        None, description="The epoch x, y, z are computed for: the request's `at`, or now"
+    )
 
     @computed_field
     @property
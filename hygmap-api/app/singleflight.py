@@ -0,0 +1,97 @@
+"""
+Request coalescing for identical in-flight queries.
+
+When many callers ask the same question at the same moment, only one of them should ask
+the database. The PHP container renders every visitor's page server-side, so a popular
+view arrives as a burst of byte-identical `/api/stars` requests from one address; a fresh
+React load does the same for the default bounding box. Before this existed each of those
+took its own pooled connection and ran its own copy of the query, so a burst of N cost N
+queries and could drain the pool for everyone else.
+
+`flights.do(key, fn)` runs `fn` once per key at a time. The first caller (the leader)
+runs it; anyone arriving with the same key while it is running waits for the leader's
+result instead of starting their own. Nothing is cached: once the leader finishes, the
+key is forgotten and the next request runs the query again. This bounds concurrency per
+key, not freshness.
+
+What is shared should be immutable. Route handlers share serialized response bytes
+rather than a Response object, because middleware mutates response headers per request.
+
+Keys must capture everything that changes the answer. A key that omits a parameter hands
+one caller another caller's result -- wrong rather than slow, and silently so.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from app.config import settings
+
+T = TypeVar("T")
+
+
+class _LeaderCancelled(Exception):
+    """The leader went away before finishing; its waiters should try again themselves."""
+
+
+class SingleFlight:
+    """
+    At most one in-flight call per key; concurrent callers share its outcome.
+
+    Success and failure are both shared: if the leader's query raises, every waiter
+    raises the same exception, which is what running the same query N times would have
+    done anyway. Cancellation is the exception. A leader is cancelled when its own client
+    disconnects, which says nothing about anyone else's request, so waiters do not
+    inherit it -- the next one in line becomes the leader and runs the call afresh.
+    Waiters are themselves shielded, so one disconnecting waiter cannot cancel the call
+    the others are waiting on.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        """Number of keys with a call currently running."""
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        if not self.enabled:
+            return await fn()
+
+        while True:
+            pending = self._calls.get(key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except _LeaderCancelled:
+                continue
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Retrieve the outcome even if nobody waited for it, so an unshared failure does
+        # not surface later as "Future exception was never retrieved".
+        future.add_done_callback(_consume)
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+
+def _consume(future: asyncio.Future) -> Any:
+    if not future.cancelled():
+        future.exception()
+
+
+# The application's single coalescer. Keys are namespaced by route, so one instance
+# serves every endpoint; a second instance would merely split the bookkeeping.
+flights = SingleFlight(enabled=settings.SINGLE_FLIGHT_ENABLED)
@@ -0,0 +1,210 @@
+"""
+Slow-query capture, with the query plan taken automatically.
+
+FICTIONAL-SEARCH-PERFORMANCE (2026-07-31) is the case this exists for. One disjunct in
+search_stars' WHERE turned a `BitmapOr` over the trigram indexes into a walk of
+idx_athyg_absmag_bbox that filtered 2.8M rows, and a 2.4 ms query became a 19 s one. It
+was found by hand: someone noticed, reproduced the request, and ran EXPLAIN. The plan was
+the whole diagnosis, and by the time anyone looked, the request that showed it was gone.
+
+Now every statement that takes at least SLOW_QUERY_MS is recorded with its SQL, its
+bound parameters, the route and request id that ran it, and -- on PostgreSQL -- the
+output of `EXPLAIN (FORMAT JSON)` for the same statement and parameters. The record is
+logged as a warning and kept in a small ring buffer served at /admin/slow-queries.
+
+Statements that FAIL after the threshold are recorded too, with the error. That matters
+more than it sounds: SEARCH_STATEMENT_TIMEOUT_MS turns a runaway search into an error,
+and a timed-out query is the slowest query there is.
+
+Some properties worth keeping:
+
+  * The EXPLAIN runs after the slow statement has finished, as its own task, on its own
+    pooled connection. The request that was slow is not made slower by its diagnosis.
+  * EXPLAIN, never EXPLAIN ANALYZE: the plan is what the planner would choose now, got
+    without running the query a second time. ANALYZE on a 19 s query costs 19 s more.
+  * At most one EXPLAIN runs at a time. Slow queries come in bursts, usually because the
+    database is already struggling, and a burst of diagnostics competing for the same
+    pool would add to the problem it is diagnosing. Records that arrive while one is
+    running keep their SQL and parameters and note why they have no plan.
+  * Only SELECTs are explained. EXPLAIN of anything else is either meaningless (SET) or,
+    with ANALYZE, not side-effect free, and nothing here should have to reason about it.
+"""
+import asyncio
+import collections
+import datetime
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app import metrics
+from app.config import settings
+from app.logger import logger
+
+# Takes (statement, parameters) and returns the plan as decoded JSON.
+Explainer = Callable[[str, Any], Awaitable[Any]]
+
+
+def _jsonable(value: Any) -> Any:
+    """Bound parameters as something a JSON response can carry."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return repr(value)
+
+
+def _explainable(statement: str) -> bool:
+    head = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return head in ("SELECT", "WITH")
+
+
+class SlowQueryLog:
+    """
+    Ring buffer of recent slow statements, most recent last.
+
+    `explain` is injected rather than built in so the capture logic can be tested on the
+    SQLite suite, where there is no `EXPLAIN (FORMAT JSON)` to call. Without one, records
+    say that no plan is available rather than leaving the field silently empty.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        size: int = 50,
+        explain: Optional[Explainer] = None,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self._records: collections.deque = collections.deque(maxlen=max(size, 1))
+        self._explaining = False
+        self._tasks: set[asyncio.Task] = set()
+
+    def records(self) -> list[dict]:
+        return list(self._records)
+
+    def clear(self) -> None:
+        self._records.clear()
+
+    async def drain(self) -> None:
+        """Wait for pending EXPLAINs. For tests and shutdown."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def observe(
+        self,
+        statement: str,
+        parameters: Any,
+        seconds: float,
+        error: Optional[BaseException] = None,
+    ) -> Optional[dict]:
+        """Record the statement if it was slow. Returns the record, or None."""
+        duration_ms = seconds * 1000
+        if duration_ms < self.threshold_ms:
+            return None
+
+        request_metrics = metrics.current()
+        record = {
+            "at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "route": request_metrics.route if request_metrics else metrics.UNMATCHED_ROUTE,
+            "request_id": (
+                request_metrics.scope.get("state", {}).get("request_id")
+                if request_metrics else None
+            ),
+            "statement": statement,
+            "parameters": _jsonable(parameters),
+            "error": f"{type(error).__name__}: {error}" if error is not None else None,
+            "plan": None,
+            "plan_note": None,
+        }
+        self._records.append(record)
+        logger.warning(
+            "Slow query",
+            extra={k: record[k] for k in ("duration_ms", "route", "request_id", "statement", "error")},
+        )
+
+        if self.explain is None:
+            record["plan_note"] = "EXPLAIN (FORMAT JSON) needs PostgreSQL"
+        elif not _explainable(statement):
+            record["plan_note"] = "not a SELECT"
+        elif self._explaining:
+            record["plan_note"] = "skipped: another EXPLAIN was running"
+        else:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                record["plan_note"] = "no event loop to run EXPLAIN on"
+            else:
+                self._explaining = True
+                record["plan_note"] = "pending"
+                task = loop.create_task(self._explain(record, statement, parameters))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return record
+
+    async def _explain(self, record: dict, statement: str, parameters: Any) -> None:
+        try:
+            record["plan"] = await self.explain(statement, parameters)
+            record["plan_note"] = None
+            logger.warning(
+                "Slow query plan",
+                extra={"request_id": record["request_id"], "plan": record["plan"]},
+            )
+        except Exception as exc:
+            record["plan_note"] = f"EXPLAIN failed: {type(exc).__name__}: {exc}"
+        finally:
+            self._explaining = False
+
+    def install(self, target: AsyncEngine) -> None:
+        """Watch every statement run on `target`."""
+        sync_engine = target.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            context._hygmap_slow_query_start = time.perf_counter()
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, "_hygmap_slow_query_start", None)
+            if start is not None and not executemany:
+                self.observe(statement, parameters, time.perf_counter() - start)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def _error(exception_context):
+            context = exception_context.execution_context
+            start = getattr(context, "_hygmap_slow_query_start", None)
+            if start is not None and exception_context.statement is not None:
+                self.observe(
+                    exception_context.statement,
+                    exception_context.parameters,
+                    time.perf_counter() - start,
+                    error=exception_context.original_exception,
+                )
+
+
+def postgres_explainer(target: AsyncEngine) -> Explainer:
+    """EXPLAIN (FORMAT JSON) of a driver-level statement, on a connection of its own."""
+
+    async def explain(statement: str, parameters: Any) -> Any:
+        async with target.connect() as conn:
+            result = await conn.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters or ()
+            )
+            return result.scalar()
+
+    return explain
+
+
+def create_slow_query_log(target: AsyncEngine) -> SlowQueryLog:
+    log = SlowQueryLog(
+        threshold_ms=settings.SLOW_QUERY_MS,
+        size=settings.SLOW_QUERY_BUFFER_SIZE,
+        explain=postgres_explainer(target) if target.dialect.name == "postgresql" else None,
+    )
+    if settings.SLOW_QUERY_MS > 0:
+        log.install(target)
+    return log
@@ -0,0 +1,25 @@
+"""
+Load benchmark for the API: realistic traffic, latency percentiles, committed baselines.
+
+The latency figures this project quotes -- "±1000 1038->23ms" in 02_create_indexes.sql,
+"0.04-0.07s" for trigram search -- were each measured once, by hand, when the change that
+earned them went in. Nothing re-measured them afterwards, so nothing would have noticed
+a later change giving them back. This package is the re-measurement: the same traffic
+every time, summarised the same way, compared with bench/baselines.json.
+
+  * scenarios.py -- what is sent: chunk-loader sweeps at each LOD tier, PHP map pages at
+    limit 10000, search-box prefix bursts, detail lookups, the hand-measured boxes, and
+    a weighted mix of the client traffic.
+  * runner.py -- sending it, percentiles, the Server-Timing split, the comparison.
+  * catalog.py -- the synthetic catalog, shared with the plan tests (tests/plans).
+  * __main__.py -- `python -m bench`; `make bench` runs it against a throwaway Postgres
+    holding that catalog.
+
+Timings depend on the machine, so a baseline is only meaningful against runs on the same
+kind of machine and data; each recorded entry says where it came from. The AT-HYG 4.0
+medians quoted in 02_create_indexes.sql are kept in baselines.json under "reference",
+for reading alongside a run, and are never compared: they are another catalog on another
+machine. This is deliberately not part of CI, where shared runners make latency noise
+larger than the regressions worth catching. The plan tests (tests/plans) are the CI-safe
+half: they pin the plan shape that these numbers depend on.
+"""
@@ -0,0 +1,132 @@
+"""
+python -m bench -- run the load benchmark and compare it with bench/baselines.json.
+
+    make bench                                    # postgres:15 + synthetic catalog, in Docker
+    python -m bench --database-url postgresql+asyncpg://... --build-catalog 2000000
+    python -m bench --database-url ... --scenario chunks-lod0 typeahead --requests 500
+    python -m bench --url http://localhost:8000   # a running API, over the network
+    python -m bench ... --record                  # write this run over the baselines
+
+Exits 1 if any scenario regressed past --tolerance or had failed requests.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from bench.runner import compare, format_report, record, run_scenario
+from bench.scenarios import SCENARIOS
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(
+        prog="python -m bench", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    target = p.add_mutually_exclusive_group()
+    target.add_argument("--url", help="benchmark a running API over HTTP instead of in-process")
+    target.add_argument(
+        "--database-url",
+        default=os.environ.get("HYGMAP_BENCH_DATABASE_URL"),
+        help="database for the in-process app (default: $HYGMAP_BENCH_DATABASE_URL, "
+             "else the app's own DATABASE_URL)",
+    )
+    p.add_argument("--build-catalog", type=int, metavar="ROWS",
+                   help="first DROP and rebuild a synthetic catalog of ROWS stars in "
+                        "--database-url (the same one tests/plans uses)")
+    p.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS),
+                   help="scenarios to run (default: all)")
+    p.add_argument("--requests", type=int, default=200, help="recorded requests per scenario")
+    p.add_argument("--concurrency", type=int, default=6,
+                   help="requests in flight (default: the chunk loader's MAX_CONCURRENT_LOADS)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--max-id", type=int, default=2_000_000, help="highest star id for detail lookups")
+    p.add_argument("--baselines", default=BASELINES)
+    p.add_argument("--tolerance", type=float, default=None,
+                   help="allowed slowdown before a metric regresses (default: from the baselines file)")
+    p.add_argument("--record", action="store_true", help="write this run's numbers into --baselines")
+    p.add_argument("--environment", help="describes this machine in recorded baselines")
+    p.add_argument("--json", help="also write the results here")
+    return p.parse_args(argv)
+
+
+async def build_catalog(database_url: str, rows: int) -> None:
+    import asyncpg
+
+    from bench.catalog import build_script
+
+    conn = await asyncpg.connect(database_url.replace("postgresql+asyncpg://", "postgresql://", 1))
+    try:
+        for step in build_script(rows):
+            await conn.execute(step)
+    finally:
+        await conn.close()
+
+
+async def run(args) -> dict[str, dict]:
+    from httpx import ASGITransport, AsyncClient
+
+    if args.url:
+        client = AsyncClient(base_url=args.url, timeout=60)
+    else:
+        # Imported only now: settings are read from the environment main() prepared.
+        from app.main import app
+
+        client = AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    results = {}
+    async with client:
+        for name in args.scenario:
+            print(f"  {name}: {SCENARIOS[name].description}", file=sys.stderr)
+            results[name] = await run_scenario(
+                client, SCENARIOS[name], args.requests, args.concurrency,
+                seed=args.seed, max_id=args.max_id,
+            )
+    return results
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not args.url:
+        if args.database_url:
+            os.environ["DATABASE_URL"] = args.database_url
+        # The limiter would otherwise answer most of a benchmark with 429s.
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+    if args.build_catalog:
+        if not args.database_url:
+            sys.exit("--build-catalog needs --database-url or HYGMAP_BENCH_DATABASE_URL")
+        print(f"building a synthetic catalog of {args.build_catalog:,} rows", file=sys.stderr)
+        asyncio.run(build_catalog(args.database_url, args.build_catalog))
+
+    with open(args.baselines) as fh:
+        baselines = json.load(fh)
+    results = asyncio.run(run(args))
+
+    print(format_report(results, baselines))
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.record:
+        environment = args.environment or (
+            f"{args.url or 'in-process'}, concurrency {args.concurrency}, {args.requests} requests"
+        )
+        with open(args.baselines, "w") as fh:
+            json.dump(record(results, baselines, environment), fh, indent=2)
+            fh.write("\n")
+        print(f"\nrecorded {len(results)} scenarios in {args.baselines}")
+        return 0
+
+    tolerance = args.tolerance if args.tolerance is not None else baselines.get("tolerance", 0.25)
+    regressions, notes = compare(results, baselines, tolerance)
+    for note in notes:
+        print(f"note: {note}")
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
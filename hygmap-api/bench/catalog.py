@@ -0,0 +1,193 @@
+"""
+A synthetic athyg-shaped catalog for the plan tests and the benchmark, built inside Postgres.
+
+tests/plans and `python -m bench --build-catalog` both build from here, so the plans the
+tests pin are the plans the benchmark times.
+
+Plans depend on table size and on the statistics ANALYZE gathers, not on which stars are
+real, so what matters here is that the shape is right: millions of rows, the real DDL, and
+column distributions close enough to AT-HYG's that the planner faces the same choices.
+
+  * Positions reproduce the box selectivities measured on the real catalog and recorded
+    in 02_create_indexes.sql (0.27% of rows inside +-20 pc, 12.72% inside +-100, 81.57%
+    inside +-1000, ...): each star gets a half-width drawn from that measured CDF and is
+    placed on the surface of the cube of that half-width, so a +-w box query selects the
+    same share of this table as of AT-HYG. 1% of rows have no position, like the 25,342
+    with no usable parallax.
+  * absmag is rounded to 0.01, so it is massively tied as the real column is.
+  * Catalog ids are sparse in roughly the real proportions: hip on 4% of rows, hd on
+    12%, gaia and tyc on 90%, the rest rarer.
+  * Names are rare: a proper name on 1 row in 5,000, Bayer and Flamsteed on about 1 in
+    2,000 and 1 in 1,000. Star 3 is Sirius and is called Vulcan in world 1, so every
+    search in tests/plans/test_query_plans.py has exactly the matches it expects.
+
+Schema comes from db/sql itself -- 01_create_table.sql and 02_create_indexes.sql whole,
+and the CREATE statements for fic, signals and athyg_v3_ids lifted out of their import
+scripts -- so a change to the real DDL is what these tests see.
+"""
+import itertools
+import os
+import re
+
+from app.api.stars import MAX_SPATIAL_RANGE
+
+SQL_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "db", "sql")
+
+# A sample of real constellation abbreviations. The planner sees con's selectivity, not
+# its spelling, so the full 88 would change nothing.
+CONSTELLATIONS = (
+    "And", "Aql", "Aqr", "Ara", "Ari", "Aur", "Boo", "CMa", "CMi", "CVn", "Cap", "Car",
+    "Cas", "Cen", "Cep", "Cet", "Cyg", "Dra", "Eri", "Gem", "Her", "Hya", "Leo", "Lib",
+    "Lyr", "Oph", "Ori", "Peg", "Per", "Sco", "Sgr", "Tau", "UMa", "Vir",
+)
+GREEK = ("Alp", "Bet", "Gam", "Del", "Eps", "Zet", "Eta", "The", "Iot", "Kap")
+
+
+def sql_file(name: str) -> str:
+    with open(os.path.join(SQL_DIR, name)) as fh:
+        return fh.read()
+
+
+def measured_box_cdf() -> tuple[tuple[float, float], ...]:
+    """
+    (share of catalog, box half-width in pc) knots, read from the measurement recorded in
+    02_create_indexes.sql ("±20 pc 0.27%   ±50 2.80% ..."). That comment is the one copy
+    of the figures; db/scripts/generate_synthetic_catalog.py reads the same one. The last
+    knot is MAX_SPATIAL_RANGE: stars beyond it exist but no box query can reach them.
+    """
+    found = re.findall(r"±(\d+)(?: pc)? +([\d.]+)%", sql_file("02_create_indexes.sql"))
+    knots = [(round(float(pct) / 100, 6), float(width)) for width, pct in found]
+    if not knots or knots != sorted(knots):
+        raise ValueError(f"no box selectivities in 02_create_indexes.sql: {found}")
+    return ((0.0, 0.0), *knots, (1.0, MAX_SPATIAL_RANGE))
+
+
+def create_statements(name: str, *objects: str) -> str:
+    """
+    The CREATE TYPE/TABLE/INDEX statements for `objects` from an import script, without
+    the COPY steps around them that read files this harness does not have.
+    """
+    script = sql_file(name)
+    statements = []
+    for obj in objects:
+        match = re.search(
+            rf"^CREATE (?:TYPE|TABLE|INDEX(?: IF NOT EXISTS)?) {re.escape(obj)}\b.*?;\s*$",
+            script,
+            re.MULTILINE | re.DOTALL,
+        )
+        if match is None:
+            raise AssertionError(f"no CREATE for {obj} in db/sql/{name}")
+        statements.append(match.group(0))
+    return "\n".join(statements)
+
+
+BOX_CDF = measured_box_cdf()
+
+
+def _text_array(values) -> str:
+    return "ARRAY[" + ", ".join(f"'{v}'" for v in values) + "]"
+
+
+def _half_width_sql(u: str) -> str:
+    """Piecewise-linear inverse of BOX_CDF, as a SQL expression in the uniform `u`."""
+    arms = []
+    for (p0, w0), (p1, w1) in itertools.pairwise(BOX_CDF):
+        arms.append(f"WHEN {u} < {p1} THEN {w0} + {w1 - w0} * ({u} - {p0}) / {p1 - p0}")
+    return "CASE " + " ".join(arms) + f" ELSE {BOX_CDF[-1][1]} END"
+
+
+def populate_sql(rows: int) -> str:
+    """INSERTs that fill the already-created tables with `rows` synthetic stars."""
+    return f"""
+    INSERT INTO athyg (id, tyc, gaia, hyg, hip, hd, hr, gj, cns5, bayer, flam, con, proper,
+                       ra, dec, dist, x, y, z, mag, absmag, spect)
+    SELECT
+        id,
+        CASE WHEN id % 10 <> 6 THEN (id % 9537 + 1) || '-' || (id % 1000) || '-1' END,
+        CASE WHEN id % 10 <> 5 THEN (id::bigint * 7919)::text END,
+        CASE WHEN id % 25 = 0 THEN id / 25 END,
+        CASE WHEN id % 24 = 0 THEN (id / 24)::text END,
+        CASE WHEN id % 8 = 1 THEN (id / 8)::text END,
+        CASE WHEN id % 300 = 2 THEN (id / 300)::text END,
+        CASE WHEN id % 700 = 3 THEN (id / 700)::text END,
+        CASE WHEN id % 480 = 4 THEN (id / 480)::text END,
+        CASE WHEN id = 3 THEN 'Alp'
+             WHEN id % 1900 = 8 THEN ({_text_array(GREEK)})[1 + id % {len(GREEK)}] END,
+        CASE WHEN id % 1100 = 9 THEN (1 + id % 80)::text END,
+        CASE WHEN id = 3 THEN 'CMa'
+             ELSE ({_text_array(CONSTELLATIONS)})[1 + id % {len(CONSTELLATIONS)}] END,
+        CASE WHEN id = 3 THEN 'Sirius'
+             WHEN id % 5000 = 7 THEN 'Proper ' || id END,
+        360 * u1, 180 * u2 - 90,
+        CASE WHEN positioned THEN sqrt(x * x + y * y + z * z) END,
+        CASE WHEN positioned THEN x END,
+        CASE WHEN positioned THEN y END,
+        CASE WHEN positioned THEN z END,
+        CASE WHEN positioned
+             THEN round((absmag + 5 * log(greatest(sqrt(x * x + y * y + z * z), 0.01)) - 5)::numeric, 2)
+        END,
+        CASE WHEN positioned THEN absmag END,
+        (ARRAY['M3V', 'K5V', 'G2V', 'F5V', 'A0V', 'B3V', 'K0III'])[1 + id % 7]
+    FROM (
+        -- A point on a random face of the cube of half-width w.
+        SELECT
+            id, positioned, u1, u2, absmag,
+            CASE face WHEN 0 THEN side * w ELSE w * (2 * a - 1) END AS x,
+            CASE face WHEN 1 THEN side * w ELSE w * (2 * CASE face WHEN 0 THEN a ELSE b END - 1) END AS y,
+            CASE face WHEN 2 THEN side * w ELSE w * (2 * b - 1) END AS z
+        FROM (
+            SELECT *, {_half_width_sql("uw")} AS w
+            FROM (
+                SELECT
+                    g AS id,
+                    g % 100 <> 99 AS positioned,
+                    random() AS uw,
+                    floor(3 * random())::int AS face,
+                    CASE WHEN random() < 0.5 THEN -1 ELSE 1 END AS side,
+                    random() AS a,
+                    random() AS b,
+                    random() AS u1,
+                    random() AS u2,
+                    round((4 + 3 * sqrt(-2 * ln(1 - random())) * cos(2 * pi() * random()))::numeric, 2)
+                        AS absmag
+                FROM generate_series(1, {int(rows)}) g
+            ) drawn
+        ) placed
+    ) s;
+
+    INSERT INTO fic_worlds (id, name) VALUES (1, 'Star Trek'), (2, 'Babylon 5');
+    INSERT INTO fic (star_id, world_id, name) VALUES (3, 1, 'Vulcan');
+    INSERT INTO fic (star_id, world_id, name)
+    SELECT g * 9973, 1 + (g % 2), 'Fictional ' || g
+    FROM generate_series(1, 190) g
+    WHERE g * 9973 <= {int(rows)};
+
+    INSERT INTO athyg_v3_ids (v3_id, athyg_id, match_method)
+    SELECT id, id, 'synthetic' FROM athyg WHERE id % 3 <> 0;
+
+    -- The API places signals from time, ra and dec; x, y, z are the import's snapshot.
+    INSERT INTO signals (id, name, type, time, ra, dec, x, y, z)
+    SELECT g, 'Signal ' || g, (ARRAY['receive', 'transmit'])[1 + g % 2]::signal_type,
+           now() - g * interval '30 days', 24 * random(), 180 * random() - 90,
+           50 * random() - 25, 50 * random() - 25, 50 * random() - 25
+    FROM generate_series(1, 100) g;
+    """
+
+
+def build_script(rows: int) -> list[str]:
+    """Every step, in order, from an empty database to an analyzed synthetic catalog."""
+    return [
+        "DROP TABLE IF EXISTS signals, athyg_v3_ids, fic, fic_worlds, athyg CASCADE",
+        "DROP TYPE IF EXISTS signal_type",
+        sql_file("01_create_table.sql"),
+        create_statements("04_import_fic.sql", "fic_worlds", "fic"),
+        create_statements("05_import_signals.sql", "signal_type", "signals"),
+        create_statements("11_import_athyg_v3_ids.sql", "athyg_v3_ids"),
+        populate_sql(rows),
+        # Indexes after the data, unlike the real import, because building them once is
+        # several times faster than maintaining them through millions of inserts. The
+        # finished indexes are identical either way.
+        sql_file("02_create_indexes.sql"),
+        create_statements("11_import_athyg_v3_ids.sql", "idx_athyg_v3_ids_athyg_id"),
+        "ANALYZE",
+    ]
@@ -0,0 +1,176 @@
+"""
+Running scenarios, summarising them, and comparing the summary with the baselines.
+
+Latency is measured at the client, around the whole request. Each response's
+Server-Timing header (app/metrics.py) is parsed as well, so the summary can say how much
+of a slow request was the database and how much was everything else -- and so a "db"
+figure measured here is comparable with the query medians measured by hand with
+EXPLAIN ANALYZE, which have nothing else in them.
+"""
+import asyncio
+import time
+
+from httpx import AsyncClient
+
+from bench.scenarios import Scenario
+
+# Latency metrics regress upward, throughput downward.
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms", "db_p50_ms", "app_p50_ms")
+THROUGHPUT_METRICS = ("rps",)
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile; None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    """`db;dur=1.20, ser;dur=0.40` -> {"db": 1.2, "ser": 0.4}. Malformed entries are skipped."""
+    phases = {}
+    for entry in header.split(","):
+        name, _, rest = entry.strip().partition(";")
+        for param in rest.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    phases[name] = float(value)
+                except ValueError:
+                    pass
+    return phases
+
+
+async def run_scenario(
+    client: AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    seed: int = 0,
+    max_id: int = 2_000_000,
+    warmup: int = 10,
+) -> dict:
+    """
+    Send `requests` requests from `scenario` with `concurrency` in flight, after
+    `warmup` unrecorded ones to fill the pool and the caches. Returns the summary.
+    """
+    stream = scenario.requests(seed, max_id)
+    for _ in range(warmup):
+        path, params = next(stream)
+        await client.get(path, params=params)
+
+    latencies: list[float] = []
+    phases: dict[str, list[float]] = {}
+    statuses: dict[int, int] = {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            path, params = next(stream)
+            started = time.perf_counter()
+            response = await client.get(path, params=params)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            for name, ms in parse_server_timing(response.headers.get("server-timing", "")).items():
+                phases.setdefault(name, []).append(ms)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(scenario.concurrency or concurrency)))
+    return summarise(latencies, phases, statuses, time.perf_counter() - started)
+
+
+def summarise(
+    latencies: list[float],
+    phases: dict[str, list[float]],
+    statuses: dict[int, int],
+    elapsed: float,
+) -> dict:
+    def rounded(value):
+        return None if value is None else round(value, 2)
+
+    # 404 is an answer (a detail id that does not exist); 429 and 5xx are failures.
+    errors = sum(n for status, n in statuses.items() if status == 429 or status >= 500)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "rps": rounded(len(latencies) / elapsed if elapsed > 0 else None),
+        "p50_ms": rounded(percentile(latencies, 50)),
+        "p95_ms": rounded(percentile(latencies, 95)),
+        "p99_ms": rounded(percentile(latencies, 99)),
+        "max_ms": rounded(max(latencies) if latencies else None),
+        # Per-request sums of what Server-Timing reported; absent when it is disabled.
+        "db_p50_ms": rounded(percentile(phases.get("db", []), 50)),
+        "app_p50_ms": rounded(percentile(phases.get("app", []), 50)),
+    }
+
+
+def compare(results: dict[str, dict], baselines: dict, tolerance: float) -> tuple[list[str], list[str]]:
+    """
+    Check each result against its baseline. Returns (regressions, notes).
+
+    A latency regresses when it exceeds its baseline by more than `tolerance` (0.25 is
+    25%), throughput when it falls short by the same factor. Scenarios or metrics with
+    no baseline are noted, never failed: a new scenario has to be recorded once before it
+    can regress. The "reference" figures are only ever noted.
+    """
+    regressions, notes = [], []
+    recorded = baselines.get("scenarios", {})
+    for name, result in results.items():
+        if result["errors"]:
+            regressions.append(f"{name}: {result['errors']} of {result['requests']} requests failed")
+        baseline = recorded.get(name)
+        if not baseline:
+            notes.append(f"{name}: no baseline recorded")
+            reference = baselines.get("reference", {}).get("db_p50_ms", {}).get(name)
+            if reference is not None:
+                notes.append(f"{name}: AT-HYG 4.0 reference db_p50_ms {reference} (not compared)")
+            continue
+        for metric in LATENCY_METRICS:
+            expected, actual = baseline.get(metric), result.get(metric)
+            if expected is None or actual is None:
+                continue
+            if actual > expected * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {actual} > baseline {expected}")
+        for metric in THROUGHPUT_METRICS:
+            expected, actual = baseline.get(metric), result.get(metric)
+            if expected is None or actual is None:
+                continue
+            if actual < expected / (1 + tolerance):
+                regressions.append(f"{name}: {metric} {actual} < baseline {expected}")
+    return regressions, notes
+
+
+def record(results: dict[str, dict], baselines: dict, environment: str) -> dict:
+    """Baselines with `results` written over them. Unrun scenarios and `source` notes are kept."""
+    updated = dict(baselines)
+    scenarios = dict(updated.get("scenarios", {}))
+    for name, result in results.items():
+        entry = {metric: result[metric] for metric in (*LATENCY_METRICS, *THROUGHPUT_METRICS)
+                 if result.get(metric) is not None}
+        entry["source"] = f"recorded {time.strftime('%Y-%m-%d')}: {environment}"
+        scenarios[name] = entry
+    updated["scenarios"] = dict(sorted(scenarios.items()))
+    return updated
+
+
+def format_report(results: dict[str, dict], baselines: dict) -> str:
+    recorded = baselines.get("scenarios", {})
+    header = f"{'scenario':<14} {'reqs':>5} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'db p50':>8}   baseline p50/db"
+    lines = [header, "-" * len(header)]
+
+    def ms(value):
+        return "-" if value is None else f"{value:.1f}"
+
+    for name, r in results.items():
+        base = recorded.get(name, {})
+        lines.append(
+            f"{name:<14} {r['requests']:>5} {r['errors']:>4} {ms(r['rps']):>8} {ms(r['p50_ms']):>8} "
+            f"{ms(r['p95_ms']):>8} {ms(r['p99_ms']):>8} {ms(r['db_p50_ms']):>8}   "
+            f"{ms(base.get('p50_ms'))}/{ms(base.get('db_p50_ms'))}"
+        )
+    return "\n".join(lines)
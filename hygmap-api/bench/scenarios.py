@@ -0,0 +1,177 @@
+"""
+The traffic the benchmark sends, modelled on the clients that actually send it.
+
+Every scenario is an endless, seeded stream of (path, params) requests, so two runs with
+the same seed send the same requests in the same order. Where a number below is a
+client's constant, it is copied from that client, and the comment says where from: if
+the client changes, the scenario should change with it.
+"""
+import math
+import random
+from collections.abc import Callable, Iterator
+
+Request = tuple[str, dict]
+
+# hygmap-frontend/src/hooks/useChunkLoader.ts
+CHUNK_SIZE = 40
+LOD_LEVELS = ((40, 12), (80, 8), (120, 5), (math.inf, 3))  # (distance, magMax)
+CHUNK_LIMIT = 10000
+# Tier 3's distance is unbounded in the loader; in practice the view distance grows with
+# camera altitude and chunks out to a few hundred parsecs get requested.
+FAR_CHUNK_DISTANCE = 400
+
+# hygmap-php/src/ApiClient.php queryAll(), Request.php defaults, MapGeometry.php.
+PHP_LIMIT = 10000
+PHP_ORDER = "absmag asc"
+PHP_MAG_LIMIT = 20.0
+PHP_XY_ZOOMS_LY = (25, 25, 25, 100, 500, 2000)  # the default view, weighted as the commonest
+LY_PER_PC = 3.26156
+
+# hygmap-frontend/src/components/Toolbar.tsx: searches from the second character, limit 10.
+SEARCH_LIMIT = 10
+SEARCH_MIN_LENGTH = 2
+# Terms that hit each branch of /api/stars/search: trigram name search, Bayer +
+# constellation, the catalog-id lookups, and a fictional name.
+SEARCH_TERMS = (
+    ("sirius", 0), ("proper 7", 0), ("alp cma", 0), ("hip 240", 0), ("hd 1000", 0),
+    ("gj 12", 0), ("vulcan", 1),
+)
+
+# The boxes whose medians were measured by hand when idx_athyg_absmag_bbox went in (see
+# db/sql/02_create_indexes.sql): half-width -> limit.
+MEASURED_BOXES = {100: 10000, 250: 10000, 500: 10000, 1000: 10000, 1500: 50000}
+
+
+def box(xc: float, yc: float, zc: float, hx: float, hy: float, hz: float) -> dict:
+    return {
+        "xmin": round(xc - hx, 3), "xmax": round(xc + hx, 3),
+        "ymin": round(yc - hy, 3), "ymax": round(yc + hy, 3),
+        "zmin": round(zc - hz, 3), "zmax": round(zc + hz, 3),
+    }
+
+
+def chunk_requests(rng: random.Random, lod: int) -> Iterator[Request]:
+    """Chunk-loader sweeps: 40 pc cubes on the loader's grid, in one LOD tier's ring."""
+    near = LOD_LEVELS[lod - 1][0] if lod else 0
+    far = min(LOD_LEVELS[lod][0], FAR_CHUNK_DISTANCE)
+    reach = math.ceil(far / CHUNK_SIZE)
+    mag_max = LOD_LEVELS[lod][1]
+    while True:
+        cx, cy = rng.randint(-reach, reach - 1), rng.randint(-reach, reach - 1)
+        # Horizontal distance, as the loader measures it.
+        distance = math.hypot((cx + 0.5) * CHUNK_SIZE, (cy + 0.5) * CHUNK_SIZE)
+        if not near <= distance < far:
+            continue
+        cz = rng.randint(-2, 1)
+        half = CHUNK_SIZE / 2
+        params = box((cx + 0.5) * CHUNK_SIZE, (cy + 0.5) * CHUNK_SIZE, (cz + 0.5) * CHUNK_SIZE,
+                     half, half, half)
+        params.update(mag_max=mag_max, limit=CHUNK_LIMIT)
+        yield "/api/stars/", params
+
+
+def php_map_requests(rng: random.Random) -> Iterator[Request]:
+    """PHP queryAll(): one map page, 2:1 aspect, every star to magnitude 20, absmag order."""
+    while True:
+        xy = rng.choice(PHP_XY_ZOOMS_LY) / LY_PER_PC
+        params = box(rng.uniform(-10, 10), rng.uniform(-10, 10), rng.uniform(-5, 5), xy, 2 * xy, xy)
+        params.update(
+            mag_max=PHP_MAG_LIMIT,
+            world_id=rng.choice((0, 0, 0, 1)),
+            order=PHP_ORDER,
+            limit=PHP_LIMIT,
+        )
+        yield "/api/stars/", params
+
+
+def measured_box_requests(half_width: int) -> Iterator[Request]:
+    params = box(0, 0, 0, half_width, half_width, half_width)
+    params["limit"] = MEASURED_BOXES[half_width]
+    while True:
+        yield "/api/stars/", dict(params)
+
+
+def typeahead_requests(rng: random.Random) -> Iterator[Request]:
+    """A burst per term: every prefix from the second character, as someone types it."""
+    while True:
+        term, world_id = rng.choice(SEARCH_TERMS)
+        for end in range(SEARCH_MIN_LENGTH, len(term) + 1):
+            yield "/api/stars/search", {"q": term[:end], "limit": SEARCH_LIMIT, "world_id": world_id}
+
+
+def detail_requests(rng: random.Random, max_id: int) -> Iterator[Request]:
+    """The star panel: one star by id."""
+    while True:
+        yield f"/api/stars/{rng.randint(1, max_id)}", {"world_id": rng.choice((0, 0, 1))}
+
+
+def mixed_requests(rng: random.Random, max_id: int) -> Iterator[Request]:
+    """
+    The client scenarios interleaved, weighted toward the chunk loader, which is most of the
+    API's traffic: one camera move is a sweep of chunk requests, a page view is one.
+    """
+    streams = [
+        (chunk_requests(rng, 0), 25), (chunk_requests(rng, 1), 15),
+        (chunk_requests(rng, 2), 10), (chunk_requests(rng, 3), 10),
+        (php_map_requests(rng), 10), (typeahead_requests(rng), 20),
+        (detail_requests(rng, max_id), 10),
+    ]
+    generators, weights = zip(*streams, strict=True)
+    while True:
+        yield next(rng.choices(generators, weights)[0])
+
+
+class Scenario:
+    """
+    A named request stream. `concurrency`, when set, overrides the run's: the measured
+    boxes run one at a time, because identical concurrent requests are coalesced by
+    app/singleflight.py and would measure the coalescing, not the query.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        stream: Callable[[random.Random, int], Iterator[Request]],
+        concurrency: int | None = None,
+    ):
+        self.name = name
+        self.description = description
+        self.stream = stream
+        self.concurrency = concurrency
+
+    def requests(self, seed: int, max_id: int) -> Iterator[Request]:
+        # Seeded per scenario, so selecting a subset does not change what each one sends.
+        return self.stream(random.Random(f"{seed}:{self.name}"), max_id)
+
+
+def _chunks(lod: int) -> Scenario:
+    distance, mag_max = LOD_LEVELS[lod]
+    ring = f"{LOD_LEVELS[lod - 1][0] if lod else 0}-{FAR_CHUNK_DISTANCE if distance == math.inf else distance} pc"
+    return Scenario(
+        f"chunks-lod{lod}",
+        f"chunk loader, LOD tier {lod}: 40 pc cubes at {ring}, mag_max {mag_max}",
+        lambda rng, max_id: chunk_requests(rng, lod),
+    )
+
+
+def _measured_box(half_width: int) -> Scenario:
+    return Scenario(
+        f"box-{half_width}",
+        f"+-{half_width} pc box, absmag order, limit {MEASURED_BOXES[half_width]}",
+        lambda rng, max_id: measured_box_requests(half_width),
+        concurrency=1,
+    )
+
+
+SCENARIOS = {
+    s.name: s
+    for s in (
+        *(_chunks(lod) for lod in range(len(LOD_LEVELS))),
+        Scenario("php-map", "PHP queryAll map page, limit 10000", lambda rng, max_id: php_map_requests(rng)),
+        Scenario("typeahead", "search-box prefix bursts, limit 10", lambda rng, max_id: typeahead_requests(rng)),
+        Scenario("detail", "star detail by id", detail_requests),
+        *(_measured_box(w) for w in MEASURED_BOXES),
+        Scenario("mixed", "the client scenarios interleaved, weighted as real traffic", mixed_requests),
+    )
+}
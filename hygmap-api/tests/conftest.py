@@ -7,11 +7,12 @@ Uses an in-memory SQLite database for testing instead of PostgreSQL.
 import pytest
 from typing import AsyncGenerator
 from httpx import AsyncClient, ASGITransport
-from sqlalchemy import text
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 
 from app.main import app
-from app.database import get_db
+from app.database import LazySession, get_db
+from app.metrics import instrument_engine
 
 
 # Create in-memory SQLite engine for testing
@@ -21,6 +22,8 @@ test_engine = create_async_engine(
     TEST_DATABASE_URL,
     echo=False,
 )
+# Statement timing, as on the production engine, so /metrics tests see real queries.
+instrument_engine(test_engine.sync_engine)
 
 TestSessionLocal = async_sessionmaker(
     test_engine,
@@ -29,13 +32,13 @@ TestSessionLocal = async_sessionmaker(
 )
 
 
-async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
+async def override_get_db() -> AsyncGenerator[LazySession, None]:
     """Override database dependency with test database"""
-    async with TestSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+    handle = LazySession(TestSessionLocal)
+    try:
+        yield handle
+    finally:
+        await handle.release()
 
 
 @pytest.fixture(scope="session")
@@ -263,3 +266,16 @@ async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
         yield client
 
     app.dependency_overrides.clear()
+
+
+@pytest.fixture(scope="function")
+def pool_checkouts() -> list:
+    """Record every connection checkout on the test engine while a test runs."""
+    seen: list = []
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        seen.append(connection_record)
+
+    event.listen(test_engine.sync_engine, "checkout", on_checkout)
+    yield seen
+    event.remove(test_engine.sync_engine, "checkout", on_checkout)
@@ -0,0 +1,163 @@
+"""
+Fixtures for the query-plan suite: a real Postgres holding a synthetic catalog.
+
+Where the database comes from, in order:
+
+  1. HYGMAP_PLAN_DATABASE_URL, an asyncpg URL (`make test-plans` starts a postgres:15
+     container and sets this). The harness DROPs and rebuilds its tables there, so never
+     point it at a database you care about.
+  2. A throwaway cluster started with the local `initdb`/`pg_ctl`, when those are on PATH
+     (or under /usr/lib/postgresql/*/bin).
+  3. Neither: the suite skips. It is the one part of tests/ that needs more than SQLite,
+     and `make test-api` runs without Postgres by design.
+
+HYGMAP_PLAN_ROWS sets the catalog size, 2,000,000 by default. Much smaller and the plans
+stop being the production ones: at 100k rows a sequential scan is often honestly cheaper,
+and the tests would be pinning the wrong shape.
+"""
+import asyncio
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from collections.abc import AsyncGenerator, Iterator
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import LazySession, get_db
+from app.main import app
+from app.slow_queries import postgres_explainer
+from bench.catalog import build_script
+
+PLAN_ROWS = int(os.environ.get("HYGMAP_PLAN_ROWS", "2000000"))
+
+
+def _pg_bin(name: str):
+    found = shutil.which(name)
+    if found:
+        return found
+    candidates = sorted(glob.glob(f"/usr/lib/postgresql/*/bin/{name}"))
+    return candidates[-1] if candidates else None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def plan_database_url() -> Iterator[str]:
+    url = os.environ.get("HYGMAP_PLAN_DATABASE_URL")
+    if url:
+        yield url
+        return
+
+    initdb, pg_ctl = _pg_bin("initdb"), _pg_bin("pg_ctl")
+    if not (initdb and pg_ctl):
+        pytest.skip(
+            "query-plan tests need Postgres: set HYGMAP_PLAN_DATABASE_URL, put "
+            "initdb/pg_ctl on PATH, or run `make test-plans`"
+        )
+
+    datadir = tempfile.mkdtemp(prefix="hygmap-plans-")
+    port = _free_port()
+    subprocess.run(
+        [initdb, "-D", datadir, "-U", "postgres", "-A", "trust", "--no-sync"],
+        check=True, capture_output=True,
+    )
+    subprocess.run(
+        [pg_ctl, "-D", datadir, "-w", "-l", os.path.join(datadir, "server.log"), "-o",
+         f"-p {port} -k {datadir} -c listen_addresses=127.0.0.1 -c fsync=off", "start"],
+        check=True, capture_output=True,
+    )
+    try:
+        yield f"postgresql+asyncpg://postgres@127.0.0.1:{port}/postgres"
+    finally:
+        subprocess.run([pg_ctl, "-D", datadir, "-m", "immediate", "stop"], capture_output=True)
+        shutil.rmtree(datadir, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def plan_catalog(plan_database_url: str) -> str:
+    """Build the synthetic catalog once per session. Returns the database URL."""
+    import asyncpg
+
+    async def build():
+        dsn = plan_database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+        conn = await asyncpg.connect(dsn)
+        try:
+            for step in build_script(PLAN_ROWS):
+                await conn.execute(step)
+        finally:
+            await conn.close()
+
+    started = time.perf_counter()
+    asyncio.run(build())
+    print(f"\nsynthetic catalog: {PLAN_ROWS:,} rows in {time.perf_counter() - started:.1f}s")
+    return plan_database_url
+
+
+class PlanRecorder:
+    """
+    Captures every statement the app runs and explains the SELECTs on demand.
+
+    Requests go through the real app, so the SQL being planned is exactly what the route
+    handlers send -- there is no copy of any query in this suite to drift out of date.
+    """
+
+    def __init__(self, engine, client: AsyncClient):
+        self.client = client
+        self.statements: list[tuple[str, object]] = []
+        self._explain = postgres_explainer(engine)
+
+    async def get(self, path: str, **params) -> list[dict]:
+        """Make the request and return the plan of each SELECT it ran, in order."""
+        self.statements.clear()
+        response = await self.client.get(path, params=params)
+        assert response.status_code == 200, response.text
+        plans = []
+        for statement, parameters in list(self.statements):
+            if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                plan = await self._explain(statement, parameters)
+                plans.append(plan[0]["Plan"])
+        assert plans, f"{path} ran no SELECT"
+        return plans
+
+
+@pytest.fixture
+async def plans(plan_catalog: str) -> AsyncGenerator[PlanRecorder, None]:
+    engine = create_async_engine(plan_catalog)
+    # Connect once before capturing, so the dialect's own first-connect queries (server
+    # version, schema) are not mistaken for the app's.
+    async with engine.connect():
+        pass
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        handle = LazySession(session_factory)
+        try:
+            yield handle
+        finally:
+            await handle.release()
+
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test", follow_redirects=True
+    ) as client:
+        recorder = PlanRecorder(engine, client)
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def _capture(conn, cursor, statement, parameters, context, executemany):
+            recorder.statements.append((statement, parameters))
+
+        yield recorder
+
+    app.dependency_overrides.clear()
+    await engine.dispose()
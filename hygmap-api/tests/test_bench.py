@@ -0,0 +1,118 @@
+"""
+The load benchmark (bench/): its arithmetic, and that every scenario sends requests the
+API accepts.
+
+Timings are not asserted -- on SQLite and a shared machine they would mean nothing. What
+is asserted is what would make the numbers wrong without anyone noticing: a scenario whose
+requests all fail validation would benchmark the 422 path at impressive speed.
+"""
+import itertools
+import json
+import random
+
+import pytest
+from httpx import AsyncClient
+
+from bench.__main__ import BASELINES
+from bench.runner import compare, parse_server_timing, percentile, record, run_scenario, summarise
+from bench.scenarios import LOD_LEVELS, SCENARIOS, chunk_requests, typeahead_requests
+
+
+class TestArithmetic:
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile(values, 100) == 100
+        assert percentile([7.0], 99) == 7.0
+        assert percentile([], 50) is None
+
+    def test_server_timing_is_parsed_by_phase(self):
+        header = "limiter;dur=0.05, db;dur=12.40, ser;dur=3.10, app;dur=16.00"
+        assert parse_server_timing(header) == {"limiter": 0.05, "db": 12.4, "ser": 3.1, "app": 16.0}
+        assert parse_server_timing("") == {}
+        assert parse_server_timing("db;desc=x, ser;dur=oops") == {}
+
+    def test_rate_limited_and_server_errors_count_as_failures(self):
+        summary = summarise([1.0] * 4, {}, {200: 1, 404: 1, 429: 1, 503: 1}, 1.0)
+        assert summary["errors"] == 2
+
+
+class TestCompare:
+    BASELINES = {"scenarios": {"box-1000": {"p50_ms": 100.0, "db_p50_ms": 20.0, "rps": 50.0}}}
+
+    def result(self, **overrides):
+        base = {"requests": 10, "errors": 0, "p50_ms": 100.0, "db_p50_ms": 20.0, "rps": 50.0}
+        return {**base, **overrides}
+
+    def test_within_tolerance_passes(self):
+        regressions, _ = compare({"box-1000": self.result(p50_ms=124.0, rps=41.0)}, self.BASELINES, 0.25)
+        assert regressions == []
+
+    def test_slower_latency_regresses(self):
+        regressions, _ = compare({"box-1000": self.result(db_p50_ms=26.0)}, self.BASELINES, 0.25)
+        assert regressions == ["box-1000: db_p50_ms 26.0 > baseline 20.0"]
+
+    def test_lower_throughput_regresses(self):
+        regressions, _ = compare({"box-1000": self.result(rps=30.0)}, self.BASELINES, 0.25)
+        assert regressions == ["box-1000: rps 30.0 < baseline 50.0"]
+
+    def test_unrecorded_scenario_is_noted_not_failed(self):
+        regressions, notes = compare({"detail": self.result()}, self.BASELINES, 0.25)
+        assert regressions == []
+        assert notes == ["detail: no baseline recorded"]
+
+    def test_reference_figures_are_noted_never_compared(self):
+        baselines = {**self.BASELINES, "reference": {"db_p50_ms": {"box-100": 161}}}
+        regressions, notes = compare({"box-100": self.result(db_p50_ms=900.0)}, baselines, 0.25)
+        assert regressions == []
+        assert notes[-1] == "box-100: AT-HYG 4.0 reference db_p50_ms 161 (not compared)"
+
+    def test_committed_baselines_compare_like_with_like(self):
+        """Every committed baseline was recorded by `--record`, not copied from elsewhere."""
+        with open(BASELINES) as fh:
+            committed = json.load(fh)
+        for name, entry in committed["scenarios"].items():
+            assert entry["source"].startswith("recorded "), name
+
+    def test_failed_requests_always_regress(self):
+        regressions, _ = compare({"detail": self.result(errors=3)}, self.BASELINES, 0.25)
+        assert regressions == ["detail: 3 of 10 requests failed"]
+
+    def test_record_overwrites_only_what_ran(self):
+        updated = record({"detail": self.result()}, self.BASELINES, "laptop")
+        assert updated["scenarios"]["box-1000"] == self.BASELINES["scenarios"]["box-1000"]
+        assert updated["scenarios"]["detail"]["p50_ms"] == 100.0
+        assert "laptop" in updated["scenarios"]["detail"]["source"]
+
+
+class TestScenarios:
+    @pytest.mark.parametrize("lod", range(len(LOD_LEVELS)))
+    def test_chunks_are_loader_cubes_in_their_tier(self, lod):
+        for _, params in itertools.islice(chunk_requests(random.Random(0), lod), 50):
+            assert params["xmax"] - params["xmin"] == 40
+            assert params["xmin"] % 40 == 0
+            assert params["mag_max"] == LOD_LEVELS[lod][1]
+
+    def test_typeahead_sends_every_prefix_from_two_characters(self):
+        queries = [p["q"] for _, p in itertools.islice(typeahead_requests(random.Random(1)), 40)]
+        assert all(len(q) >= 2 for q in queries)
+        assert len(queries[0]) == 2
+        assert queries[1].startswith(queries[0]) and len(queries[1]) == 3
+
+    def test_streams_are_reproducible(self):
+        for scenario in SCENARIOS.values():
+            a = list(itertools.islice(scenario.requests(3, 1000), 20))
+            b = list(itertools.islice(scenario.requests(3, 1000), 20))
+            assert a == b
+
+    @pytest.mark.parametrize("name", sorted(SCENARIOS))
+    async def test_every_scenario_is_accepted_by_the_api(self, client: AsyncClient, name):
+        summary = await run_scenario(client, SCENARIOS[name], requests=12, concurrency=3, max_id=20, warmup=2)
+        assert summary["requests"] == 12
+        assert summary["errors"] == 0
+        # 200, or 404 for a detail id the fixture does not have -- never a 422.
+        assert set(summary["statuses"]) <= {"200", "404"}
+        assert summary["p50_ms"] > 0
+        assert summary["app_p50_ms"] is not None
+
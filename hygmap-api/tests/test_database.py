@@ -0,0 +1,150 @@
+"""
+Connection pool configuration and instrumentation (app/database.py).
+
+The API tests run on SQLite, so nothing here proves asyncpg honours the statement-cache
+arguments -- that is asyncpg's contract. What is checked is that settings reach the engine
+as the arguments they are meant to be, and that the pool counters move under a real
+checkout rather than reporting zeros forever.
+"""
+import asyncio
+
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import Settings
+from app.database import (
+    InstrumentedPool,
+    LazySession,
+    engine,
+    engine_options,
+    pool_status,
+)
+from tests.conftest import TestSessionLocal
+
+
+class TestEngineOptions:
+    def test_defaults_match_sqlalchemys(self):
+        # The defaults were kept deliberately; changing them should be a decision.
+        options = engine_options(Settings())
+        assert options["pool_size"] == 5
+        assert options["max_overflow"] == 10
+        assert options["pool_timeout"] == 30.0
+        assert options["poolclass"] is InstrumentedPool
+
+    def test_pool_settings_come_from_environment(self, monkeypatch):
+        monkeypatch.setenv("DB_POOL_SIZE", "20")
+        monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+        monkeypatch.setenv("DB_POOL_RECYCLE", "1800")
+        monkeypatch.setenv("DB_POOL_PRE_PING", "True")
+        options = engine_options(Settings())
+        assert options["pool_size"] == 20
+        assert options["max_overflow"] == 0
+        assert options["pool_recycle"] == 1800
+        assert options["pool_pre_ping"] is True
+
+    def test_statement_cache_size_reaches_both_caches(self, monkeypatch):
+        monkeypatch.setenv("DB_STATEMENT_CACHE_SIZE", "250")
+        connect_args = engine_options(Settings())["connect_args"]
+        assert connect_args["statement_cache_size"] == 250
+        assert connect_args["prepared_statement_cache_size"] == 250
+
+    def test_pgbouncer_mode_disables_caches_and_names_statements_uniquely(
+        self, monkeypatch
+    ):
+        monkeypatch.setenv("DB_PGBOUNCER", "True")
+        monkeypatch.setenv("DB_STATEMENT_CACHE_SIZE", "250")
+        connect_args = engine_options(Settings())["connect_args"]
+        assert connect_args["statement_cache_size"] == 0
+        assert connect_args["prepared_statement_cache_size"] == 0
+        name = connect_args["prepared_statement_name_func"]
+        assert name() != name()
+
+    def test_non_asyncpg_url_gets_no_asyncpg_arguments(self, monkeypatch):
+        # aiosqlite would reject statement_cache_size at connect time.
+        monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+        assert "connect_args" not in engine_options(Settings())
+
+    def test_app_engine_uses_the_instrumented_pool(self):
+        assert isinstance(engine.pool, InstrumentedPool)
+
+
+class TestPoolStatus:
+    async def test_counters_track_a_real_checkout(self, tmp_path):
+        target = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+            poolclass=InstrumentedPool,
+            pool_size=1,
+            max_overflow=0,
+        )
+        try:
+            async with target.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                status = pool_status(target)
+                assert status["checked_out"] == 1
+                assert status["waiting"] == 0
+
+            status = pool_status(target)
+            assert status["checked_out"] == 0
+            assert status["checkouts_total"] == 1
+        finally:
+            await target.dispose()
+
+    async def test_waiters_are_counted_while_the_pool_is_exhausted(self, tmp_path):
+        target = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+            poolclass=InstrumentedPool,
+            pool_size=1,
+            max_overflow=0,
+        )
+        try:
+            async with target.connect():
+                blocked = asyncio.create_task(target.connect().start())
+                for _ in range(50):
+                    await asyncio.sleep(0.01)
+                    if pool_status(target)["waiting"]:
+                        break
+                assert pool_status(target)["waiting"] == 1
+            conn = await blocked
+            await conn.close()
+            assert pool_status(target)["waiting"] == 0
+        finally:
+            await target.dispose()
+
+
+class TestLazySession:
+    async def test_nothing_is_opened_until_a_query_runs(self, db_session, pool_checkouts):
+        handle = LazySession(TestSessionLocal)
+        assert handle.bind is not None
+        assert not handle.active
+        await handle.release()
+        assert pool_checkouts == []
+
+    async def test_results_stay_readable_after_release(self, db_session):
+        handle = LazySession(TestSessionLocal)
+        result = await handle.execute(text("SELECT id FROM athyg WHERE id <= 3 ORDER BY id"))
+        assert handle.active
+        await handle.release()
+        assert not handle.active
+        assert [row.id for row in result] == [1, 2, 3]
+
+    async def test_rejected_request_never_touches_the_pool(
+        self, client: AsyncClient, pool_checkouts
+    ):
+        # The validation 400s come before any SQL. They must cost no connection.
+        response = await client.get("/api/stars", params={"xmin": 10, "xmax": 5})
+        assert response.status_code == 400
+        response = await client.get("/api/signals", params={"order": "id desc"})
+        assert response.status_code == 400
+        assert pool_checkouts == []
+
+    async def test_served_request_checks_out_once(self, client: AsyncClient, pool_checkouts):
+        response = await client.get("/api/stars")
+        assert response.status_code == 200
+        assert len(pool_checkouts) == 1
+
+
+async def test_health_reports_pool_counters(client: AsyncClient):
+    payload = (await client.get("/health")).json()
+    assert payload["status"] == "healthy"
+    assert {"checked_out", "waiting", "overflow"} <= payload["pool"].keys()
@@ -0,0 +1,58 @@
+"""
+The JSON log pipeline (app/logger.py): records leave the caller on a queue and are
+formatted and written by a listener thread.
+"""
+import io
+import json
+import logging
+from logging.handlers import QueueHandler
+
+from app import logger as logger_module
+
+
+def _drain():
+    # The listener thread writes asynchronously; stopping it flushes the queue.
+    logger_module.shutdown_logging()
+
+
+def test_logger_only_enqueues():
+    handlers = logging.getLogger("hygmap").handlers
+    assert len(handlers) == 1
+    assert isinstance(handlers[0], QueueHandler)
+
+
+def test_records_reach_stdout_as_json_with_tracebacks(monkeypatch):
+    out = io.StringIO()
+    monkeypatch.setattr("sys.stdout", out)
+    log = logger_module.setup_logging()
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.error("Request failed", extra={"request_id": "r1"}, exc_info=True)
+        _drain()
+        record = json.loads(out.getvalue().strip().splitlines()[-1])
+        assert record["message"] == "Request failed"
+        assert record["request_id"] == "r1"
+        assert record["level"] == "ERROR"
+        assert "ValueError: boom" in record["exc_info"]
+    finally:
+        monkeypatch.undo()
+        logger_module.setup_logging()
+
+
+def test_message_args_are_frozen_at_the_call(monkeypatch):
+    # Formatting happens later, on another thread; a mutable argument changed after the
+    # call must not change what was logged.
+    out = io.StringIO()
+    monkeypatch.setattr("sys.stdout", out)
+    log = logger_module.setup_logging()
+    try:
+        items = ["a"]
+        log.info("items=%s", items)
+        items.append("b")
+        _drain()
+        assert json.loads(out.getvalue().strip())["message"] == "items=['a']"
+    finally:
+        monkeypatch.undo()
+        logger_module.setup_logging()
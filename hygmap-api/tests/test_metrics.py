@@ -0,0 +1,129 @@
+"""
+/metrics (app/metrics.py).
+
+Asserted through the real ASGI stack, because every feed into these metrics is wiring --
+middleware, a SQLAlchemy event, a handler call -- and wiring is what silently stops.
+Counters are process-global and only ever grow, so tests compare before and after
+rather than expecting absolute values.
+"""
+from httpx import AsyncClient
+from prometheus_client.parser import text_string_to_metric_families
+
+from app.config import settings
+from app.metrics import RequestMetrics, bbox_class, server_timing
+
+
+async def _scrape(client: AsyncClient) -> dict:
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    samples = {}
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            key = (sample.name, tuple(sorted(sample.labels.items())))
+            samples[key] = sample.value
+    return samples
+
+
+def _value(samples: dict, name: str, **labels) -> float:
+    return samples.get((name, tuple(sorted(labels.items()))), 0.0)
+
+
+class TestRequestMetrics:
+    async def test_request_is_counted_under_its_route_template(self, client: AsyncClient):
+        labels = {"method": "GET", "route": "/api/stars/{star_id}", "status": "200"}
+        before = _value(await _scrape(client), "hygmap_http_requests_total", **labels)
+        await client.get("/api/stars/3")
+        await client.get("/api/stars/4")
+        after = _value(await _scrape(client), "hygmap_http_requests_total", **labels)
+        # Two different ids, one series: the label is the template, not the path.
+        assert after - before == 2
+
+    async def test_unknown_paths_share_one_label(self, client: AsyncClient):
+        labels = {"method": "GET", "route": "unmatched", "status": "404"}
+        before = _value(await _scrape(client), "hygmap_http_requests_total", **labels)
+        await client.get("/no/such/path")
+        await client.get("/another/one")
+        after = _value(await _scrape(client), "hygmap_http_requests_total", **labels)
+        assert after - before == 2
+
+    async def test_star_box_latency_is_bucketed_by_bbox_size(self, client: AsyncClient):
+        labels = {"method": "GET", "route": "/api/stars/", "bbox": "100"}
+        name = "hygmap_http_request_duration_seconds_count"
+        before = _value(await _scrape(client), name, **labels)
+        await client.get("/api/stars/")  # default box: 100 pc per side
+        after = _value(await _scrape(client), name, **labels)
+        assert after - before == 1
+
+    async def test_query_rows_serialization_and_bytes_are_recorded(self, client: AsyncClient):
+        route = {"route": "/api/stars/"}
+        names = (
+            "hygmap_db_query_duration_seconds_count",
+            "hygmap_db_rows_returned_sum",
+            "hygmap_http_response_bytes_sum",
+        )
+        serialization = "hygmap_serialization_duration_seconds_count"
+        before = await _scrape(client)
+        response = await client.get("/api/stars/")
+        after = await _scrape(client)
+        deltas = {n: _value(after, n, **route) - _value(before, n, **route) for n in names}
+        assert deltas["hygmap_db_query_duration_seconds_count"] == 1
+        assert deltas["hygmap_db_rows_returned_sum"] == response.json()["length"]
+        assert deltas["hygmap_http_response_bytes_sum"] == len(response.content)
+        for phase in ("build", "ser"):
+            labels = {**route, "phase": phase}
+            assert _value(after, serialization, **labels) - _value(
+                before, serialization, **labels
+            ) == 1
+
+    async def test_pool_gauges_are_exposed(self, client: AsyncClient):
+        samples = await _scrape(client)
+        assert ("hygmap_db_pool_waiting", ()) in samples
+        assert ("hygmap_db_pool_checked_out", ()) in samples
+
+
+class TestBboxClass:
+    def test_classes_by_longest_side(self):
+        assert bbox_class(40, 40, 40) == "40"
+        assert bbox_class(40, 41, 10) == "100"
+        assert bbox_class(3000, 1, 1) == "3000"
+        assert bbox_class(3001, 1, 1) == ">3000"
+
+
+def _server_timing(response) -> dict:
+    """Parse a Server-Timing header into {name: milliseconds}."""
+    entries = {}
+    for entry in response.headers["server-timing"].split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        entries[name] = float(duration)
+    return entries
+
+
+class TestServerTiming:
+    async def test_star_list_reports_every_phase(self, client: AsyncClient):
+        response = await client.get("/api/stars/")
+        timings = _server_timing(response)
+        assert {"db", "build", "ser", "limiter", "app"} <= set(timings)
+        # Every phase ran inside the request, and none of them twice over.
+        assert all(value >= 0 for value in timings.values())
+        assert timings["db"] + timings["build"] + timings["ser"] <= timings["app"]
+
+    async def test_errors_carry_the_header_too(self, client: AsyncClient):
+        response = await client.get("/no/such/path")
+        assert response.status_code == 404
+        assert "app" in _server_timing(response)
+
+    async def test_cross_origin_callers_may_read_it(self, client: AsyncClient):
+        response = await client.get("/health")
+        allowed = response.headers["timing-allow-origin"]
+        assert allowed.split(", ") == settings.cors_origins_list
+
+    async def test_can_be_switched_off(self, client: AsyncClient, monkeypatch):
+        monkeypatch.setattr(settings, "SERVER_TIMING_ENABLED", False)
+        response = await client.get("/health")
+        assert "server-timing" not in response.headers
+
+    def test_format(self):
+        request_metrics = RequestMetrics({})
+        request_metrics.add_phase("db", 0.0125)
+        request_metrics.add_phase("db", 0.0005)
+        assert server_timing(request_metrics, 0.02) == "db;dur=13.00, app;dur=20.00"
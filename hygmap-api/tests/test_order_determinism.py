@@ -17,9 +17,10 @@ Two things need pinning, and neither is expressible as an ordinary request asser
    plus a disk-based sort -- which is the regression this feature existed to fix, and which
    had already survived two audits.
 
-The plan shape itself needs Postgres and 2.8M rows, so it cannot be asserted here; the
-measured plans and timings are recorded in db/sql/02_create_indexes.sql and the feature
-file. These tests guard the two inputs that determine it.
+The plan shape itself needs Postgres and millions of rows, so it cannot be asserted here;
+tests/plans/test_query_plans.py asserts it against a synthetic catalog (`make
+test-plans`), and the measured timings are recorded in db/sql/02_create_indexes.sql.
+These tests guard the two inputs that determine it, and run everywhere.
 """
 import os
 import re
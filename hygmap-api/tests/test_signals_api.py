@@ -1,7 +1,16 @@
 """Tests for the SETI signals API"""
+import math
+from datetime import UTC, datetime
+
 import pytest
 from httpx import AsyncClient
 
+from app.api.signals import LIGHT_YEARS_PER_PARSEC, as_utc, signal_position
+
+# Positions are computed per request for an epoch, so the box tests pin one. At this
+# epoch the Wow! signal is at about (-13.2, -3.2, 5.9) and the Arecibo reply at (15.7, 0.0, 0.0).
+EPOCH = "2026-01-01T00:00:00Z"
+
 
 @pytest.mark.anyio
 class TestSignalsAPI:
@@ -17,18 +26,32 @@ class TestSignalsAPI:
         response = await client.get(
             "/api/signals",
             params={
-                "xmin": -10,
-                "xmax": 0,
-                "ymin": 5,
-                "ymax": 20,
-                "zmin": 0,
-                "zmax": 5,
+                "xmin": -15,
+                "xmax": -10,
+                "ymin": -5,
+                "ymax": 0,
+                "zmin": 5,
+                "zmax": 7,
+                "at": EPOCH,
             },
         )
         assert response.status_code == 200
         payload = response.json()
         assert payload["length"] == 1
         assert payload["data"][0]["name"] == "Wow! Signal"
+        assert payload["data"][0]["last_updated"] == "2026-01-01T00:00:00Z"
+
+    async def test_positions_move_with_at(self, client: AsyncClient) -> None:
+        """A signal leaves a box as its light travels on; the stored x/y/z are not read."""
+        box = {"xmin": 15, "xmax": 17, "ymin": -1, "ymax": 1, "zmin": -1, "zmax": 1}
+        now = await client.get("/api/signals/", params={**box, "at": EPOCH})
+        assert [s["name"] for s in now.json()["data"]] == ["Arecibo Reply"]
+        later = await client.get("/api/signals/", params={**box, "at": "2036-01-01T00:00:00Z"})
+        assert later.json()["length"] == 0
+
+    async def test_signals_not_yet_sent_are_omitted(self, client: AsyncClient) -> None:
+        response = await client.get("/api/signals/", params={"at": "1975-01-01T00:00:00Z"})
+        assert [s["name"] for s in response.json()["data"]] == ["Arecibo Reply"]
 
     async def test_get_signals_type_filter(self, client: AsyncClient) -> None:
         response = await client.get("/api/signals", params={"signal_type": "transmit"})
@@ -47,3 +70,26 @@ class TestSignalsAPI:
         response = await client.get("/api/signals", params={"order": "id desc"})
         assert response.status_code == 400
         assert "invalid order" in response.json()["detail"].lower()
+
+
+class TestSignalPosition:
+    AT = datetime(2026, 1, 1, tzinfo=UTC)
+
+    def test_distance_is_light_travel_time(self) -> None:
+        sent = datetime(2016, 1, 1, tzinfo=UTC)
+        position = signal_position("transmit", sent, 5.0, 20.0, self.AT)
+        years = (self.AT - sent).days / 365.25
+        assert math.dist(position, (0, 0, 0)) == pytest.approx(years / LIGHT_YEARS_PER_PARSEC, rel=1e-3)
+
+    def test_received_signal_points_away_from_its_source(self) -> None:
+        sent = datetime(2000, 1, 1, tzinfo=UTC)
+        out = signal_position("transmit", sent, 19.8, -27.0, self.AT)
+        back = signal_position("receive", sent, 19.8, -27.0, self.AT)
+        assert back == pytest.approx(tuple(-c for c in out), abs=1e-9)
+
+    def test_before_the_signal_there_is_no_position(self) -> None:
+        assert signal_position("transmit", self.AT, 5.0, 20.0, datetime(2025, 1, 1, tzinfo=UTC)) is None
+
+    def test_timestamps_are_utc(self) -> None:
+        assert as_utc("1977-08-15T22:16:00Z") == datetime(1977, 8, 15, 22, 16, tzinfo=UTC)
+        assert as_utc(datetime(1977, 8, 15, 22, 16)) == as_utc("1977-08-15T22:16:00+00:00")
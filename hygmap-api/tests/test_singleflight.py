@@ -0,0 +1,170 @@
+"""
+Request coalescing (app/singleflight.py).
+
+The unit tests drive SingleFlight directly with events, so "concurrent" means provably
+overlapping rather than hopefully so. The endpoint tests check the property that matters
+more than the saving: coalescing never hands one caller an answer meant for another.
+"""
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    async def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return b"body"
+
+        tasks = [asyncio.create_task(flights.do("k", work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert flights.in_flight() == 1
+        release.set()
+
+        assert await asyncio.gather(*tasks) == [b"body"] * 5
+        assert calls == 1
+        assert flights.in_flight() == 0
+
+    async def test_different_keys_do_not_share(self):
+        flights = SingleFlight()
+
+        async def work_for(value):
+            await asyncio.sleep(0)
+            return value
+
+        results = await asyncio.gather(
+            flights.do("a", lambda: work_for("a")),
+            flights.do("b", lambda: work_for("b")),
+        )
+        assert results == ["a", "b"]
+
+    async def test_nothing_is_cached_after_completion(self):
+        # Coalescing bounds concurrency, not freshness: a later request runs again.
+        flights = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        assert await flights.do("k", work) == 1
+        assert await flights.do("k", work) == 2
+
+    async def test_failure_is_shared_with_waiters(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            raise RuntimeError("query failed")
+
+        tasks = [asyncio.create_task(flights.do("k", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flights.in_flight() == 0
+
+    async def test_cancelled_leader_does_not_cancel_waiters(self):
+        # A leader is cancelled when ITS client disconnects. That is no reason to fail
+        # everyone who joined it; a waiter takes over and runs the call itself.
+        flights = SingleFlight()
+        release = asyncio.Event()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return calls
+
+        leader = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await waiter == 2
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    async def test_cancelled_waiter_does_not_cancel_the_call(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        leader = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        release.set()
+
+        assert await leader == "done"
+
+    async def test_disabled_runs_every_call(self):
+        flights = SingleFlight(enabled=False)
+        release = asyncio.Event()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+
+        tasks = [asyncio.create_task(flights.do("k", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        assert calls == 3
+
+
+class TestCoalescedEndpoints:
+    async def test_identical_concurrent_star_requests_get_identical_bodies(
+        self, client: AsyncClient
+    ):
+        responses = await asyncio.gather(*(client.get("/api/stars") for _ in range(5)))
+        assert {r.status_code for r in responses} == {200}
+        assert len({r.content for r in responses}) == 1
+        assert responses[0].headers["content-type"] == "application/json"
+
+    async def test_requests_differing_by_world_are_not_merged(self, client: AsyncClient):
+        # world_id changes the `name` column. A key that forgot it would give the Star
+        # Trek caller the unnamed answer, or the reverse, depending on who arrived first.
+        params = {"xmin": -5, "xmax": 5, "ymin": -5, "ymax": 5, "zmin": -5, "zmax": 5}
+        plain, trek = await asyncio.gather(
+            client.get("/api/stars", params=params),
+            client.get("/api/stars", params={**params, "world_id": 1}),
+        )
+        plain_names = {s["id"]: s["display_name"] for s in plain.json()["data"]}
+        trek_names = {s["id"]: s["display_name"] for s in trek.json()["data"]}
+        assert plain_names[3] == "Sirius"
+        assert trek_names[3] == "Alpha Canis Majoris"
+
+    async def test_signal_requests_differing_by_type_are_not_merged(
+        self, client: AsyncClient
+    ):
+        transmit, receive = await asyncio.gather(
+            client.get("/api/signals", params={"signal_type": "transmit"}),
+            client.get("/api/signals", params={"signal_type": "receive"}),
+        )
+        assert {s["type"] for s in transmit.json()["data"]} == {"transmit"}
+        assert {s["type"] for s in receive.json()["data"]} == {"receive"}
@@ -31,6 +31,19 @@ final class ApiClient
      */
     private array $responseCache = [];
 
+    /**
+     * One entry per API call that returned data: where the time went, as the API itself
+     * reported it in its Server-Timing header, plus what the call cost end to end here.
+     *
+     * The PHP profiler used to show "Querying all stars in map: 0.41 s" with no way to
+     * tell a slow query from a slow network or slow JSON. The API now breaks each request
+     * down (db, build, ser, limiter, app), and this keeps that breakdown so the page can
+     * report it. Memoized responses are not recorded again; they cost nothing.
+     *
+     * @var list<array{endpoint: string, total_ms: float, phases: array<string, float>}>
+     */
+    private array $serverTimings = [];
+
     /** @var ApiClient|null Singleton instance */
     private static ?ApiClient $instance = null;
 
@@ -282,6 +295,44 @@ final class ApiClient
         return $response['data'] ?? [];
     }
 
+    /**
+     * Server-Timing breakdowns of the API calls made through this instance, in call order.
+     *
+     * @return list<array{endpoint: string, total_ms: float, phases: array<string, float>}>
+     */
+    public function getServerTimings(): array
+    {
+        return $this->serverTimings;
+    }
+
+    /**
+     * Parse a Server-Timing header value into milliseconds per metric name.
+     *
+     * Entries without a `dur` parameter carry no time and are skipped. A name that
+     * appears twice is summed, which is what the header means when a server emits it
+     * once per occurrence (two queries, two `db` entries).
+     *
+     * @param string $header e.g. "db;dur=11.87, ser;dur=2.95, app;dur=22.31"
+     * @return array<string, float>
+     */
+    public static function parseServerTiming(string $header): array
+    {
+        $phases = [];
+        foreach (explode(',', $header) as $entry) {
+            $parts = array_map('trim', explode(';', $entry));
+            $name = array_shift($parts);
+            if ($name === null || $name === '') {
+                continue;
+            }
+            foreach ($parts as $param) {
+                if (preg_match('/^dur\s*=\s*"?([0-9]*\.?[0-9]+)"?$/i', $param, $m)) {
+                    $phases[$name] = ($phases[$name] ?? 0.0) + (float)$m[1];
+                }
+            }
+        }
+        return $phases;
+    }
+
     /**
      * Make a GET request to the API
      *
@@ -313,7 +364,19 @@ final class ApiClient
                 break;
             }
 
+            $serverTiming = '';
             curl_setopt_array($ch, [
+                // Collect Server-Timing from the final response only: with redirects
+                // followed, every hop's headers arrive here, so each status line starts
+                // the collection over.
+                CURLOPT_HEADERFUNCTION => static function ($ch, string $line) use (&$serverTiming): int {
+                    if (str_starts_with($line, 'HTTP/')) {
+                        $serverTiming = '';
+                    } elseif (stripos($line, 'server-timing:') === 0) {
+                        $serverTiming = trim(substr($line, strlen('server-timing:')));
+                    }
+                    return strlen($line);
+                },
                 CURLOPT_RETURNTRANSFER => true,
                 CURLOPT_HTTPHEADER => [
                     'Accept: application/json',
@@ -329,6 +392,7 @@ final class ApiClient
             $response = curl_exec($ch);
             $statusCode = curl_getinfo($ch, CURLINFO_HTTP_CODE);
             $contentType = curl_getinfo($ch, CURLINFO_CONTENT_TYPE);
+            $totalSeconds = (float)curl_getinfo($ch, CURLINFO_TOTAL_TIME);
             $error = curl_error($ch);
             curl_close($ch);
 
@@ -358,6 +422,11 @@ final class ApiClient
                     );
                 } else {
                     $this->responseCache[$url] = $data;
+                    $this->serverTimings[] = [
+                        'endpoint' => $endpoint,
+                        'total_ms' => $totalSeconds * 1000,
+                        'phases' => self::parseServerTiming($serverTiming),
+                    ];
                     return $data;
                 }
             }
@@ -9,6 +9,9 @@ class Profiler
     private array $timing = [];
     private array $names = [];
 
+    /** @var list<array{endpoint: string, total_ms: float, phases: array<string, float>}> */
+    private array $apiTimings = [];
+
     /**
      * Record a timing checkpoint with a descriptive label
      *
@@ -20,6 +23,55 @@ class Profiler
         $this->names[] = $label;
     }
 
+    /**
+     * Record API calls' Server-Timing breakdowns, as returned by
+     * ApiClient::getServerTimings(), for the report and the page's own header
+     *
+     * @param array $timings Entries with endpoint, total_ms and phases (ms by name)
+     */
+    public function addApiTimings(array $timings): void
+    {
+        foreach ($timings as $timing) {
+            $this->apiTimings[] = $timing;
+        }
+    }
+
+    /**
+     * Build this page's Server-Timing header value
+     *
+     * `php` is the wall time between the first and last flag. `api` is the time spent in
+     * API calls as measured here, and each `api-*` entry sums that phase as the API
+     * reported it across every call, so browser devtools show one breakdown for the page
+     * down to the database.
+     *
+     * @return string Header value, without the "Server-Timing:" name
+     */
+    public function serverTimingHeader(): string
+    {
+        $entries = [];
+        $size = count($this->timing);
+        if ($size > 0) {
+            $entries['php'] = ($this->timing[$size - 1] - $this->timing[0]) * 1000;
+        }
+        if ($this->apiTimings !== []) {
+            $entries['api'] = 0.0;
+            foreach ($this->apiTimings as $timing) {
+                $entries['api'] += (float)$timing['total_ms'];
+                foreach ($timing['phases'] as $name => $ms) {
+                    // Only token characters belong in a metric name
+                    $key = 'api-' . preg_replace('/[^A-Za-z0-9_-]/', '', (string)$name);
+                    $entries[$key] = ($entries[$key] ?? 0.0) + (float)$ms;
+                }
+            }
+        }
+
+        $parts = [];
+        foreach ($entries as $name => $ms) {
+            $parts[] = sprintf('%s;dur=%.2f', $name, $ms);
+        }
+        return implode(', ', $parts);
+    }
+
     /**
      * Generate HTML output of all timing checkpoints
      *
@@ -44,6 +96,21 @@ class Profiler
         $total = $this->timing[$size - 1] - $this->timing[0];
         $output .= "<b>Total time:</b> " . htmlspecialchars((string)$total, ENT_QUOTES, 'UTF-8');
 
+        if ($this->apiTimings !== []) {
+            $output .= "<br><b>API calls</b> (ms)<br>";
+            foreach ($this->apiTimings as $timing) {
+                $phases = [];
+                foreach ($timing['phases'] as $name => $ms) {
+                    $phases[] = sprintf('%s %.2f', $name, $ms);
+                }
+                $line = sprintf('%s: %.2f', $timing['endpoint'], $timing['total_ms']);
+                if ($phases !== []) {
+                    $line .= ' [' . implode(', ', $phases) . ']';
+                }
+                $output .= '&nbsp;&nbsp;&nbsp;' . htmlspecialchars($line, ENT_QUOTES, 'UTF-8') . '<br>';
+            }
+        }
+
         return $output;
     }
 
@@ -54,5 +121,6 @@ class Profiler
     {
         $this->timing = [];
         $this->names = [];
+        $this->apiTimings = [];
     }
 }
@@ -111,6 +111,11 @@ $profiler->flag("Query complete");
 
 $profiler->flag('FINISH');
 
+// Forward the API's own timing breakdown, so devtools on this page show where a slow
+// render went -- down to the database -- and not just that PHP took a while.
+$profiler->addApiTimings(ApiClient::instance()->getServerTimings());
+header('Server-Timing: ' . $profiler->serverTimingHeader());
+
 // =============================================================================
 // PRESENTATION LAYER (HTML Template)
 // =============================================================================
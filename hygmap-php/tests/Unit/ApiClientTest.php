@@ -168,4 +168,30 @@ class ApiClientTest extends TestCase
         $this->assertTrue($params[0]->isDefaultValueAvailable());
         $this->assertNull($params[0]->getDefaultValue());
     }
+
+    // =========================================================================
+    // Server-Timing Tests
+    // =========================================================================
+
+    public function testParseServerTimingReadsDurations(): void
+    {
+        $phases = ApiClient::parseServerTiming('limiter;dur=0.04, db;dur=11.87, app;dur=22.31');
+        $this->assertSame(['limiter' => 0.04, 'db' => 11.87, 'app' => 22.31], $phases);
+    }
+
+    public function testParseServerTimingSumsRepeatedNamesAndSkipsEntriesWithoutDuration(): void
+    {
+        $phases = ApiClient::parseServerTiming('db;dur=1.5, miss;desc="cache", db;dur=2.5');
+        $this->assertSame(['db' => 4.0], $phases);
+    }
+
+    public function testParseServerTimingOfEmptyHeader(): void
+    {
+        $this->assertSame([], ApiClient::parseServerTiming(''));
+    }
+
+    public function testNoServerTimingsBeforeAnyCall(): void
+    {
+        $this->assertSame([], (new ApiClient())->getServerTimings());
+    }
 }
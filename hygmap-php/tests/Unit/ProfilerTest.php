@@ -0,0 +1,79 @@
+<?php
+declare(strict_types=1);
+
+namespace HYGMap\Tests\Unit;
+
+use PHPUnit\Framework\TestCase;
+use Profiler;
+
+/**
+ * Tests for Profiler.php, and in particular how it forwards the API's Server-Timing
+ * breakdown into the page's own header and report.
+ */
+class ProfilerTest extends TestCase
+{
+    public static function setUpBeforeClass(): void
+    {
+        require_once HYGMAP_SRC_DIR . '/Profiler.php';
+    }
+
+    private function apiTimings(): array
+    {
+        return [
+            ['endpoint' => '/api/stars/', 'total_ms' => 30.0, 'phases' => ['db' => 12.0, 'ser' => 3.0]],
+            ['endpoint' => '/api/stars/worlds', 'total_ms' => 5.0, 'phases' => ['db' => 1.5]],
+        ];
+    }
+
+    public function testServerTimingHeaderSumsApiPhasesAcrossCalls(): void
+    {
+        $profiler = new Profiler();
+        $profiler->addApiTimings($this->apiTimings());
+
+        $this->assertSame(
+            'api;dur=35.00, api-db;dur=13.50, api-ser;dur=3.00',
+            $profiler->serverTimingHeader()
+        );
+    }
+
+    public function testServerTimingHeaderLeadsWithPhpTimeOnceFlagged(): void
+    {
+        $profiler = new Profiler();
+        $profiler->flag('START');
+        $profiler->flag('FINISH');
+
+        $this->assertMatchesRegularExpression('/^php;dur=\d+\.\d{2}$/', $profiler->serverTimingHeader());
+    }
+
+    public function testServerTimingHeaderDropsCharactersThatCannotBeInAName(): void
+    {
+        $profiler = new Profiler();
+        $profiler->addApiTimings([
+            ['endpoint' => '/x', 'total_ms' => 1.0, 'phases' => ['d b,"x"' => 2.0]],
+        ]);
+
+        $this->assertSame('api;dur=1.00, api-dbx;dur=2.00', $profiler->serverTimingHeader());
+    }
+
+    public function testReportListsEachApiCallEscaped(): void
+    {
+        $profiler = new Profiler();
+        $profiler->flag('START');
+        $profiler->addApiTimings([
+            ['endpoint' => '/api/<stars>', 'total_ms' => 30.0, 'phases' => ['db' => 12.0]],
+        ]);
+
+        $report = $profiler->getReport();
+        $this->assertStringContainsString('/api/&lt;stars&gt;: 30.00 [db 12.00]', $report);
+        $this->assertStringNotContainsString('<stars>', $report);
+    }
+
+    public function testResetClearsApiTimings(): void
+    {
+        $profiler = new Profiler();
+        $profiler->addApiTimings($this->apiTimings());
+        $profiler->reset();
+
+        $this->assertSame('', $profiler->serverTimingHeader());
+    }
+}